@@ -1,3 +1,14 @@
 from django.contrib import admin
 
+from .models import EvaluationQuestion
+
 # Register your models here.
+
+
+# Edits take effect without a deploy (accounts/question_bank.py reloads the bank)
+@admin.register(EvaluationQuestion)
+class EvaluationQuestionAdmin(admin.ModelAdmin):
+    list_display = ("dyslexia_type", "number", "text", "interaction", "timed")
+    list_filter = ("dyslexia_type", "interaction", "timed")
+    search_fields = ("text", "hint")
+    ordering = ("dyslexia_type", "number")
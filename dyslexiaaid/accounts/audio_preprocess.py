@@ -0,0 +1,237 @@
+"""
+Audio clean-up before recognition.
+
+Browsers record at 44.1/48 kHz, sometimes in stereo, and a child's answer
+usually sits between a second of silence on either side. All of that is
+sent to and decoded by the engine. preprocess() turns a WAV into what the
+engine needs, reading it BLOCK_FRAMES 20 ms frames at a time so that only
+one block is decoded in memory however long the upload (a spooled file
+stays on disk):
+
+    trim        leading/trailing silence cut on 20 ms frame energy: frames
+                quieter than STT_TRIM_THRESHOLD_DB below the loudest frame
+                (and under an absolute floor) are silence, STT_TRIM_PAD_MS
+                of it is kept around the speech. A first pass over the
+                blocks keeps only the frame energies to find the speech.
+    downmix     channels averaged to mono
+    resample    down to the backend's sample_rate (16 kHz), polyphase filter
+                (scipy.signal.resample_poly) applied block by block with the
+                filter's reach of neighbouring samples carried over; never
+                upsampled
+
+The second pass seeks to the speech and writes it as 16-bit PCM WAV block
+by block. A clip that needs none of it is passed through untouched (no
+copy), as is anything that isn't a PCM WAV. Every clip's report (bytes and
+seconds saved, time spent) goes into the stats served by the speech-to-text
+status view.
+"""
+import io
+import threading
+import time
+import wave
+from math import gcd
+
+import numpy as np
+from scipy.signal import resample_poly
+
+from .prediction_broker import Histogram
+
+FRAME_MS = 20
+FLOOR_DB = -60.0
+BLOCK_FRAMES = 250  # 5 s of 20 ms frames
+
+_stats = {"clips": 0, "passed_through": 0, "bytes_in": 0, "bytes_out": 0, "seconds_in": 0.0, "seconds_out": 0.0,
+          "latency_saved_ms": 0.0}
+_stats_lock = threading.Lock()
+preprocess_ms = Histogram([0.5, 1, 2, 5, 10, 25, 50, 100])
+bytes_saved_kb = Histogram([0, 16, 64, 128, 256, 512, 1024, 4096])
+
+
+# =========================
+# PCM helpers
+# =========================
+def decode_pcm(frames, sample_width, channels=1):
+    """PCM bytes -> float32 samples in [-1, 1), shape (n, channels)."""
+    if sample_width == 1:
+        samples = (np.frombuffer(frames, np.uint8).astype(np.float32) - 128) / 128
+    elif sample_width == 2:
+        samples = np.frombuffer(frames, "<i2").astype(np.float32) / 32768
+    elif sample_width == 3:
+        raw = np.frombuffer(frames, np.uint8).reshape(-1, 3).astype(np.int32)
+        ints = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        samples = ((ints << 8) >> 8).astype(np.float32) / 2 ** 23  # sign-extend 24 bit
+    elif sample_width == 4:
+        samples = np.frombuffer(frames, "<i4").astype(np.float32) / 2 ** 31
+    else:
+        raise ValueError(f"Unsupported sample width {sample_width}")
+    usable = len(samples) - len(samples) % channels
+    return samples[:usable].reshape(-1, channels)
+
+
+def encode_pcm16(samples):
+    return (np.clip(samples, -1, 32767 / 32768) * 32768).astype("<i2").tobytes()
+
+
+def frame_db(samples, frame_length):
+    """Energy in dB of consecutive frames of a mono signal (the tail shorter than a frame is dropped)."""
+    count = len(samples) // frame_length
+    frames = samples[:count * frame_length].reshape(count, frame_length)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+
+# =========================
+# Stages
+# =========================
+def downmix(samples):
+    return samples[:, 0] if samples.shape[1] == 1 else samples.mean(axis=1, dtype=np.float32)
+
+
+def resample_blocks(blocks, rate, target_rate):
+    """Yield the blocks of a mono signal resampled to target_rate, the same
+    samples resample_poly gives for the whole signal. Blocks pass through
+    unchanged when the signal isn't above target_rate."""
+    if not target_rate or rate <= target_rate:
+        yield from blocks
+        return
+    factor = gcd(rate, target_rate)
+    up, down = target_rate // factor, rate // factor
+    # resample_poly's filter reaches 10 * max(up, down) upsampled samples
+    # either side; that many input samples (rounded up to whole steps of
+    # `down`) are kept around each piece so it is resampled as in the whole
+    reach = -(-10 * max(up, down) // up)
+    context = -(-reach // down) * down
+    buffer = np.empty(0, dtype=np.float32)
+    start = 0  # first sample of buffer not resampled yet, a multiple of down
+    for block in blocks:
+        buffer = np.concatenate([buffer, block])
+        ready = (len(buffer) - start - context) // down * down
+        if ready <= 0:
+            continue
+        resampled = resample_poly(buffer[:start + ready + context], up, down)
+        yield resampled[start * up // down:(start + ready) * up // down].astype(np.float32)
+        keep = max(start + ready - context, 0)
+        buffer, start = buffer[keep:], start + ready - keep
+    if len(buffer) > start:
+        yield resample_poly(buffer, up, down)[start * up // down:].astype(np.float32)
+
+
+def speech_bounds(energy, frame_length, length, rate, threshold_db=-35.0, pad_ms=150):
+    """(start, end) sample of the speech from frame energies; the whole signal when no frame is loud enough."""
+    if not len(energy):
+        return 0, length
+    loud = np.flatnonzero(energy > max(energy.max() + threshold_db, FLOOR_DB))
+    if not len(loud):
+        return 0, length
+    pad = int(rate * pad_ms / 1000)
+    return max(loud[0] * frame_length - pad, 0), min((loud[-1] + 1) * frame_length + pad, length)
+
+
+# =========================
+# Pipeline
+# =========================
+def read_blocks(wav, channels, width, frames, block_length):
+    """Yield mono blocks of the next `frames` frames of an open WAV."""
+    while frames > 0:
+        raw = wav.readframes(min(block_length, frames))
+        if not raw:
+            break
+        block = downmix(decode_pcm(raw, width, channels))
+        frames -= len(block)
+        yield block
+
+
+def preprocess(fileobj, target_rate=16000, threshold_db=-35.0, pad_ms=150, block_frames=BLOCK_FRAMES):
+    """(file object to recognise, report). The report is None when the clip was passed through."""
+    started = time.perf_counter()
+    try:
+        with wave.open(fileobj) as wav:
+            channels, width, rate = wav.getnchannels(), wav.getsampwidth(), wav.getframerate()
+            length = wav.getnframes()
+            frame_length = max(int(rate * FRAME_MS / 1000), 1)
+            block_length = frame_length * block_frames
+
+            # Pass 1: frame energies only (the tail shorter than a frame is dropped)
+            energies = []
+            carry = np.empty(0, dtype=np.float32)
+            for block in read_blocks(wav, channels, width, length, block_length):
+                block = np.concatenate([carry, block])
+                usable = len(block) - len(block) % frame_length
+                energies.append(frame_db(block[:usable], frame_length))
+                carry = block[usable:]
+            energy = np.concatenate(energies) if energies else np.empty(0)
+            start, end = speech_bounds(energy, frame_length, length, rate, threshold_db, pad_ms)
+            out_rate = target_rate if target_rate and rate > target_rate else rate
+            if channels == 1 and out_rate == rate and (start, end) == (0, length):
+                fileobj.seek(0)
+                _count(passed_through=1)
+                return fileobj, None
+
+            # Pass 2: the speech, resampled and written a block at a time
+            wav.setpos(start)
+            output = io.BytesIO()
+            frames_out = 0
+            with wave.open(output, "wb") as out:
+                out.setnchannels(1)
+                out.setsampwidth(2)
+                out.setframerate(out_rate)
+                for block in resample_blocks(read_blocks(wav, channels, width, end - start, block_length),
+                                             rate, target_rate):
+                    out.writeframes(encode_pcm16(block))
+                    frames_out += len(block)
+    except (wave.Error, EOFError, ValueError):
+        fileobj.seek(0)
+        _count(passed_through=1)
+        return fileobj, None
+    output.seek(0)
+
+    bytes_in = fileobj.seek(0, io.SEEK_END)
+    fileobj.seek(0)
+    report = {
+        "bytes_in": bytes_in,
+        "bytes_out": output.getbuffer().nbytes,
+        "seconds_in": length / rate,
+        "seconds_out": frames_out / out_rate,
+        "rate_in": rate,
+        "rate_out": out_rate,
+        "channels_in": channels,
+        "preprocess_ms": (time.perf_counter() - started) * 1000,
+    }
+    report["bytes_saved"] = report["bytes_in"] - report["bytes_out"]
+    preprocess_ms.observe(report["preprocess_ms"])
+    bytes_saved_kb.observe(report["bytes_saved"] / 1024)
+    _count(clips=1, bytes_in=report["bytes_in"], bytes_out=report["bytes_out"],
+           seconds_in=report["seconds_in"], seconds_out=report["seconds_out"])
+    return output, report
+
+
+def record_recognition(report, recognize_ms):
+    """Estimate what recognising the untouched clip would have cost more.
+
+    Engine time grows with audio length (upload + decoding), so the saving is
+    this recognition's time per second of audio times the seconds removed.
+    """
+    if report is None or not report["seconds_out"]:
+        return None
+    saved = recognize_ms / report["seconds_out"] * (report["seconds_in"] - report["seconds_out"])
+    report["latency_saved_ms"] = saved
+    _count(latency_saved_ms=saved)
+    return saved
+
+
+def _count(**amounts):
+    with _stats_lock:
+        for name, amount in amounts.items():
+            _stats[name] += amount
+
+
+def stats():
+    with _stats_lock:
+        snapshot = dict(_stats)
+    return {
+        **snapshot,
+        "bytes_saved": snapshot["bytes_in"] - snapshot["bytes_out"],
+        "seconds_saved": snapshot["seconds_in"] - snapshot["seconds_out"],
+        "preprocess_ms": preprocess_ms.snapshot(),
+        "bytes_saved_kb": bytes_saved_kb.snapshot(),
+    }
@@ -0,0 +1,222 @@
+"""
+Error patterns in evaluation answers (EvaluationData.error_patterns).
+
+Scoring only says whether an answer matched. Here each answer is aligned
+against the closest expected answer, word by word and then letter by letter
+within mismatched words (edit distance with adjacent transpositions, optimal
+string alignment; replacing a word costs the share of its letters that
+differ, so "yelow" lines up with "yellow"), and every edit is classified:
+
+    reversal          any two of b/d/p/q swapped, or m/w, n/u
+    phoneme           letters for similar sounds: voicing pairs (d/t, g/k,
+                      f/v, s/z), c/k/s, m/n, vowels
+    transposition     two neighbouring letters swapped ("form" -> "from")
+    substitution      any other letter in place of the expected one
+    omission          an expected letter missing
+    addition          an extra letter
+    word_reversal     the word read backwards ("saw" for "was")
+    word_substitution a different word (most of its letters differ)
+    word_order        two neighbouring words said the other way round
+    word_omission     an expected word missing
+    word_addition     an extra word
+
+Answers repeat a lot (the same expected word, the same few mistakes), so
+alignments are cached per (expected, response) pair. error_patterns keeps one
+entry per answer that had errors:
+
+    {"question": "3", "expected": "bat", "response": "dat",
+     "errors": [{"type": "reversal", "expected": "b", "response": "d", "word": 0}]}
+"""
+from collections import Counter
+from functools import lru_cache
+
+from .question_bank import tokenize
+
+NO_RESPONSE = "no_response"
+CACHE_SIZE = 65536
+# Share of a word's letters that may be wrong before it counts as another word
+WORD_SUBSTITUTION_SHARE = 0.6
+
+REVERSALS = frozenset(frozenset(pair) for pair in ("bd", "bp", "bq", "dp", "dq", "pq", "mw", "nu"))
+PHONEMES = frozenset(frozenset(pair) for pair in (
+    "dt", "gk", "fv", "sz", "ck", "cs", "mn", "ae", "ei", "io", "ou", "iy", "jg",
+))
+
+
+def _classify(expected, response):
+    pair = frozenset((expected, response))
+    if pair in REVERSALS:
+        return "reversal"
+    if pair in PHONEMES:
+        return "phoneme"
+    return "substitution"
+
+
+def _unit_cost(expected, response):
+    return 1
+
+
+def align(expected, response, cost=_unit_cost):
+    """Edit operations turning `expected` into `response` (two sequences).
+
+    ("match", e, r), ("sub", e, r), ("del", e, None), ("ins", None, r) and
+    ("swap", e1 + e2, r1 + r2) for adjacent transpositions. `cost(e, r)`
+    prices a substitution (insertions, deletions and swaps cost 1).
+    """
+    def sub(e, r):
+        return 0 if e == r else cost(e, r)
+
+    n, m = len(expected), len(response)
+    dist = [[0] * (m + 1) for _ in range(n + 1)]
+    for i in range(n + 1):
+        dist[i][0] = i
+    for j in range(m + 1):
+        dist[0][j] = j
+    for i in range(1, n + 1):
+        e = expected[i - 1]
+        row, prev = dist[i], dist[i - 1]
+        for j in range(1, m + 1):
+            r = response[j - 1]
+            best = min(prev[j] + 1, row[j - 1] + 1, prev[j - 1] + sub(e, r))
+            if i > 1 and j > 1 and e == response[j - 2] and expected[i - 2] == r and e != r:
+                best = min(best, dist[i - 2][j - 2] + 1)
+            row[j] = best
+
+    ops = []
+    i, j = n, m
+    while i or j:
+        if i and j and dist[i][j] == dist[i - 1][j - 1] + sub(expected[i - 1], response[j - 1]):
+            kind = "match" if expected[i - 1] == response[j - 1] else "sub"
+            ops.append((kind, expected[i - 1], response[j - 1]))
+            i, j = i - 1, j - 1
+        elif (i > 1 and j > 1 and expected[i - 1] == response[j - 2] and expected[i - 2] == response[j - 1]
+              and expected[i - 1] != response[j - 1] and dist[i][j] == dist[i - 2][j - 2] + 1):
+            ops.append(("swap", expected[i - 2:i], response[j - 2:j]))
+            i, j = i - 2, j - 2
+        elif i and dist[i][j] == dist[i - 1][j] + 1:
+            ops.append(("del", expected[i - 1], None))
+            i -= 1
+        else:
+            ops.append(("ins", None, response[j - 1]))
+            j -= 1
+    ops.reverse()
+    return ops
+
+
+def _distance(ops):
+    return sum(op[0] != "match" for op in ops)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _word_cost(expected, response):
+    # A misread word is a cheaper substitution than an unrelated one
+    return _distance(align(expected, response)) / max(len(expected), len(response))
+
+
+def _word_errors(expected, response, word):
+    if len(expected) > 2 and response == expected[::-1]:
+        return [("word_reversal", expected, response, word)]
+    ops = align(expected, response)
+    longest = max(len(expected), len(response))
+    if longest > 2 and _distance(ops) > longest * WORD_SUBSTITUTION_SHARE:
+        # A different word altogether, not a misreading of this one
+        return [("word_substitution", expected, response, word)]
+    errors = []
+    for kind, e, r in ops:
+        if kind == "sub":
+            errors.append((_classify(e, r), e, r, word))
+        elif kind == "swap":
+            errors.append(("transposition", "".join(e), "".join(r), word))
+        elif kind == "del":
+            errors.append(("omission", e, None, word))
+        elif kind == "ins":
+            errors.append(("addition", None, r, word))
+    return errors
+
+
+def analyze_pair(expected, response):
+    """(edit distance in words, errors) of a response against one expected answer.
+
+    Errors are (type, expected part, response part, index of the expected word).
+    """
+    distance, _, errors = _analyze(expected, response)
+    return distance, errors
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _analyze(expected, response):
+    """(edit distance in words, weighted word cost, errors)."""
+    ops = align(tokenize(expected), tokenize(response), cost=_word_cost)
+    errors, word = [], 0
+    for kind, e, r in ops:
+        if kind == "match":
+            word += 1
+        elif kind == "sub":
+            errors.extend(_word_errors(e, r, word))
+            word += 1
+        elif kind == "swap":
+            errors.append(("word_order", " ".join(e), " ".join(r), word))
+            word += 2
+        elif kind == "del":
+            errors.append(("word_omission", e, None, word))
+            word += 1
+        else:
+            errors.append(("word_addition", None, r, word))
+    cost = sum(_word_cost(e, r) if kind == "sub" else kind != "match" for kind, e, r in ops)
+    return _distance(ops), cost, tuple(errors)
+
+
+def analyze_answer(expected, response):
+    """(closest expected answer, errors) for an answer; errors is empty for a correct one."""
+    answers = [str(answer) for answer in (expected if isinstance(expected, (list, tuple)) else [expected]) if answer]
+    if not answers:
+        return None, ()
+    # Closest by words, then by letters (a misread word costs the share of
+    # its letters that differ), then by the number of errors
+    scored = [(_analyze(answer, response), answer) for answer in answers]
+    (_, _, errors), best = min(scored, key=lambda item: (item[0][0], item[0][1], len(item[0][2])))
+    return best, errors
+
+
+def analyze_evaluation(stt_responses, questions=()):
+    """error_patterns entries for an evaluation's stt_responses.
+
+    The expected answer stored with each response is used, or the question's
+    from `questions` (question bank dicts of the evaluation's type) for older
+    records without one. For timed questions a list of answers is a sequence
+    to say in full ("red yellow blue green"), elsewhere alternatives.
+    """
+    bank = {str(question["id"]): question for question in questions}
+    entries = []
+    for q_id, data in (stt_responses or {}).items():
+        data = data if isinstance(data, dict) else {"response": data}
+        question = bank.get(str(q_id), {})
+        response = (data.get("response") or "").strip().lower()
+        expected = data.get("expected") or question.get("expected")
+        if not response or response == NO_RESPONSE or not expected:
+            continue
+        if isinstance(expected, (list, tuple)) and (question.get("timed") or question.get("min_matches")):
+            expected = " ".join(map(str, expected))
+        best, errors = analyze_answer(expected, response)
+        if errors:
+            entries.append({
+                "question": str(q_id),
+                "expected": best,
+                "response": response,
+                "errors": [
+                    {"type": kind, "expected": e, "response": r, "word": word} for kind, e, r, word in errors
+                ],
+            })
+    return entries
+
+
+def summarize(entries):
+    """Count of each error type over error_patterns entries."""
+    return dict(Counter(error["type"] for entry in entries for error in entry["errors"]))
+
+
+def cache_stats():
+    info = _analyze.cache_info()
+    lookups = info.hits + info.misses
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize,
+            "hit_rate": info.hits / lookups if lookups else None}
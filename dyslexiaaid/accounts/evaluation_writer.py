@@ -0,0 +1,239 @@
+"""
+Write-behind persistence of EvaluationData submissions.
+
+evaluation_test hands the finished record to submit() and redirects
+straight away. A background thread collects records and writes them with
+one bulk_create per batch, when EVALUATION_WRITER_BATCH_SIZE records are
+waiting or the oldest has waited EVALUATION_WRITER_FLUSH_MS, whichever comes
+first. bulk_create sends no signals, so post_save is sent for every written
+row and the feature store and suggestion cache stay current.
+
+The record's submission_id exists before it is written, so the session can
+keep it; get() finds the record in the buffer until it reaches the database.
+On a full buffer, or with EVALUATION_WRITE_BEHIND = False, records are saved
+synchronously. The buffer is drained on interpreter exit (gunicorn worker
+shutdown included); a hard kill loses at most one flush interval.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, router, transaction
+from django.db.models.signals import post_save
+
+from .models import EvaluationData
+from .prediction_broker import Histogram
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class EvaluationWriter:
+    def __init__(self, batch_size=50, flush_interval=1.0, max_queue=5000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        # submission_id -> record, until it is written
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._idle = threading.Condition()
+        self._in_flight = 0
+        self.counters = {"submitted": 0, "written": 0, "flushes": 0, "sync_writes": 0, "failed": 0}
+        self.flush_ms = Histogram([1, 5, 10, 25, 50, 100, 250, 500, 1000])
+        self.flush_sizes = Histogram([1, 2, 4, 8, 16, 32, 64, 128])
+
+    # -------------------------------------------------------------------------
+
+    def submit(self, record):
+        """Queue a record for writing and return immediately."""
+        if not getattr(settings, "EVALUATION_WRITE_BEHIND", True):
+            self._write_now(record)
+            return record
+        self._ensure_started()
+        with self._pending_lock:
+            self._pending[str(record.submission_id)] = record
+        with self._idle:
+            self._in_flight += 1
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self._forget([record])
+            with self._idle:
+                self._in_flight -= 1
+            self._write_now(record)
+            return record
+        self.counters["submitted"] += 1
+        return record
+
+    def get(self, submission_id):
+        """The submission, whether it is still buffered or already written."""
+        if not submission_id:
+            return None
+        with self._pending_lock:
+            record = self._pending.get(str(submission_id))
+        if record is not None:
+            return record
+        try:
+            return EvaluationData.objects.filter(submission_id=submission_id).first()
+        except Exception:  # malformed id
+            return None
+
+    def drain(self, timeout=None):
+        """Block until everything submitted so far is written. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._idle:
+            while self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def close(self, timeout=10):
+        """Flush what is buffered and stop the thread (graceful shutdown)."""
+        thread = self._thread
+        if thread is None or self._pid != os.getpid() or not thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def stats(self):
+        return {
+            **self.counters,
+            "queue_depth": self._queue.qsize(),
+            "pending": len(self._pending),
+            "flush_ms": self.flush_ms.snapshot(),
+            "flush_sizes": self.flush_sizes.snapshot(),
+        }
+
+    # -------------------------------------------------------------------------
+
+    def _ensure_started(self):
+        # Threads don't survive a fork; start one per worker process.
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                # Records buffered in the parent belong to the parent.
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+                self._pending = {}
+                self._in_flight = 0
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="evaluation-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+        # Drain whatever is left after the stop marker
+        rest = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                rest.append(item)
+        for start in range(0, len(rest), self.batch_size):
+            self._flush(rest[start:start + self.batch_size])
+
+    def _flush(self, batch):
+        started = time.perf_counter()
+        written = 0
+        try:
+            close_old_connections()
+            try:
+                with transaction.atomic():
+                    EvaluationData.objects.bulk_create(batch)
+                written = len(batch)
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                self._send_post_save(batch)
+            except Exception:
+                logger.exception("Bulk write of %s evaluations failed, writing them one by one", len(batch))
+                for record in batch:
+                    # Undo what the rolled back bulk_create may have set
+                    record.pk = None
+                    record._state.adding = True
+                    try:
+                        record.save()  # sends post_save itself
+                        written += 1
+                    except Exception:
+                        self.counters["failed"] += 1
+                        logger.exception("Could not save evaluation %s", record.submission_id)
+                elapsed_ms = (time.perf_counter() - started) * 1000
+            self.flush_ms.observe(elapsed_ms)
+            self.flush_sizes.observe(len(batch))
+        finally:
+            self.counters["written"] += written
+            self.counters["flushes"] += 1
+            self._forget(batch)
+            with self._idle:
+                self._in_flight -= len(batch)
+                self._idle.notify_all()
+
+    def _forget(self, records):
+        with self._pending_lock:
+            for record in records:
+                self._pending.pop(str(record.submission_id), None)
+
+    def _write_now(self, record):
+        record.save()
+        self.counters["sync_writes"] += 1
+
+    @staticmethod
+    def _send_post_save(records):
+        using = router.db_for_write(EvaluationData)
+        for record in records:
+            try:
+                if record.pk is None:
+                    # Backends that can't return bulk-inserted keys
+                    record = EvaluationData.objects.get(submission_id=record.submission_id)
+                post_save.send(sender=EvaluationData, instance=record, created=True, update_fields=None,
+                               raw=False, using=using)
+            except Exception:
+                # The row is written; only the derived features are behind
+                logger.exception("post_save handlers failed for evaluation %s", record.submission_id)
+
+
+writer = EvaluationWriter(
+    batch_size=getattr(settings, "EVALUATION_WRITER_BATCH_SIZE", 50),
+    flush_interval=getattr(settings, "EVALUATION_WRITER_FLUSH_MS", 1000) / 1000,
+    max_queue=getattr(settings, "EVALUATION_WRITER_MAX_QUEUE", 5000),
+)
+atexit.register(writer.close)
+
+
+def submit(record):
+    return writer.submit(record)
+
+
+def get(submission_id):
+    return writer.get(submission_id)
@@ -0,0 +1,125 @@
+"""
+Incremental maintenance of the ChildFeatures table.
+
+Every new EvaluationData or lessons.Attempt row adds its values to the
+child's running sums with a single UPDATE ... SET x = x + n, so the feature
+row is always current and reading it never touches the history. An edit
+can't be expressed as a delta because the old values are gone, and a
+deleted row may never have been counted (or counted with other values), so
+subtracting it could drive the sums below zero: both recount that one child
+from scratch instead. Rows stored before the table existed were counted by
+migration 0013.
+"""
+from numbers import Number
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from lessons.models import Attempt
+
+from .models import ChildFeatures, ChildProfile, EvaluationData
+
+
+def evaluation_child_id(evaluation):
+    """The child an evaluation belongs to (a parent may have taken it for them)."""
+    if not evaluation.child_profile_id:
+        return evaluation.user_id
+    if EvaluationData.child_profile.is_cached(evaluation):
+        return evaluation.child_profile.child_id
+    # The profile may already be gone when this runs during a cascade delete.
+    child_id = ChildProfile.objects.filter(pk=evaluation.child_profile_id).values_list("child_id", flat=True).first()
+    return child_id if child_id is not None else evaluation.user_id
+
+
+def _response_times(evaluation):
+    return [t for t in (evaluation.response_times or {}).values() if isinstance(t, Number)]
+
+
+def _evaluation_deltas(evaluation):
+    times = _response_times(evaluation)
+    return {
+        "evaluation_count": 1,
+        "score_sum": evaluation.score,
+        "total_questions_sum": evaluation.total_questions,
+        "stt_accuracy_sum": evaluation.stt_accuracy,
+        "tts_usage_sum": evaluation.tts_usage_count,
+        "completion_time_sum": evaluation.completion_time,
+        "response_time_count": len(times),
+        "response_time_sum": float(sum(times)),
+    }
+
+
+def _attempt_deltas(attempt):
+    return {
+        "attempt_count": 1,
+        "attempt_correct_count": int(attempt.is_correct),
+        "attempt_time_ms_sum": attempt.time_spent_ms,
+        "attempt_tts_plays_sum": attempt.tts_plays,
+        "attempt_repeats_sum": attempt.repeats,
+    }
+
+
+def _apply(child_id, deltas, sign=1):
+    if sign < 0:
+        # Never create a row while removing: during a cascade delete the
+        # child itself is about to disappear.
+        rebuild(child_id, create=False)
+        return
+    changes = {field: F(field) + value for field, value in deltas.items()}
+    with transaction.atomic():
+        ChildFeatures.objects.get_or_create(child_id=child_id)
+        ChildFeatures.objects.filter(child_id=child_id).update(**changes)
+
+
+def record_evaluation(evaluation, sign=1):
+    _apply(evaluation_child_id(evaluation), _evaluation_deltas(evaluation), sign)
+
+
+def record_attempt(attempt, sign=1):
+    _apply(attempt.child_id, _attempt_deltas(attempt), sign)
+
+
+def rebuild(child_id, create=True):
+    """Recompute one child's aggregates from their full history.
+
+    With ``create=False`` a child without a feature row is left without one.
+    """
+    evaluations = EvaluationData.objects.filter(
+        Q(child_profile__child_id=child_id) | Q(user_id=child_id, child_profile__isnull=True)
+    ).only("score", "total_questions", "stt_accuracy", "tts_usage_count", "completion_time", "response_times")
+
+    totals = dict.fromkeys(_evaluation_deltas(EvaluationData()), 0)
+    for evaluation in evaluations.iterator():
+        for field, value in _evaluation_deltas(evaluation).items():
+            totals[field] += value
+
+    attempts = Attempt.objects.filter(child_id=child_id).aggregate(
+        attempt_count=Count("id"),
+        attempt_correct_count=Count("id", filter=Q(is_correct=True)),
+        attempt_time_ms_sum=Sum("time_spent_ms"),
+        attempt_tts_plays_sum=Sum("tts_plays"),
+        attempt_repeats_sum=Sum("repeats"),
+    )
+    totals.update({field: value or 0 for field, value in attempts.items()})
+
+    if create:
+        ChildFeatures.objects.update_or_create(child_id=child_id, defaults=totals)
+    else:
+        ChildFeatures.objects.filter(child_id=child_id).update(**totals, updated_at=timezone.now())
+
+
+def get_user_features(user_id, names=None):
+    """Model input vector for a child: one indexed row read, defaults if none yet.
+
+    ``names`` are the model's inputs (stored fields or the mean properties of
+    ChildFeatures), by default ChildFeatures.MODEL_FEATURES.
+    """
+    names = list(names or ChildFeatures.MODEL_FEATURES)
+    if names == ChildFeatures.MODEL_FEATURES:
+        row = ChildFeatures.objects.filter(child_id=user_id).values_list(*names).first()
+        if row is None:
+            return [ChildFeatures._meta.get_field(name).default for name in names]
+        return list(row)
+    features = ChildFeatures.objects.filter(child_id=user_id).first() or ChildFeatures(child_id=user_id)
+    return [getattr(features, name) for name in names]
@@ -0,0 +1,135 @@
+"""
+Speech fluency of a recorded answer (EvaluationData.speech_fluency_metrics).
+
+The clip is read block by block (frame_energy_blocks): each block of
+BLOCK_FRAMES 20 ms frames is decoded, downmixed and turned into per-frame
+energy with numpy, and only that block is in memory, so a long rapid naming
+recording costs no more than a short one. FluencyAnalyzer classifies frames
+as voiced (energy STT_FLUENCY_MARGIN_DB above the quietest frames heard so
+far, and above an absolute floor) and keeps run lengths only:
+
+    duration_s                  length of the clip
+    time_to_first_phonation_s   silence before the first voiced frame
+    speaking_time_s             first to last voiced frame
+    voiced_ratio                voiced frames / all frames
+    pause_count, pause_total_s, pause_mean_s, longest_pause_s
+                                silences of at least STT_FLUENCY_MIN_PAUSE_MS
+                                between voiced stretches
+    segments, segments_per_second
+                                voiced stretches separated by such pauses
+    words_per_second            transcript words over speaking time, when
+                                there is a transcript
+"""
+import wave
+
+import numpy as np
+
+from .audio_preprocess import FRAME_MS, decode_pcm, downmix, frame_db
+
+BLOCK_FRAMES = 250  # 5 s of 20 ms frames
+
+
+def frame_energy_blocks(fileobj, frame_ms=FRAME_MS, block_frames=BLOCK_FRAMES):
+    """Yield (frame energies in dB, frame length in seconds) a block at a time."""
+    with wave.open(fileobj) as wav:
+        channels, width, rate = wav.getnchannels(), wav.getsampwidth(), wav.getframerate()
+        frame_length = max(int(rate * frame_ms / 1000), 1)
+        frame_seconds = frame_length / rate
+        carry = np.empty(0, dtype=np.float32)
+        while raw := wav.readframes(frame_length * block_frames):
+            samples = downmix(decode_pcm(raw, width, channels))
+            if len(carry):
+                samples = np.concatenate([carry, samples])
+            usable = len(samples) - len(samples) % frame_length
+            carry = samples[usable:]
+            if usable:
+                yield frame_db(samples[:usable], frame_length), frame_seconds
+
+
+class FluencyAnalyzer:
+    def __init__(self, frame_seconds, min_pause_ms=250, margin_db=12.0, floor_db=-45.0):
+        self.frame_seconds = frame_seconds
+        self.min_pause = max(int(round(min_pause_ms / 1000 / frame_seconds)), 1)
+        self.margin_db = margin_db
+        self.floor_db = floor_db
+        self.noise_db = None
+        self.frames = 0
+        self.voiced_frames = 0
+        self.first_voiced = None
+        self.voiced_end = None
+        self.segments = 0
+        self.pauses = []
+        self._silence = 0  # frames of silence since the last voiced frame
+
+    def feed(self, energy):
+        quiet = float(np.percentile(energy, 10))
+        self.noise_db = quiet if self.noise_db is None else min(self.noise_db, quiet)
+        voiced = energy > max(self.noise_db + self.margin_db, self.floor_db)
+        self.voiced_frames += int(np.count_nonzero(voiced))
+        # Walk the runs, not the frames
+        changes = np.flatnonzero(voiced[1:] != voiced[:-1]) + 1
+        bounds = np.concatenate(([0], changes, [len(voiced)]))
+        for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+            self._run(bool(voiced[start]), end - start)
+
+    def _run(self, voiced, length):
+        if voiced:
+            if self.first_voiced is None:
+                self.first_voiced = self.frames
+                self.segments = 1
+            elif self._silence >= self.min_pause:
+                self.pauses.append(self._silence)
+                self.segments += 1
+            self._silence = 0
+            self.voiced_end = self.frames + length
+        else:
+            self._silence += length
+        self.frames += length
+
+    def result(self, transcript=None):
+        seconds = self.frame_seconds
+        metrics = {
+            "duration_s": round(self.frames * seconds, 3),
+            "time_to_first_phonation_s": None,
+            "speaking_time_s": 0.0,
+            "voiced_ratio": round(self.voiced_frames / self.frames, 3) if self.frames else 0.0,
+            "pause_count": len(self.pauses),
+            "pause_total_s": round(sum(self.pauses) * seconds, 3),
+            "pause_mean_s": round(sum(self.pauses) / len(self.pauses) * seconds, 3) if self.pauses else 0.0,
+            "longest_pause_s": round(max(self.pauses, default=0) * seconds, 3),
+            "segments": self.segments,
+            "segments_per_second": 0.0,
+        }
+        if self.first_voiced is not None:
+            speaking = (self.voiced_end - self.first_voiced) * seconds
+            metrics["time_to_first_phonation_s"] = round(self.first_voiced * seconds, 3)
+            metrics["speaking_time_s"] = round(speaking, 3)
+            metrics["segments_per_second"] = round(self.segments / speaking, 3) if speaking else 0.0
+        if transcript is not None:
+            add_transcript(metrics, transcript)
+        return metrics
+
+
+def add_transcript(metrics, transcript):
+    speaking = metrics["speaking_time_s"]
+    words = len(str(transcript).split())
+    metrics["words"] = words
+    metrics["words_per_second"] = round(words / speaking, 3) if speaking else 0.0
+    return metrics
+
+
+def analyze(fileobj, transcript=None, min_pause_ms=250, margin_db=12.0, block_frames=BLOCK_FRAMES):
+    """Fluency metrics of a WAV file object (rewound afterwards); None for anything else."""
+    analyzer = None
+    try:
+        for energy, frame_seconds in frame_energy_blocks(fileobj, block_frames=block_frames):
+            if analyzer is None:
+                analyzer = FluencyAnalyzer(frame_seconds, min_pause_ms=min_pause_ms, margin_db=margin_db)
+            analyzer.feed(energy)
+    except (wave.Error, EOFError, ValueError):
+        return None
+    finally:
+        fileobj.seek(0)
+    if analyzer is None:
+        return None
+    return analyzer.result(transcript)
@@ -0,0 +1,278 @@
+"""
+Background jobs, so heavy work doesn't hold a web worker.
+
+A task is a plain function registered with @task. Views call enqueue(),
+which stores a Job row and hands its id to the configured broker
+(settings.JOBS_BROKER), then return right away. Clients poll the job
+status endpoint.
+
+    "celery"  Celery workers (config/celery.py), `celery -A config worker`
+    "local"   the Job table is the queue: a thread pool in the web process
+              runs new jobs, and `manage.py run_jobs` drains whatever is
+              left (queued before a restart, or with no web process running)
+    "eager"   runs inline inside enqueue(), for tests and debugging
+
+Whatever the broker, run_job() does the work: it claims the row with a
+conditional UPDATE (so a job never runs twice), records timings and retries
+failed attempts with exponential backoff.
+
+A claim is a lease of JOBS_LEASE_SECONDS. A job still RUNNING after that
+(its worker crashed or was restarted) is re-queued, or failed once it is out
+of retries, by recover_stale(); run_pending() calls it first, so
+`manage.py run_jobs` picks such jobs up again. An attempt that outlives its
+lease can't overwrite the outcome of the attempt that replaced it.
+"""
+import logging
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Avg, Count, F, Max, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+class PermanentError(Exception):
+    """Raised by a task for failures that a retry can't fix."""
+
+
+class TaskSpec:
+    def __init__(self, func, name, max_retries, retry_delay):
+        self.func = func
+        self.name = name
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+    def backoff(self, attempt):
+        return self.retry_delay * 2 ** (attempt - 1)
+
+
+TASKS = {}
+
+
+def task(name, max_retries=2, retry_delay=5):
+    """Register `func(job, **args)` as a background task."""
+    def decorator(func):
+        TASKS[name] = TaskSpec(func, name, max_retries, retry_delay)
+        return func
+    return decorator
+
+
+# =========================
+# Running a job
+# =========================
+def _claim(job_id):
+    now = timezone.now()
+    claimed = Job.objects.filter(pk=job_id, status__in=Job.PENDING).filter(
+        Q(run_after__isnull=True) | Q(run_after__lte=now)
+    ).update(status=Job.RUNNING, started_at=now, attempts=F("attempts") + 1)
+    return Job.objects.get(pk=job_id) if claimed else None
+
+
+_OUTCOME_FIELDS = ["status", "result", "error", "payload", "run_after", "finished_at", "queue_seconds",
+                   "run_seconds"]
+
+
+def _save_outcome(job):
+    """Save the attempt's outcome if the job's lease is still ours."""
+    held = Job.objects.filter(pk=job.pk, status=Job.RUNNING, started_at=job.started_at).update(
+        **{field: getattr(job, field) for field in _OUTCOME_FIELDS}
+    )
+    if not held:
+        logger.warning("Job %s (%s) finished after its lease expired, outcome dropped", job.pk, job.name)
+    return bool(held)
+
+
+def run_job(job_id):
+    """Run one attempt of a job; returns the Job, or None if it wasn't runnable."""
+    job = _claim(job_id)
+    if job is None:
+        return None
+    spec = TASKS.get(job.name)
+    if job.queue_seconds is None:
+        job.queue_seconds = (job.started_at - job.created_at).total_seconds()
+
+    started = time.perf_counter()
+    try:
+        if spec is None:
+            raise PermanentError(f"Unknown task {job.name!r}")
+        result = spec.func(job, **job.args)
+    except Exception as e:
+        job.run_seconds = (job.run_seconds or 0.0) + time.perf_counter() - started
+        job.error = f"{type(e).__name__}: {e}"
+        retry = spec is not None and not isinstance(e, PermanentError) and job.attempts <= spec.max_retries
+        if retry:
+            delay = spec.backoff(job.attempts)
+            job.status = Job.RETRYING
+            job.run_after = timezone.now() + timedelta(seconds=delay)
+            logger.warning("Job %s (%s) attempt %s failed, retrying in %ss: %s",
+                           job.pk, job.name, job.attempts, delay, job.error)
+        else:
+            job.status = Job.FAILED
+            job.payload = None
+            job.finished_at = timezone.now()
+            logger.error("Job %s (%s) failed:\n%s", job.pk, job.name, traceback.format_exc())
+        if _save_outcome(job) and retry:
+            get_broker().enqueue(job.pk, delay=delay)
+        return job
+
+    job.run_seconds = (job.run_seconds or 0.0) + time.perf_counter() - started
+    job.status = Job.SUCCEEDED
+    job.result = result
+    job.error = ""
+    job.payload = None
+    job.finished_at = timezone.now()
+    _save_outcome(job)
+    return job
+
+
+def enqueue(name, user=None, payload=None, **args):
+    """Store a job and hand it to the broker once the row is committed."""
+    if name not in TASKS:
+        raise KeyError(f"Unknown task {name!r}")
+    job = Job.objects.create(name=name, user=user, payload=payload, args=args)
+    transaction.on_commit(lambda: get_broker().enqueue(job.pk))
+    return job
+
+
+# =========================
+# Brokers
+# =========================
+class EagerBroker:
+    """Runs the job inline (retries included, without the backoff sleep)."""
+
+    def enqueue(self, job_id, delay=0):
+        if delay:
+            Job.objects.filter(pk=job_id).update(run_after=None)
+        run_job(job_id)
+
+
+class LocalBroker:
+    """In-process thread pool over the Job table."""
+
+    def __init__(self, workers=2):
+        self.workers = workers
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        # Thread pools don't survive a fork; each worker process makes its own.
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="jobs")
+                self._pid = os.getpid()
+            return self._executor
+
+    def enqueue(self, job_id, delay=0):
+        if delay:
+            timer = threading.Timer(delay, self.enqueue, args=(job_id,))
+            timer.daemon = True
+            timer.start()
+            return
+        self._pool().submit(self._run, job_id)
+
+    @staticmethod
+    def _run(job_id):
+        close_old_connections()
+        try:
+            run_job(job_id)
+        finally:
+            close_old_connections()
+
+
+class CeleryBroker:
+    def enqueue(self, job_id, delay=0):
+        from config.celery import run_job_task
+
+        run_job_task.apply_async(args=(str(job_id),), countdown=delay or None)
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        kind = getattr(settings, "JOBS_BROKER", "local")
+        if kind == "celery":
+            _broker = CeleryBroker()
+        elif kind == "eager":
+            _broker = EagerBroker()
+        else:
+            _broker = LocalBroker(workers=getattr(settings, "JOBS_LOCAL_WORKERS", 2))
+    return _broker
+
+
+def reset_broker():
+    """Forget the broker, so a changed JOBS_BROKER setting takes effect (tests)."""
+    global _broker
+    _broker = None
+
+
+def recover_stale(lease=None):
+    """Re-queue (or fail, when out of retries) RUNNING jobs whose lease expired.
+
+    Returns the number of jobs recovered.
+    """
+    if lease is None:
+        lease = getattr(settings, "JOBS_LEASE_SECONDS", 3600)
+    now = timezone.now()
+    stale = Job.objects.filter(status=Job.RUNNING, started_at__lt=now - timedelta(seconds=lease))
+    count = 0
+    for job in stale.only("pk", "name", "attempts", "started_at"):
+        spec = TASKS.get(job.name)
+        error = f"LeaseExpired: still running after {lease}s, worker presumed dead"
+        if spec is not None and job.attempts <= spec.max_retries:
+            changes = {"status": Job.RETRYING, "run_after": None, "error": error}
+        else:
+            changes = {"status": Job.FAILED, "payload": None, "finished_at": now, "error": error}
+        # Conditional, like _claim: the worker may have finished meanwhile
+        if Job.objects.filter(pk=job.pk, status=Job.RUNNING, started_at=job.started_at).update(**changes):
+            logger.warning("Job %s (%s) lease expired: %s", job.pk, job.name, changes["status"])
+            count += 1
+    return count
+
+
+def run_pending(limit=None):
+    """Run queued jobs that are due, oldest first (used by `manage.py run_jobs`)."""
+    recover_stale()
+    now = timezone.now()
+    due = Job.objects.filter(status__in=Job.PENDING).filter(
+        Q(run_after__isnull=True) | Q(run_after__lte=now)
+    ).order_by("created_at").values_list("pk", flat=True)
+    count = 0
+    for job_id in due[:limit] if limit else due:
+        if run_job(job_id) is not None:
+            count += 1
+    return count
+
+
+# =========================
+# Metrics
+# =========================
+def stats():
+    """Per-task counts by status and timings, from the Job table (so across all workers)."""
+    rows = Job.objects.values("name").annotate(
+        total=Count("pk"),
+        queued=Count("pk", filter=Q(status__in=Job.PENDING)),
+        running=Count("pk", filter=Q(status=Job.RUNNING)),
+        succeeded=Count("pk", filter=Q(status=Job.SUCCEEDED)),
+        failed=Count("pk", filter=Q(status=Job.FAILED)),
+        retried=Count("pk", filter=Q(attempts__gt=1)),
+        avg_queue_seconds=Avg("queue_seconds"),
+        avg_run_seconds=Avg("run_seconds", filter=Q(status=Job.SUCCEEDED)),
+        max_run_seconds=Max("run_seconds"),
+    )
+    return {
+        "broker": getattr(settings, "JOBS_BROKER", "local"),
+        "tasks": {row.pop("name"): row for row in rows},
+    }
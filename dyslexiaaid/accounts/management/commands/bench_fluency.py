@@ -0,0 +1,80 @@
+"""
+Fluency analysis throughput, in seconds of audio per CPU-second.
+
+    python manage.py bench_fluency --seconds 120 --clips 5 --rate 44100 --channels 2
+
+Clips of naming-like speech (bursts with pauses in between) are written to
+temporary WAV files and analysed from disk, so the peak memory shows that a
+clip is never loaded whole.
+"""
+import os
+import tempfile
+import time
+import tracemalloc
+import wave
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from accounts import fluency
+
+
+def _write_clip(path, rng, seconds, rate, channels):
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        written = 0.0
+        while written < seconds:
+            word = rng.uniform(0.25, 0.6)
+            pause = rng.uniform(0.1, 0.9)
+            t = np.arange(int(word * rate)) / rate
+            burst = 0.4 * np.sin(2 * np.pi * rng.uniform(120, 300) * t) * np.hanning(len(t))
+            signal = np.concatenate([burst, rng.normal(0, 0.002, int(pause * rate))])
+            pcm = (np.repeat(signal[:, None], channels, axis=1) * 32767).astype("<i2")
+            wav.writeframes(pcm.tobytes())
+            written += word + pause
+    return written
+
+
+class Command(BaseCommand):
+    help = "Benchmark the speech fluency analysis in seconds of audio per CPU-second"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clips", type=int, default=5)
+        parser.add_argument("--seconds", type=float, default=60.0, help="length of each clip")
+        parser.add_argument("--rate", type=int, default=16000)
+        parser.add_argument("--channels", type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(0)
+        workdir = tempfile.mkdtemp()
+        paths, audio_seconds = [], 0.0
+        try:
+            for i in range(options["clips"]):
+                path = os.path.join(workdir, f"clip{i}.wav")
+                audio_seconds += _write_clip(path, rng, options["seconds"], options["rate"], options["channels"])
+                paths.append(path)
+            clip_mb = os.path.getsize(paths[0]) / 2 ** 20
+
+            tracemalloc.start()
+            cpu, wall = time.process_time(), time.perf_counter()
+            results = []
+            for path in paths:
+                with open(path, "rb") as f:
+                    results.append(fluency.analyze(f))
+            cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        finally:
+            for path in paths:
+                os.remove(path)
+            os.rmdir(workdir)
+
+        self.stdout.write(f"{len(paths)} clips of {audio_seconds / len(paths):.0f}s, {options['rate']} Hz "
+                          f"x{options['channels']} ({clip_mb:.1f} MB each)")
+        self.stdout.write(f"example: {results[0]}")
+        self.stdout.write(f"peak memory while analysing: {peak / 2 ** 20:.1f} MB")
+        self.stdout.write(self.style.SUCCESS(
+            f"{audio_seconds / cpu:.0f} s of audio per CPU-second ({audio_seconds / wall:.0f}x real time wall clock)"
+        ))
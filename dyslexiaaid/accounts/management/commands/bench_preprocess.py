@@ -0,0 +1,91 @@
+"""
+Audio preprocessing: what it costs and what it saves the recognizer.
+
+    python manage.py bench_preprocess --clips 50 --rate 48000 --channels 2 --silence 1.0
+
+Synthetic answers (tone bursts with --silence seconds of room noise on each
+side, as browsers record them) are preprocessed and then prepared for the
+Google engine the way recognize_google does it locally (decode + FLAC
+encoding at the clip's rate), with and without preprocessing. The network
+round trip is not included; the FLAC bytes are what it would upload.
+"""
+import io
+import statistics
+import time
+import wave
+
+import numpy as np
+import speech_recognition as sr
+from django.core.management.base import BaseCommand
+
+from accounts import audio_preprocess
+
+
+def _clip(rng, rate, channels, silence, speech):
+    noise = lambda seconds: rng.normal(0, 0.002, int(seconds * rate))  # noqa: E731
+    t = np.arange(int(speech * rate)) / rate
+    voice = 0.4 * np.sin(2 * np.pi * rng.uniform(120, 300) * t) * np.hanning(len(t))
+    mono = np.concatenate([noise(silence), voice + noise(speech), noise(silence)])
+    pcm = (np.repeat(mono[:, None], channels, axis=1) * 32767).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def _google_local_work(fileobj):
+    """(ms, FLAC bytes) of what recognize_google does before it sends the audio."""
+    started = time.perf_counter()
+    recognizer = sr.Recognizer()
+    with sr.AudioFile(fileobj) as source:
+        audio = recognizer.record(source)
+    flac = audio.get_flac_data(convert_rate=None if audio.sample_rate >= 8000 else 8000, convert_width=2)
+    return (time.perf_counter() - started) * 1000, len(flac)
+
+
+class Command(BaseCommand):
+    help = "Benchmark audio preprocessing (downmix, resample, silence trim) before recognition"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clips", type=int, default=30)
+        parser.add_argument("--rate", type=int, default=48000)
+        parser.add_argument("--channels", type=int, default=2)
+        parser.add_argument("--silence", type=float, default=1.0, help="seconds before and after the answer")
+        parser.add_argument("--speech", type=float, default=0.8, help="seconds of answer")
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(0)
+        clips = [_clip(rng, options["rate"], options["channels"], options["silence"], options["speech"])
+                 for _ in range(options["clips"])]
+        seconds = len(clips) * (2 * options["silence"] + options["speech"])
+
+        reports, raw, cleaned = [], [], []
+        started = time.perf_counter()
+        for clip in clips:
+            audio, report = audio_preprocess.preprocess(io.BytesIO(clip))
+            reports.append(report)
+        preprocess_seconds = time.perf_counter() - started
+        for clip, report in zip(clips, reports):
+            raw.append(_google_local_work(io.BytesIO(clip)))
+            audio, _ = audio_preprocess.preprocess(io.BytesIO(clip))
+            cleaned.append(_google_local_work(audio))
+
+        done = [report for report in reports if report]
+        self.stdout.write(f"{len(clips)} clips, {options['rate']} Hz x{options['channels']}, "
+                          f"{seconds / len(clips):.1f}s each")
+        self.stdout.write(f"preprocess: {preprocess_seconds / len(clips) * 1000:.2f} ms/clip, "
+                          f"{seconds / preprocess_seconds:.0f}x real time")
+        if done:
+            self.stdout.write(f"audio kept: {sum(r['seconds_out'] for r in done) / sum(r['seconds_in'] for r in done):.0%}"
+                              f", WAV bytes saved: {statistics.mean(r['bytes_saved'] for r in done) / 1024:.0f} KB/clip")
+        for name, runs in (("untouched", raw), ("preprocessed", cleaned)):
+            self.stdout.write(f"{name:<13} google local work p50 {statistics.median(ms for ms, _ in runs):7.2f} ms, "
+                              f"FLAC upload {statistics.mean(size for _, size in runs) / 1024:6.0f} KB")
+        saved_ms = statistics.median(ms for ms, _ in raw) - statistics.median(ms for ms, _ in cleaned)
+        self.stdout.write(self.style.SUCCESS(
+            f"saved per request: {saved_ms:.2f} ms before upload, "
+            f"{(statistics.mean(s for _, s in raw) - statistics.mean(s for _, s in cleaned)) / 1024:.0f} KB upload"
+        ))
@@ -0,0 +1,96 @@
+"""
+Evaluation scoring: the old per-question loop against accounts.scoring.
+
+    python manage.py bench_scoring --submissions 20000
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts import question_bank, scoring
+
+
+def legacy_score(dyslexia_type, questions, responses):
+    """The scoring loop evaluation_test used before accounts/scoring.py."""
+    score = 0
+    for question in questions:
+        response = responses.get(question['id'], '')
+        if response and question.get('expected'):
+            expected = question['expected']
+            if question.get('timed', False):
+                if response and response != 'no_response':
+                    score += 1
+            elif question['id'] == 4 and dyslexia_type == "Rapid naming deficit":
+                numbers = ['one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine', 'ten']
+                said_numbers = [num for num in numbers if num in response]
+                if len(said_numbers) >= 8:
+                    score += 1
+            elif question['id'] == 2 and dyslexia_type == "Rapid naming deficit":
+                days = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+                said_days = [day for day in days if day in response]
+                if len(said_days) >= 5:
+                    score += 1
+            elif isinstance(expected, (list, tuple)):
+                if any(exp.lower() in response or response in exp.lower() for exp in expected):
+                    score += 1
+            else:
+                expected_str = str(expected).lower()
+                if response == expected_str or expected_str in response or response in expected_str:
+                    score += 1
+    return score
+
+
+def _fake_response(question, rng):
+    answers = list(question["expected_normalized"])
+    words = [word for tokens in question["expected_tokens"] for word in tokens]
+    choice = rng.random()
+    if choice < 0.4:
+        return rng.choice(answers)
+    if choice < 0.6:
+        return " ".join(rng.sample(words, k=max(1, len(words) - rng.randint(0, 3))))
+    if choice < 0.8:
+        return f"um {rng.choice(answers)} i think"
+    if choice < 0.9:
+        return rng.choice(["", "no_response", "dunno"])
+    return " ".join(rng.choice(["bat", "sat", "dog", "blue", "seven", "friday"]) for _ in range(rng.randint(1, 6)))
+
+
+class Command(BaseCommand):
+    help = "Benchmark the precompiled evaluation scorer against the old scoring loop"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--submissions", type=int, default=20000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        bank = question_bank.get_bank()
+        self.stdout.write(f"{'test':<24} {'legacy µs':>10} {'engine µs':>10} {'batch µs':>9} {'speedup':>8} {'agree':>7}")
+        for dyslexia_type in bank.types:
+            questions = bank.questions(dyslexia_type)
+            submissions = [
+                {q["id"]: _fake_response(q, rng) for q in questions} for _ in range(options["submissions"])
+            ]
+            engine = scoring.get_engine(dyslexia_type)
+
+            started = time.perf_counter()
+            legacy = [legacy_score(dyslexia_type, questions, s) for s in submissions]
+            legacy_s = time.perf_counter() - started
+
+            started = time.perf_counter()
+            single = [engine.score_submission(s)[0] for s in submissions]
+            single_s = time.perf_counter() - started
+
+            started = time.perf_counter()
+            batch = engine.score_batch(submissions)
+            batch_s = time.perf_counter() - started
+
+            assert single == batch
+            n = len(submissions)
+            agree = sum(a == b for a, b in zip(legacy, batch)) / n
+            self.stdout.write(
+                f"{dyslexia_type:<24} {legacy_s / n * 1e6:>10.1f} {single_s / n * 1e6:>10.1f} "
+                f"{batch_s / n * 1e6:>9.1f} {legacy_s / batch_s:>7.1f}x {agree:>7.1%}"
+            )
+        self.stdout.write("Disagreements are the word-boundary and threshold fixes, see accounts/scoring.py")
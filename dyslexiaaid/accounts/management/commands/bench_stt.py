@@ -0,0 +1,104 @@
+"""
+Upload handling of speech_to_text_api: the old fixed temp_audio.wav round
+trip against reading the upload's own buffer (accounts/speech.py).
+
+    python manage.py bench_stt --requests 500 --seconds 3 --threads 8
+
+Recognition itself is replaced by a stand-in backend that reports which clip it was
+given, so the timings are the audio handling alone and the concurrent run
+counts how often a request got another request's audio.
+"""
+import io
+import os
+import statistics
+import tempfile
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+
+from accounts import speech, stt_backends
+
+
+def legacy_recognize(audio_file, path):
+    """What speech_to_text_api did before speech.py, minus the network call."""
+    with open(path, 'wb+') as destination:
+        for chunk in audio_file.chunks():
+            destination.write(chunk)
+    return speech.recognize(path, _WhichClip())
+
+
+def _clip(index, seconds, rate=16000):
+    frames = bytes([index % 256]) * int(seconds * rate)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(1)
+        wav.setframerate(rate)
+        wav.writeframes(frames)
+    return buffer.getvalue()
+
+
+class _WhichClip(stt_backends.SpeechBackend):
+    name = "which-clip"
+
+    def transcribe(self, audio_data):
+        return str(audio_data.frame_data[0])
+
+
+class Command(BaseCommand):
+    help = "Benchmark in-memory audio handling in speech_to_text_api against the old temp file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=300)
+        parser.add_argument("--seconds", type=float, default=3.0, help="length of each clip")
+        parser.add_argument("--threads", type=int, default=8)
+
+    def handle(self, *args, **options):
+        clips = [_clip(i, options["seconds"]) for i in range(options["requests"])]
+        workdir = tempfile.mkdtemp()
+        shared_path = os.path.join(workdir, "temp_audio.wav")
+        lock = threading.Lock()
+
+        def run(name, transcribe, threads):
+            uploads = [SimpleUploadedFile("answer.wav", data) for data in clips]
+            latencies = []
+
+            def one(index):
+                started = time.perf_counter()
+                result = transcribe(uploads[index])
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed * 1000)
+                return result.get("text") == str(index % 256)
+
+            started = time.perf_counter()
+            if threads == 1:
+                results = [one(i) for i in range(len(uploads))]
+            else:
+                with ThreadPoolExecutor(max_workers=threads) as pool:
+                    results = list(pool.map(one, range(len(uploads))))
+            elapsed = time.perf_counter() - started
+            wrong = results.count(False)
+            latencies.sort()
+            self.stdout.write(
+                f"{name:<28} p50 {statistics.median(latencies):7.3f} ms  "
+                f"p99 {latencies[int(len(latencies) * 0.99) - 1]:7.3f} ms  "
+                f"{len(uploads) / elapsed:8.0f} req/s  wrong audio: {wrong}"
+            )
+
+        legacy = lambda upload: legacy_recognize(upload, shared_path)  # noqa: E731
+        current = lambda upload: speech.recognize(speech.audio_source(upload), _WhichClip())  # noqa: E731
+        self.stdout.write(f"{len(clips)} clips of {options['seconds']}s ({len(clips[0]) / 1024:.0f} KB)")
+        try:
+            run("temp_audio.wav, serial", legacy, 1)
+            run("in-memory, serial", current, 1)
+            run(f"temp_audio.wav, {options['threads']} threads", legacy, options["threads"])
+            run(f"in-memory, {options['threads']} threads", current, options["threads"])
+        finally:
+            if os.path.exists(shared_path):
+                os.remove(shared_path)
+            os.rmdir(workdir)
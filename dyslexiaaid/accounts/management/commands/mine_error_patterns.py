@@ -0,0 +1,73 @@
+"""
+Fill EvaluationData.error_patterns for stored evaluations.
+
+    python manage.py mine_error_patterns [--chunk-size 1000] [--batch-size 500] [--all] [--dry-run]
+
+Rows are read in primary-key order one keyset page at a time, every answer
+in stt_responses is aligned against its expected answer (accounts/
+error_patterns.py, alignments cached per (expected, response) pair) and the
+rows whose patterns changed are written back with bulk_update. By default
+only evaluations never mined (error_patterns NULL) are processed, so a
+second run finds nothing to do; --all recomputes every row, e.g. after the
+classification rules changed.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts import error_patterns, question_bank
+from accounts.models import EvaluationData
+
+
+class Command(BaseCommand):
+    help = "Classify the errors in stored evaluation answers into EvaluationData.error_patterns"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000, help="rows fetched per query")
+        parser.add_argument("--batch-size", type=int, default=500, help="rows per bulk_update")
+        parser.add_argument("--all", action="store_true", help="also re-mine rows that were already mined")
+        parser.add_argument("--dry-run", action="store_true", help="count the patterns without writing them")
+
+    def handle(self, *args, **options):
+        rows = EvaluationData.objects.order_by("pk").only("pk", "dyslexia_type", "stt_responses", "error_patterns")
+        if not options["all"]:
+            rows = rows.filter(error_patterns__isnull=True)
+        chunk_size = options["chunk_size"]
+
+        bank = question_bank.get_bank()
+        evaluations = answers = updated = 0
+        totals = {}
+        started = time.perf_counter()
+        last_pk = 0
+        while True:
+            page = list(rows.filter(pk__gt=last_pk)[:chunk_size])
+            if not page:
+                break
+            last_pk = page[-1].pk
+            changed = []
+            for evaluation in page:
+                entries = error_patterns.analyze_evaluation(
+                    evaluation.stt_responses, bank.questions(evaluation.dyslexia_type))
+                answers += len(evaluation.stt_responses or {})
+                for kind, count in error_patterns.summarize(entries).items():
+                    totals[kind] = totals.get(kind, 0) + count
+                if entries != evaluation.error_patterns:
+                    evaluation.error_patterns = entries
+                    changed.append(evaluation)
+            evaluations += len(page)
+            updated += len(changed)
+            if changed and not options["dry_run"]:
+                with transaction.atomic():
+                    EvaluationData.objects.bulk_update(changed, ["error_patterns"], batch_size=options["batch_size"])
+        elapsed = time.perf_counter() - started
+
+        for kind, count in sorted(totals.items(), key=lambda item: -item[1]):
+            self.stdout.write(f"  {kind:<18} {count}")
+        cache = error_patterns.cache_stats()
+        verb = "would update" if options["dry_run"] else "updated"
+        self.stdout.write(self.style.SUCCESS(
+            f"Mined {answers} answers of {evaluations} evaluations in {elapsed:.2f}s "
+            f"({answers / elapsed if elapsed else 0:.0f} answers/s, alignment cache hit rate "
+            f"{(cache['hit_rate'] or 0):.0%}), {verb} {updated}"
+        ))
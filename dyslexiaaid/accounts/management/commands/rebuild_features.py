@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from accounts import feature_store
+from accounts.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = "Recompute the ChildFeatures store from EvaluationData and lesson attempts"
+
+    def add_arguments(self, parser):
+        parser.add_argument("child_ids", nargs="*", type=int, help="Only these children (default: all)")
+
+    def handle(self, *args, **options):
+        child_ids = options["child_ids"] or CustomUser.objects.filter(
+            role__in=["CHILD", "INDEPENDENT"]
+        ).values_list("id", flat=True)
+        count = 0
+        for child_id in child_ids:
+            feature_store.rebuild(child_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt features for {count} children"))
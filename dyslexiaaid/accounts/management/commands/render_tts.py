@@ -0,0 +1,69 @@
+"""
+Render the audio of every lesson and question text now (accounts/tts.py).
+
+    python manage.py render_tts [--rate slow] [--prune] [--dry-run]
+
+Texts already rendered are skipped, so this is cheap to run after each
+deploy or content import. --prune deletes the files no current text uses any
+more (edited texts, another synthesizer, rate or TTS_CACHE_VERSION).
+"""
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from accounts import tts
+from accounts.models import EvaluationQuestion
+from lessons.models import Lesson
+
+
+class Command(BaseCommand):
+    help = "Render text to speech audio for lessons and evaluation questions"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rate", choices=tts.RATES, help="defaults to TTS_RATE")
+        parser.add_argument("--prune", action="store_true", help="delete audio of texts no longer in use")
+        parser.add_argument("--dry-run", action="store_true", help="only count what would be rendered or pruned")
+
+    def handle(self, *args, **options):
+        texts = set()
+        for content_text, prompt in Lesson.objects.values_list("content_text", "prompt").iterator():
+            texts.update((content_text, prompt))
+        texts.update(EvaluationQuestion.objects.values_list("text", flat=True))
+        texts = sorted({tts.clean(text) for text in texts} - {""})
+
+        keys = {tts.key(text, options["rate"]): text for text in texts}
+        missing = [text for audio_key, text in keys.items() if not os.path.exists(tts.path(audio_key))]
+        failed = 0
+        started = time.perf_counter()
+        if not options["dry_run"]:
+            for text in missing:
+                try:
+                    tts.render(text, options["rate"])
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"  failed: {text[:40]!r}: {type(e).__name__}: {e}")
+        elapsed = time.perf_counter() - started
+        verb = "would render" if options["dry_run"] else "rendered"
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(texts)} texts, {len(texts) - len(missing)} already rendered, "
+            f"{verb} {len(missing) - failed} in {elapsed:.1f}s" + (f", {failed} failed" if failed else "")
+        ))
+
+        if options["prune"]:
+            self._prune(set(keys), options["dry_run"])
+
+    def _prune(self, keep, dry_run):
+        removed = size = 0
+        for directory, _, files in os.walk(settings.TTS_ROOT):
+            for name in files:
+                if name.split(".")[0] in keep:
+                    continue
+                file_path = os.path.join(directory, name)
+                size += os.path.getsize(file_path)
+                removed += 1
+                if not dry_run:
+                    os.remove(file_path)
+        verb = "would prune" if dry_run else "pruned"
+        self.stdout.write(f"{verb} {removed} unused files ({size / 2 ** 20:.1f} MB)")
@@ -0,0 +1,200 @@
+"""
+Re-score stored evaluations with the current question bank and scoring rules.
+
+    python manage.py rescore_evaluations [--workers 4] [--chunk-size 1000] [--batch-size 500]
+    python manage.py rescore_evaluations --resume     # continue an interrupted run
+
+Rows are streamed in primary-key order, one keyset page of --chunk-size
+rows at a time through .iterator(chunk_size), and written back with
+bulk_update in batches (only the rows whose score,
+percentage or stt_accuracy actually change). The pk range is split into one
+contiguous slice per worker process; every worker records the last pk it
+committed after each page in the checkpoint file, so --resume continues each slice where it
+stopped. bulk_update sends no signals, so the feature store of every child
+whose scores changed is rebuilt at the end; the checkpoint keeps those
+children too, so the ones changed before an interruption are rebuilt by the
+resumed run. Workers set Django up themselves (process_setup.py), so any
+start method works, including spawn on Windows.
+
+Several workers only pay off on a database that takes concurrent writers
+(PostgreSQL/MySQL); SQLite serialises them.
+"""
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Max, Min
+
+from accounts import feature_store, scoring, suggestion_cache
+from accounts.models import EvaluationData
+from accounts.process_setup import init_django_worker
+
+FIELDS = ["score", "percentage", "stt_accuracy"]
+
+
+def rescore(evaluation):
+    """(score, percentage, stt_accuracy) of a stored evaluation under the current rules.
+
+    None when the bank has no questions for its type (nothing to score against).
+    """
+    engine = scoring.get_engine(evaluation.dyslexia_type)
+    if not engine.questions:
+        return None
+    responses = {
+        q_id: (data.get("response") if isinstance(data, dict) else data) or ""
+        for q_id, data in (evaluation.stt_responses or {}).items()
+    }
+    score, _ = engine.score_submission(responses)
+    total = evaluation.total_questions or len(engine.questions)
+    percentage = (score / total) * 100 if total > 0 else 0
+    # stt_accuracy is computed the same way in evaluation_test
+    return score, percentage, percentage
+
+
+# =========================
+# Checkpoint
+# =========================
+def _read_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_checkpoint(path, data):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp, path)
+
+
+def _slice_path(path, index):
+    return f"{path}.{index}"
+
+
+def _split(first, last, workers):
+    """Contiguous pk slices [start, end], one per worker."""
+    size = max((last - first + 1) // workers, 1)
+    slices, start = [], first
+    for i in range(workers):
+        end = last if i == workers - 1 else min(start + size - 1, last)
+        if start > last:
+            break
+        slices.append({"index": i, "start": start, "end": end})
+        start = end + 1
+    return slices
+
+
+# =========================
+# Worker
+# =========================
+def _rescore_slice(slice_, checkpoint, chunk_size, batch_size, dry_run):
+    started = time.perf_counter()
+    state = _read_checkpoint(_slice_path(checkpoint, slice_["index"])) or {}
+    watermark = max(state.get("watermark", slice_["start"] - 1), slice_["start"] - 1)
+    report = {"index": slice_["index"], "rows": 0, "updated": 0}
+    # Children changed before an interruption still need their rebuild
+    children = set(state.get("children", ()))
+
+    rows = (
+        EvaluationData.objects.filter(pk__lte=slice_["end"])
+        .order_by("pk")
+        .select_related("child_profile")
+        .only("pk", "user_id", "dyslexia_type", "stt_responses", "total_questions", *FIELDS, "child_profile__child_id")
+    )
+    last_pk = watermark
+    while True:
+        # Keyset pages: the read cursor is closed before the page is written
+        # back, so workers don't hold a read lock while others write.
+        page = rows.filter(pk__gt=last_pk)[:chunk_size]
+        changed, count = [], 0
+        for evaluation in page.iterator(chunk_size=chunk_size):
+            count += 1
+            last_pk = evaluation.pk
+            values = rescore(evaluation)
+            if values is not None and values != tuple(getattr(evaluation, field) for field in FIELDS):
+                evaluation.score, evaluation.percentage, evaluation.stt_accuracy = values
+                changed.append(evaluation)
+                children.add(feature_store.evaluation_child_id(evaluation))
+        if not count:
+            break
+        report["rows"] += count
+        report["updated"] += len(changed)
+        if not dry_run:
+            with transaction.atomic():
+                EvaluationData.objects.bulk_update(changed, FIELDS, batch_size=batch_size)
+            _write_checkpoint(_slice_path(checkpoint, slice_["index"]),
+                              {**slice_, "watermark": last_pk, "children": sorted(children)})
+
+    report["children"] = sorted(children)
+    report["seconds"] = time.perf_counter() - started
+    return report
+
+
+class Command(BaseCommand):
+    help = "Recompute score, percentage and stt_accuracy of stored evaluations with the current scoring rules"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=1)
+        parser.add_argument("--chunk-size", type=int, default=1000, help="rows fetched per query")
+        parser.add_argument("--batch-size", type=int, default=500, help="rows per bulk_update")
+        parser.add_argument("--checkpoint", default=os.path.join(settings.BASE_DIR, "rescore_checkpoint.json"))
+        parser.add_argument("--resume", action="store_true", help="continue the run recorded in the checkpoint")
+        parser.add_argument("--dry-run", action="store_true", help="count the changes without writing them")
+
+    def handle(self, *args, **options):
+        checkpoint = options["checkpoint"]
+        plan = _read_checkpoint(checkpoint) if options["resume"] else None
+        if options["resume"] and plan is None:
+            raise CommandError(f"No checkpoint at {checkpoint}")
+
+        if plan is None:
+            bounds = EvaluationData.objects.aggregate(first=Min("pk"), last=Max("pk"))
+            if bounds["first"] is None:
+                self.stdout.write("No evaluations to re-score")
+                return
+            plan = {"slices": _split(bounds["first"], bounds["last"], max(options["workers"], 1))}
+            for slice_ in plan["slices"]:
+                if os.path.exists(_slice_path(checkpoint, slice_["index"])):
+                    os.remove(_slice_path(checkpoint, slice_["index"]))
+            if not options["dry_run"]:
+                _write_checkpoint(checkpoint, plan)
+
+        args = (checkpoint, options["chunk_size"], options["batch_size"], options["dry_run"])
+        started = time.perf_counter()
+        if len(plan["slices"]) == 1:
+            reports = [_rescore_slice(plan["slices"][0], *args)]
+        else:
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=len(plan["slices"]), initializer=init_django_worker) as pool:
+                futures = [pool.submit(_rescore_slice, slice_, *args) for slice_ in plan["slices"]]
+                reports = [future.result() for future in futures]
+        elapsed = time.perf_counter() - started
+
+        children = {child_id for report in reports for child_id in report["children"]}
+        if not options["dry_run"]:
+            for child_id in children:
+                feature_store.rebuild(child_id)
+                suggestion_cache.invalidate(child_id)
+
+        for report in reports:
+            rate = report["rows"] / report["seconds"] if report["seconds"] else 0
+            self.stdout.write(f"worker {report['index']}: {report['rows']} rows, {report['updated']} changed, "
+                              f"{rate:.0f} rows/s")
+        rows = sum(report["rows"] for report in reports)
+        updated = sum(report["updated"] for report in reports)
+        verb = "would change" if options["dry_run"] else "changed"
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-scored {rows} evaluations in {elapsed:.2f}s ({rows / elapsed if elapsed else 0:.0f} rows/s), "
+            f"{verb} {updated}, rebuilt features of {0 if options['dry_run'] else len(children)} children"
+        ))
+        if not options["dry_run"]:
+            for slice_ in plan["slices"]:
+                if os.path.exists(_slice_path(checkpoint, slice_["index"])):
+                    os.remove(_slice_path(checkpoint, slice_["index"]))
+            os.remove(checkpoint)
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts import jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs from the Job table (worker for the local broker)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="run what is due now and exit")
+        parser.add_argument("--interval", type=float, default=1.0, help="seconds between polls")
+
+    def handle(self, *args, **options):
+        while True:
+            count = jobs.run_pending()
+            if count:
+                self.stdout.write(f"Ran {count} jobs")
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
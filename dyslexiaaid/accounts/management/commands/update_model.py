@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from accounts import online_training
+
+
+class Command(BaseCommand):
+    help = "Update the online suggestion model with the evaluations since its watermark"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="retrain from scratch over every evaluation")
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument("--path", default=None, help="artifact path (default: ML_ONLINE_MODEL_PATH)")
+
+    def handle(self, *args, **options):
+        if options["full"]:
+            report = online_training.full_retrain(options["path"], options["batch_size"])
+        else:
+            report = online_training.update(options["path"], options["batch_size"])
+
+        for i, seconds in enumerate(report["batch_seconds"], 1):
+            self.stdout.write(f"batch {i}: {seconds * 1000:.1f} ms")
+        self.stdout.write(
+            f"{report['mode']}: {report['rows']} rows in {report['batches']} batches, "
+            f"watermark {report['since']} -> {report['watermark']}, {report['seconds']:.2f}s"
+        )
+        if report["skipped"]:
+            self.stdout.write(self.style.WARNING(f"skipped {report['skipped']} evaluations of unknown types"))
+        if report.get("agreement_with_previous") is not None:
+            self.stdout.write(f"agreement with the previous model: {report['agreement_with_previous']:.1%}")
+        if report["published"]:
+            self.stdout.write(self.style.SUCCESS("Published new model version"))
+        else:
+            self.stdout.write("Nothing new to learn from, model unchanged")
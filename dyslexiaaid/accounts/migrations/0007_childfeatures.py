@@ -0,0 +1,42 @@
+# Generated by Django 5.1.6 on 2026-10-18 14:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_evaluationdata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChildFeatures',
+            fields=[
+                ('child', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ml_features', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('evaluation_count', models.PositiveIntegerField(default=0)),
+                ('score_sum', models.PositiveIntegerField(default=0)),
+                ('total_questions_sum', models.PositiveIntegerField(default=0)),
+                ('stt_accuracy_sum', models.FloatField(default=0.0)),
+                ('tts_usage_sum', models.PositiveIntegerField(default=0)),
+                ('completion_time_sum', models.FloatField(default=0.0)),
+                ('response_time_count', models.PositiveIntegerField(default=0)),
+                ('response_time_sum', models.FloatField(default=0.0)),
+                ('attempt_count', models.PositiveIntegerField(default=0)),
+                ('attempt_correct_count', models.PositiveIntegerField(default=0)),
+                ('attempt_time_ms_sum', models.PositiveBigIntegerField(default=0)),
+                ('attempt_tts_plays_sum', models.PositiveIntegerField(default=0)),
+                ('attempt_repeats_sum', models.PositiveIntegerField(default=0)),
+                ('n_fix_trial', models.FloatField(default=120)),
+                ('mean_fix_dur_trial', models.FloatField(default=220)),
+                ('n_sacc_trial', models.FloatField(default=85)),
+                ('n_regress_trial', models.FloatField(default=15)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'child_features',
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.6 on 2026-10-18 14:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EvaluationQuestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dyslexia_type', models.CharField(max_length=50)),
+                ('number', models.PositiveSmallIntegerField()),
+                ('text', models.TextField()),
+                ('interaction', models.CharField(choices=[('speech_recognition', 'Speech recognition'), ('multiple_choice', 'Multiple choice')], max_length=30)),
+                ('options', models.JSONField(blank=True, default=list)),
+                ('expected', models.JSONField(default=str)),
+                ('hint', models.CharField(blank=True, max_length=255)),
+                ('timed', models.BooleanField(default=False)),
+                ('time_limit', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'evaluation_questions',
+                'ordering': ['dyslexia_type', 'number'],
+                'unique_together': {('dyslexia_type', 'number')},
+            },
+        ),
+    ]
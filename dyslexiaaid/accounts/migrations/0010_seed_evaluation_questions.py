@@ -0,0 +1,54 @@
+from django.db import migrations
+
+# The question bank as it was hard-coded in views.evaluation_test:
+# (dyslexia_type, number, text, interaction, options, expected, hint, timed, time_limit)
+QUESTIONS = [
+    ('Phonological dyslexia', 1, "Say the word 'cat' aloud and record your pronunciation.", 'speech_recognition', [], 'cat', 'Speak clearly into your microphone', False, None),
+    ('Phonological dyslexia', 2, "Break the word 'sun' into individual sounds (phonemes).", 'speech_recognition', [], 's u n', 'Say each sound separately: s - u - n', False, None),
+    ('Phonological dyslexia', 3, "Which word rhymes with 'bat'? Choose one.", 'multiple_choice', ['cat', 'bed', 'book', 'run'], 'cat', 'Think of words that sound similar at the end', False, None),
+    ('Phonological dyslexia', 4, "What is the first sound you hear in 'fish'?", 'multiple_choice', ['f', 'sh', 'i', 'h'], 'f', 'Focus on the beginning sound', False, None),
+    ('Phonological dyslexia', 5, 'Blend these sounds together: /b/ /a/ /t/', 'speech_recognition', [], 'bat', 'Say the sounds quickly together: b-a-t', False, None),
+    ('Surface dyslexia', 1, "Read this word aloud: 'yacht'", 'speech_recognition', [], 'yacht', 'Try to recognize the whole word', False, None),
+    ('Surface dyslexia', 2, 'Which spelling is correct?', 'multiple_choice', ['friend', 'frend'], 'friend', 'Think about common spelling patterns', False, None),
+    ('Surface dyslexia', 3, "Read this sight word: 'the'", 'speech_recognition', [], 'the', 'Say it naturally', False, None),
+    ('Surface dyslexia', 4, 'Which word is spelled correctly?', 'multiple_choice', ['knight', 'nite'], 'knight', 'Consider standard English spelling', False, None),
+    ('Surface dyslexia', 5, "Does this sentence make sense? 'The cat sat on the mat.'", 'multiple_choice', ['Yes', 'No'], 'Yes', 'Think about word meaning in context', False, None),
+    ('Visual dyslexia', 1, 'Which letter is different? b d p q', 'multiple_choice', ['b', 'd', 'p', 'q'], 'q', 'Look carefully at each letter shape', False, None),
+    ('Visual dyslexia', 2, "Do these words look the same? 'was' and 'saw'", 'multiple_choice', ['Yes', 'No'], 'No', 'Look at the letter order', False, None),
+    ('Visual dyslexia', 3, 'Find the matching shapes: circle circle square triangle', 'multiple_choice', ['1st and 2nd', '2nd and 3rd', '3rd and 4th', 'All different'], '1st and 2nd', 'Look for identical shapes', False, None),
+    ('Visual dyslexia', 4, 'Which word has no reversed letters?', 'multiple_choice', ['bog', 'dog', 'qog', 'pog'], 'dog', 'Look for normally oriented letters', False, None),
+    ('Visual dyslexia', 5, 'Which number looks normal?', 'multiple_choice', ['2', '5', 'Ɛ', '7'], '7', 'Think about normal number shapes', False, None),
+    ('Rapid naming deficit', 1, 'Name these colors: red yellow blue green', 'speech_recognition', [], ['red', 'yellow', 'blue', 'green'], 'Say the color names in order', True, 8),
+    ('Rapid naming deficit', 2, 'Say the days of the week starting from Monday', 'speech_recognition', [], 'monday tuesday wednesday thursday friday saturday sunday', 'Go as fast as you can while being clear', True, 10),
+    ('Rapid naming deficit', 3, 'Name these shapes: star heart diamond club', 'speech_recognition', [], ['star', 'heart', 'diamond', 'club'], 'Say the shape names in order', True, 6),
+    ('Rapid naming deficit', 4, 'Count from 1 to 10', 'speech_recognition', [], 'one two three four five six seven eight nine ten', 'Say the numbers in order quickly', True, 8),
+    ('Rapid naming deficit', 5, 'Name these animals: dog cat mouse rabbit', 'speech_recognition', [], ['dog', 'cat', 'mouse', 'rabbit'], 'Say the animal names rapidly', True, 6),
+]
+
+
+def seed(apps, schema_editor):
+    EvaluationQuestion = apps.get_model("accounts", "EvaluationQuestion")
+    EvaluationQuestion.objects.bulk_create([
+        EvaluationQuestion(
+            dyslexia_type=dyslexia_type, number=number, text=text, interaction=interaction, options=options,
+            expected=expected, hint=hint, timed=timed, time_limit=time_limit,
+        )
+        for dyslexia_type, number, text, interaction, options, expected, hint, timed, time_limit in QUESTIONS
+    ])
+
+
+def unseed(apps, schema_editor):
+    EvaluationQuestion = apps.get_model("accounts", "EvaluationQuestion")
+    for dyslexia_type, number, *_ in QUESTIONS:
+        EvaluationQuestion.objects.filter(dyslexia_type=dyslexia_type, number=number).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0009_evaluationquestion"),
+    ]
+
+    operations = [
+        migrations.RunPython(seed, unseed),
+    ]
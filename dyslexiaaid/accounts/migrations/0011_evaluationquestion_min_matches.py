@@ -0,0 +1,31 @@
+# Generated by Django 5.1.6 on 2026-10-18 14:30
+
+from django.db import migrations, models
+
+# The thresholds that used to be hard-coded in evaluation_test's scoring loop
+THRESHOLDS = [
+    ("Rapid naming deficit", 2, 5),  # 5 of the 7 days of the week
+    ("Rapid naming deficit", 4, 8),  # 8 of the 10 numbers
+]
+
+
+def set_thresholds(apps, schema_editor):
+    EvaluationQuestion = apps.get_model("accounts", "EvaluationQuestion")
+    for dyslexia_type, number, min_matches in THRESHOLDS:
+        EvaluationQuestion.objects.filter(dyslexia_type=dyslexia_type, number=number).update(min_matches=min_matches)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_seed_evaluation_questions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='evaluationquestion',
+            name='min_matches',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(set_thresholds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+import uuid
+
+from django.db import migrations, models
+
+
+# Unique UUID on a table that already has rows: add it nullable, give every
+# existing row its own value, then make it unique and required.
+def fill_submission_ids(apps, schema_editor):
+    EvaluationData = apps.get_model("accounts", "EvaluationData")
+    rows = list(EvaluationData.objects.filter(submission_id__isnull=True).only("pk"))
+    for row in rows:
+        row.submission_id = uuid.uuid4()
+    EvaluationData.objects.bulk_update(rows, ["submission_id"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_evaluationquestion_min_matches'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='evaluationdata',
+            name='submission_id',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.RunPython(fill_submission_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='evaluationdata',
+            name='submission_id',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+    ]
@@ -0,0 +1,57 @@
+from numbers import Number
+
+from django.db import migrations
+
+EVALUATION_FIELDS = ["evaluation_count", "score_sum", "total_questions_sum", "stt_accuracy_sum", "tts_usage_sum",
+                     "completion_time_sum", "response_time_count", "response_time_sum"]
+ATTEMPT_FIELDS = ["attempt_count", "attempt_correct_count", "attempt_time_ms_sum", "attempt_tts_plays_sum",
+                  "attempt_repeats_sum"]
+
+
+def backfill(apps, schema_editor):
+    """Count the evaluations and attempts stored before ChildFeatures existed.
+
+    Rows written since 0007 were counted by the signals, but those stored
+    before it never were, so every child with history is recounted in full
+    (the same sums as feature_store.rebuild).
+    """
+    ChildFeatures = apps.get_model("accounts", "ChildFeatures")
+    EvaluationData = apps.get_model("accounts", "EvaluationData")
+    Attempt = apps.get_model("lessons", "Attempt")
+
+    totals = {}
+
+    def child_totals(child_id):
+        return totals.setdefault(child_id, dict.fromkeys(EVALUATION_FIELDS + ATTEMPT_FIELDS, 0))
+
+    evaluations = EvaluationData.objects.values_list(
+        "user_id", "child_profile__child_id", "score", "total_questions", "stt_accuracy", "tts_usage_count",
+        "completion_time", "response_times",
+    )
+    for user_id, profile_child_id, score, total, accuracy, tts_usage, completion, response_times in evaluations.iterator():
+        times = [t for t in (response_times or {}).values() if isinstance(t, Number)]
+        row = child_totals(profile_child_id if profile_child_id is not None else user_id)
+        for field, value in zip(EVALUATION_FIELDS, (1, score, total, accuracy, tts_usage, completion,
+                                                    len(times), float(sum(times)))):
+            row[field] += value
+
+    attempts = Attempt.objects.values_list("child_id", "is_correct", "time_spent_ms", "tts_plays", "repeats")
+    for child_id, is_correct, time_spent_ms, tts_plays, repeats in attempts.iterator():
+        row = child_totals(child_id)
+        for field, value in zip(ATTEMPT_FIELDS, (1, int(is_correct), time_spent_ms, tts_plays, repeats)):
+            row[field] += value
+
+    for child_id, row in totals.items():
+        ChildFeatures.objects.update_or_create(child_id=child_id, defaults=row)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_evaluationdata_submission_id'),
+        ('lessons', '0003_dyslexiatype_remove_module_dyslexia_type_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations, models
+
+
+# NULL now marks "not mined yet". Rows stored with the old empty-list default
+# may never have been mined, so they are handed back to mine_error_patterns
+# once; those that really have no errors get [] again and are then left alone.
+def unmark_empty(apps, schema_editor):
+    EvaluationData = apps.get_model("accounts", "EvaluationData")
+    EvaluationData.objects.filter(error_patterns=[]).update(error_patterns=None)
+
+
+def mark_empty(apps, schema_editor):
+    EvaluationData = apps.get_model("accounts", "EvaluationData")
+    EvaluationData.objects.filter(error_patterns__isnull=True).update(error_patterns=[])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0013_backfill_child_features'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='evaluationdata',
+            name='error_patterns',
+            field=models.JSONField(default=None, null=True),
+        ),
+        migrations.RunPython(unmark_empty, mark_empty),
+    ]
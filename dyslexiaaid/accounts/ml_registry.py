@@ -0,0 +1,210 @@
+"""
+Lazy, per-process registry for the dyslexia ML model.
+
+The model used to be unpickled at import time of accounts/views.py, which made
+every manage.py command pay for it and broke whenever the working directory
+was not dyslexiaaid/. The registry loads it on first use from
+settings.ML_MODEL_PATH and reloads it when the artifact on disk changes.
+"""
+import gc
+import hashlib
+import os
+import threading
+import time
+
+import joblib
+from django.conf import settings
+from django.dispatch import Signal
+
+from ml.forest_arrays import FOREST_SUFFIX, ArrayForest, load_forest
+
+try:
+    import psutil
+except ImportError:  # psutil is optional, memory metrics are skipped without it
+    psutil = None
+
+
+# Sent after a (re)load with the new version string.
+model_reloaded = Signal()
+
+
+def _rss_bytes():
+    if psutil is None:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+def load_artifact(path):
+    """Memory map flat-array forests, unpickle anything else."""
+    if path.endswith(FOREST_SUFFIX):
+        return load_forest(path, mmap_mode="r")
+    model = joblib.load(path)
+    if getattr(settings, "ML_MODEL_COMPILE", True) and hasattr(model, "estimators_"):
+        # Serve pickled forests from the flat arrays too; sklearn's per-call
+        # overhead dominates single-row predictions.
+        model = ArrayForest.from_model(model)
+    return model
+
+
+def _file_digest(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    """Holds one model instance per process and reloads it when the file changes."""
+
+    def __init__(self, path=None, loader=None):
+        self._path = path
+        self._loader = loader or load_artifact
+        self._lock = threading.Lock()
+        self._model = None
+        self._loaded_path = None
+        self._mtime = None
+        self._digest = None
+        self._last_check = 0.0
+        self.version = None
+        self.metrics = {
+            "loads": 0,
+            "last_load_seconds": None,
+            "total_load_seconds": 0.0,
+            "rss_before_load": None,
+            "rss_after_load": None,
+            "rss_delta": None,
+            "loaded_at": None,
+        }
+
+    @property
+    def path(self):
+        if self._path:
+            return os.fspath(self._path)
+        online_path = getattr(settings, "ML_ONLINE_MODEL_PATH", None)
+        if getattr(settings, "ML_MODEL_ONLINE", False) and online_path and os.path.exists(online_path):
+            return os.fspath(online_path)
+        compact_path = getattr(settings, "ML_MODEL_COMPACT_PATH", None)
+        if getattr(settings, "ML_MODEL_COMPACT", False) and compact_path and os.path.exists(compact_path):
+            return os.fspath(compact_path)
+        arrays_path = getattr(settings, "ML_MODEL_ARRAYS_PATH", None)
+        if getattr(settings, "ML_MODEL_MMAP", False) and arrays_path and os.path.exists(arrays_path):
+            return os.fspath(arrays_path)
+        return os.fspath(settings.ML_MODEL_PATH)
+
+    @property
+    def is_loaded(self):
+        return self._model is not None
+
+    def preload(self):
+        """Load now and freeze the heap, for forking servers (gunicorn --preload).
+
+        gc.freeze() moves everything allocated so far out of the collector's
+        reach, so collections in the workers don't write to (and copy) the
+        pages shared with the master.
+        """
+        self.get()
+        gc.freeze()
+
+    def get(self):
+        """Return the model, loading it on first use or after the artifact changed."""
+        model = self._model
+        if model is not None and not self._should_check():
+            return model
+        with self._lock:
+            if self._model is None or self._is_stale():
+                self._load()
+            return self._model
+
+    def predict(self, rows):
+        return self.get().predict(rows)
+
+    def reload(self):
+        """Force a reload from disk."""
+        with self._lock:
+            self._load()
+        return self._model
+
+    def clear(self):
+        with self._lock:
+            self._model = None
+            self._loaded_path = None
+            self._mtime = None
+            self._digest = None
+            self.version = None
+
+    def stats(self):
+        stats = {
+            "path": self._loaded_path or self.path,
+            "loaded": self.is_loaded,
+            "version": self.version,
+            **self.metrics,
+        }
+        if hasattr(self._model, "stats"):
+            # Incrementally trained models report their watermark and update timings
+            stats["model"] = self._model.stats()
+        return stats
+
+    @property
+    def feature_names(self):
+        """Inputs the served model expects, None for the default feature set."""
+        return getattr(self.get(), "feature_names", None)
+
+    # -------------------------------------------------------------------------
+
+    def _should_check(self):
+        interval = getattr(settings, "ML_MODEL_CHECK_INTERVAL", 5)
+        if interval is None:
+            return False
+        return time.monotonic() - self._last_check >= interval
+
+    def _is_stale(self):
+        self._last_check = time.monotonic()
+        if self._model is None or self.path != self._loaded_path:
+            return True
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            # Keep serving the loaded model if the file is being replaced.
+            return False
+        if mtime == self._mtime:
+            return False
+        if getattr(settings, "ML_MODEL_VERIFY_HASH", False):
+            # Only a content change counts, a plain touch just updates the mtime.
+            if _file_digest(self.path) == self._digest:
+                self._mtime = mtime
+                return False
+        return True
+
+    def _load(self):
+        path = self.path
+        rss_before = _rss_bytes()
+        started = time.perf_counter()
+        model = self._loader(path)
+        elapsed = time.perf_counter() - started
+        rss_after = _rss_bytes()
+
+        self._model = model
+        self._loaded_path = path
+        self._mtime = os.stat(path).st_mtime_ns
+        self._digest = _file_digest(path) if getattr(settings, "ML_MODEL_VERIFY_HASH", False) else None
+        self._last_check = time.monotonic()
+        self.version = (self._digest or str(self._mtime))[:16]
+
+        self.metrics["loads"] += 1
+        self.metrics["last_load_seconds"] = elapsed
+        self.metrics["total_load_seconds"] += elapsed
+        self.metrics["rss_before_load"] = rss_before
+        self.metrics["rss_after_load"] = rss_after
+        self.metrics["rss_delta"] = (rss_after - rss_before) if rss_before is not None else None
+        self.metrics["loaded_at"] = time.time()
+
+        model_reloaded.send(sender=self.__class__, registry=self, version=self.version)
+
+
+# One registry per process, shared by every view.
+registry = ModelRegistry()
+
+
+def get_model():
+    return registry.get()
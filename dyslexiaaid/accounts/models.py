@@ -3,6 +3,7 @@ from django.db import models
 from django.conf import settings
 from django import forms
 import json
+import uuid
 from django.contrib.auth import get_user_model
 
 class CustomUser(AbstractUser):
@@ -64,6 +65,9 @@ class EvaluationData(models.Model):
     child_profile = models.ForeignKey('ChildProfile', on_delete=models.CASCADE, null=True, blank=True)
     dyslexia_type = models.CharField(max_length=50)
     timestamp = models.DateTimeField(auto_now_add=True)
+    # Known before the row is written (evaluation_writer saves it later), so
+    # the session can refer to the submission straight away
+    submission_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
 
 
     
@@ -86,10 +90,200 @@ class EvaluationData(models.Model):
     
     # Additional ML Features
     speech_fluency_metrics = models.JSONField(default=dict)
-    error_patterns = models.JSONField(default=list)
+    # NULL until mined (views.py on submit, mine_error_patterns for older rows)
+    error_patterns = models.JSONField(null=True, default=None)
 
     def __str__(self):
         return f"{self.user.username} - {self.dyslexia_type} - {self.timestamp}"
 
     class Meta:
-        db_table = 'evaluation_data'
\ No newline at end of file
+        db_table = 'evaluation_data'
+
+# =========================
+# ML Feature Store
+# =========================
+class ChildFeatures(models.Model):
+    """Running per-child aggregates, updated on every EvaluationData / Attempt write.
+
+    Reading a child's features is a single primary-key lookup instead of a
+    scan over their history.
+    """
+    child = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="ml_features"
+    )
+
+    # EvaluationData aggregates
+    evaluation_count = models.PositiveIntegerField(default=0)
+    score_sum = models.PositiveIntegerField(default=0)
+    total_questions_sum = models.PositiveIntegerField(default=0)
+    stt_accuracy_sum = models.FloatField(default=0.0)
+    tts_usage_sum = models.PositiveIntegerField(default=0)
+    completion_time_sum = models.FloatField(default=0.0)
+    response_time_count = models.PositiveIntegerField(default=0)
+    response_time_sum = models.FloatField(default=0.0)
+
+    # lessons.Attempt aggregates
+    attempt_count = models.PositiveIntegerField(default=0)
+    attempt_correct_count = models.PositiveIntegerField(default=0)
+    attempt_time_ms_sum = models.PositiveBigIntegerField(default=0)
+    attempt_tts_plays_sum = models.PositiveIntegerField(default=0)
+    attempt_repeats_sum = models.PositiveIntegerField(default=0)
+
+    # Inputs of the current model (trial-level eye-tracking metrics). The web
+    # app does not record eye tracking yet, so these hold the reference values
+    # the dashboard has always used until a source fills them in.
+    n_fix_trial = models.FloatField(default=120)
+    mean_fix_dur_trial = models.FloatField(default=220)
+    n_sacc_trial = models.FloatField(default=85)
+    n_regress_trial = models.FloatField(default=15)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    MODEL_FEATURES = ["n_fix_trial", "mean_fix_dur_trial", "n_sacc_trial", "n_regress_trial"]
+
+    class Meta:
+        db_table = "child_features"
+
+    def __str__(self):
+        return f"Features for {self.child_id}"
+
+    @staticmethod
+    def _mean(total, count):
+        return total / count if count else 0.0
+
+    @property
+    def mean_response_time(self):
+        return self._mean(self.response_time_sum, self.response_time_count)
+
+    @property
+    def mean_stt_accuracy(self):
+        return self._mean(self.stt_accuracy_sum, self.evaluation_count)
+
+    @property
+    def evaluation_accuracy(self):
+        return self._mean(self.score_sum, self.total_questions_sum)
+
+    @property
+    def mean_tts_usage(self):
+        return self._mean(self.tts_usage_sum, self.evaluation_count)
+
+    @property
+    def mean_completion_time(self):
+        return self._mean(self.completion_time_sum, self.evaluation_count)
+
+    @property
+    def attempt_accuracy(self):
+        return self._mean(self.attempt_correct_count, self.attempt_count)
+
+    @property
+    def mean_attempt_time_ms(self):
+        return self._mean(self.attempt_time_ms_sum, self.attempt_count)
+
+    @property
+    def mean_tts_plays(self):
+        return self._mean(self.attempt_tts_plays_sum, self.attempt_count)
+
+
+# =========================
+# Evaluation question bank
+# =========================
+class EvaluationQuestion(models.Model):
+    """One question of the evaluation test, served through accounts.question_bank."""
+    INTERACTION_CHOICES = [
+        ("speech_recognition", "Speech recognition"),
+        ("multiple_choice", "Multiple choice"),
+    ]
+
+    # Key of the test in the URL, e.g. "Phonological dyslexia"
+    dyslexia_type = models.CharField(max_length=50)
+    # Position in the test; the form posts the answer as q<number>
+    number = models.PositiveSmallIntegerField()
+    text = models.TextField()
+    interaction = models.CharField(max_length=30, choices=INTERACTION_CHOICES)
+    options = models.JSONField(default=list, blank=True)
+    # A string, or a list of strings for multi-part answers
+    expected = models.JSONField(default=str)
+    hint = models.CharField(max_length=255, blank=True)
+    # Credit when at least this many of the expected words were said, in any
+    # order (e.g. 8 of the 10 numbers); empty: the answer has to match.
+    min_matches = models.PositiveSmallIntegerField(null=True, blank=True)
+    timed = models.BooleanField(default=False)
+    time_limit = models.PositiveSmallIntegerField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "evaluation_questions"
+        ordering = ["dyslexia_type", "number"]
+        unique_together = [("dyslexia_type", "number")]
+
+    def __str__(self):
+        return f"{self.dyslexia_type} #{self.number}: {self.text[:40]}"
+
+
+# =========================
+# Background jobs
+# =========================
+class Job(models.Model):
+    """One run of a background task (accounts/jobs.py), also the queue row for the local broker."""
+    QUEUED = "queued"
+    RUNNING = "running"
+    RETRYING = "retrying"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (RETRYING, "Retrying"),
+        (SUCCEEDED, "Succeeded"),
+        (FAILED, "Failed"),
+    ]
+    PENDING = [QUEUED, RETRYING]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    name = models.CharField(max_length=50)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+
+    args = models.JSONField(default=dict, blank=True)
+    payload = models.BinaryField(null=True, blank=True)  # e.g. uploaded audio, dropped once the job is done
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    run_after = models.DateTimeField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    # Timing metrics
+    queue_seconds = models.FloatField(null=True, blank=True)  # created -> first start
+    run_seconds = models.FloatField(null=True, blank=True)  # all attempts together
+
+    class Meta:
+        db_table = "jobs"
+        indexes = [models.Index(fields=["status", "created_at"])]
+
+    def __str__(self):
+        return f"{self.name} {self.id} ({self.status})"
+
+    @property
+    def is_done(self):
+        return self.status in (self.SUCCEEDED, self.FAILED)
+
+    def as_dict(self):
+        return {
+            "id": str(self.id),
+            "name": self.name,
+            "status": self.status,
+            "attempts": self.attempts,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "queue_seconds": self.queue_seconds,
+            "run_seconds": self.run_seconds,
+        }
@@ -0,0 +1,152 @@
+"""
+Online updates of the suggestion model from EvaluationData.
+
+update() feeds the evaluation rows created since the model's watermark (the
+highest EvaluationData pk it has learnt from) to OnlineModel.partial_fit in
+batches, then publishes the new version atomically to
+settings.ML_ONLINE_MODEL_PATH, where the registry picks it up on its next
+staleness check.
+
+full_retrain() starts a fresh model over every row. It is run every
+ML_ONLINE_FULL_RETRAIN_EVERY updates (or on demand) and reports how often
+the incrementally updated model agrees with the fresh one, as a drift check.
+
+Labels are the type each evaluation was taken for (the evaluation_test
+keys), mapped to DYSLEXIA_CHOICES by EVALUATION_LABELS. Rows of any other
+type are skipped and logged.
+"""
+import logging
+import time
+from collections import Counter
+from numbers import Number
+
+from django.conf import settings
+
+from ml import online_model
+from ml.online_model import OnlineModel
+
+from .models import DYSLEXIA_CHOICES, EvaluationData
+
+logger = logging.getLogger(__name__)
+
+# Per-evaluation inputs, each one the per-row counterpart of a ChildFeatures
+# mean, so the dashboard can serve the model from the feature store.
+FEATURES = ["evaluation_accuracy", "mean_stt_accuracy", "mean_tts_usage", "mean_completion_time", "mean_response_time"]
+# Evaluation type (as stored in EvaluationData.dyslexia_type) -> model label
+EVALUATION_LABELS = {
+    "Phonological dyslexia": "Phonological",
+    "Surface dyslexia": "Surface",
+    "Visual dyslexia": "Visual",
+    "Rapid naming deficit": "Rapid Naming",
+    "Developmental dyslexia": "General",
+    "Acquired dyslexia": "Other",
+}
+# Only the labels an evaluation can map to, in DYSLEXIA_CHOICES order
+CLASSES = [value for value, _ in DYSLEXIA_CHOICES if value in EVALUATION_LABELS.values()]
+
+_FIELDS = ["dyslexia_type", "score", "total_questions", "stt_accuracy", "tts_usage_count",
+           "completion_time", "response_times"]
+
+
+def evaluation_features(evaluation):
+    times = [t for t in (evaluation.response_times or {}).values() if isinstance(t, Number)]
+    return [
+        evaluation.score / evaluation.total_questions if evaluation.total_questions else 0.0,
+        evaluation.stt_accuracy,
+        evaluation.tts_usage_count,
+        evaluation.completion_time,
+        sum(times) / len(times) if times else 0.0,
+    ]
+
+
+def evaluation_label(evaluation):
+    """Model label of an evaluation, None when its type has none."""
+    return EVALUATION_LABELS.get((evaluation.dyslexia_type or "").strip())
+
+
+def _batches(since, batch_size, skipped):
+    """(X, y, last pk) batches of the evaluations with pk > since, in pk order.
+
+    Rows without a label are counted per type in `skipped`.
+    """
+    X, y, last = [], [], since
+    rows = EvaluationData.objects.filter(pk__gt=since).order_by("pk").only(*_FIELDS)
+    for evaluation in rows.iterator(chunk_size=batch_size):
+        last = evaluation.pk
+        label = evaluation_label(evaluation)
+        if label is None:
+            skipped[evaluation.dyslexia_type] += 1
+            continue
+        X.append(evaluation_features(evaluation))
+        y.append(label)
+        if len(X) >= batch_size:
+            yield X, y, last
+            X, y = [], []
+    if X or last != since:
+        yield X, y, last
+
+
+def _train(model, since, batch_size):
+    report = {"batches": 0, "rows": 0, "batch_seconds": []}
+    skipped = Counter()
+    for X, y, last in _batches(since, batch_size, skipped):
+        if X:
+            report["batch_seconds"].append(model.partial_fit(X, y, watermark=last))
+            report["batches"] += 1
+            report["rows"] += len(X)
+        else:
+            # Only unlabelled rows left: still move the watermark past them.
+            model.watermark = last
+    if skipped:
+        logger.warning("Skipped %d evaluations with no model label, by type: %s",
+                       sum(skipped.values()), dict(skipped))
+    report["skipped"] = sum(skipped.values())
+    return report
+
+
+def _path(path):
+    return path or settings.ML_ONLINE_MODEL_PATH
+
+
+def update(path=None, batch_size=None):
+    """Learn from the evaluations since the watermark and publish the result."""
+    path = _path(path)
+    batch_size = batch_size or getattr(settings, "ML_ONLINE_BATCH_SIZE", 500)
+    model = online_model.load(path)
+    every = getattr(settings, "ML_ONLINE_FULL_RETRAIN_EVERY", None)
+    if model is None or model.feature_names != FEATURES or list(model.classes_) != CLASSES:
+        return full_retrain(path, batch_size)
+    if every and model.updates >= every:
+        return full_retrain(path, batch_size, previous=model)
+
+    started = time.perf_counter()
+    since = model.watermark
+    report = _train(model, since, batch_size)
+    if model.watermark != since:
+        model.updates += 1
+        online_model.publish(model, path)
+    return {"mode": "incremental", "since": since, "watermark": model.watermark, "published": model.watermark != since,
+            "seconds": time.perf_counter() - started, **report}
+
+
+def full_retrain(path=None, batch_size=None, previous=None):
+    """Fresh model over every evaluation; compares it with the incremental one."""
+    path = _path(path)
+    batch_size = batch_size or getattr(settings, "ML_ONLINE_BATCH_SIZE", 500)
+    previous = previous if previous is not None else online_model.load(path)
+
+    started = time.perf_counter()
+    model = OnlineModel(FEATURES, CLASSES)
+    report = _train(model, 0, batch_size)
+    model.full_retrained_at = time.time()
+
+    agreement = None
+    if previous is not None and previous.is_fitted and model.is_fitted and previous.feature_names == FEATURES:
+        X = [evaluation_features(e) for e in EvaluationData.objects.order_by("-pk").only(*_FIELDS)[:1000]]
+        if X:
+            agreement = float((previous.predict(X) == model.predict(X)).mean())
+
+    if model.is_fitted:
+        online_model.publish(model, path)
+    return {"mode": "full", "since": 0, "watermark": model.watermark, "published": model.is_fitted,
+            "agreement_with_previous": agreement, "seconds": time.perf_counter() - started, **report}
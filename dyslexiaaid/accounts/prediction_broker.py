@@ -0,0 +1,184 @@
+"""
+Micro-batching for ML suggestions.
+
+During a classroom login spike many child_dashboard requests ask for a
+prediction at the same moment. The broker gathers the rows that arrive within
+a short window (or until the batch is full), runs one vectorised predict for
+all of them and hands every caller its own label. A caller that waits longer
+than the timeout, or finds the queue full, predicts directly instead; the
+dispatcher then skips its abandoned row.
+
+Batching only helps when one process serves requests concurrently
+(gunicorn gthread workers, runserver); with sync workers every batch has
+size 1 and the window is the only cost, so it is off unless
+ML_BATCH_ENABLED = True.
+"""
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .ml_registry import registry
+
+
+class Histogram:
+    """Fixed-bucket histogram; the last bucket counts everything above the bounds."""
+
+    def __init__(self, bounds):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = len(self.bounds)
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            self.counts[index] += 1
+            self.total += 1
+            self.sum += value
+
+    def snapshot(self):
+        labels = [f"<={b}" for b in self.bounds] + [f">{self.bounds[-1]}"]
+        return {
+            "buckets": dict(zip(labels, self.counts)),
+            "count": self.total,
+            "mean": self.sum / self.total if self.total else None,
+        }
+
+
+class _Pending:
+    __slots__ = ("features", "enqueued", "done", "result", "error", "abandoned")
+
+    def __init__(self, features):
+        self.features = features
+        self.enqueued = time.monotonic()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.abandoned = False
+
+
+class PredictionBroker:
+    def __init__(self, predict=None, max_batch_size=32, window=0.005, timeout=0.5, max_queue=1024):
+        self._predict = predict or registry.predict
+        self.max_batch_size = max_batch_size
+        self.window = window
+        self.timeout = timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+        self.batch_sizes = Histogram([1, 2, 4, 8, 16, 32, 64])
+        self.queue_wait_ms = Histogram([0.5, 1, 2, 5, 10, 20, 50, 100])
+        self.counters = {"batched": 0, "direct": 0, "timeouts": 0, "errors": 0, "abandoned": 0}
+        self._counter_lock = threading.Lock()
+
+    def predict_one(self, features):
+        """Label for a single feature vector, batched with concurrent callers."""
+        self._ensure_started()
+        pending = _Pending(features)
+        try:
+            self._queue.put_nowait(pending)
+        except queue.Full:
+            return self._direct(features)
+
+        if not pending.done.wait(self.timeout):
+            pending.abandoned = True
+            self._count("timeouts")
+            return self._direct(features)
+        if pending.error is not None:
+            self._count("errors")
+            return self._direct(features)
+        self._count("batched")
+        return pending.result
+
+    def stats(self):
+        return {
+            "max_batch_size": self.max_batch_size,
+            "window_ms": self.window * 1000,
+            "queue_depth": self._queue.qsize(),
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_wait_ms": self.queue_wait_ms.snapshot(),
+            **self.counters,
+        }
+
+    # -------------------------------------------------------------------------
+
+    def _count(self, name):
+        with self._counter_lock:
+            self.counters[name] += 1
+
+    def _direct(self, features):
+        self._count("direct")
+        return self._predict([features])[0]
+
+    def _ensure_started(self):
+        # Threads don't survive a fork, so a preloaded master's dispatcher is
+        # restarted in each worker.
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="prediction-broker", daemon=True)
+            self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            collected = self._collect()
+            # Callers that timed out already predicted directly
+            batch = [pending for pending in collected if not pending.abandoned]
+            with self._counter_lock:
+                self.counters["abandoned"] += len(collected) - len(batch)
+            if not batch:
+                continue
+            started = time.monotonic()
+            for pending in batch:
+                self.queue_wait_ms.observe((started - pending.enqueued) * 1000)
+            self.batch_sizes.observe(len(batch))
+            try:
+                labels = self._predict(np.asarray([p.features for p in batch], dtype=np.float64))
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+                    pending.done.set()
+                continue
+            for pending, label in zip(batch, labels):
+                pending.result = label
+                pending.done.set()
+
+
+broker = PredictionBroker(
+    max_batch_size=getattr(settings, "ML_BATCH_MAX_SIZE", 32),
+    window=getattr(settings, "ML_BATCH_WINDOW_MS", 5) / 1000,
+    timeout=getattr(settings, "ML_BATCH_TIMEOUT_MS", 500) / 1000,
+)
+
+
+def predict_one(features):
+    if getattr(settings, "ML_BATCH_ENABLED", False):
+        return broker.predict_one(features)
+    return registry.predict([features])[0]
@@ -0,0 +1,18 @@
+"""
+Initializer for process pools that run Django code (rescore_evaluations).
+
+Spawned workers, the default on Windows and macOS, start a fresh interpreter
+and unpickle the initializer before anything else, so this module must not
+import models: it sets Django up first. Forked workers inherit the parent's
+database connections, which must not be shared, so those are closed.
+"""
+
+
+def init_django_worker():
+    import django
+    from django.apps import apps
+    from django.db import connections
+
+    if not apps.ready:
+        django.setup()
+    connections.close_all()
@@ -0,0 +1,119 @@
+"""
+In-process cache of the evaluation question bank (EvaluationQuestion).
+
+The whole bank is read once into an immutable snapshot: every question is a
+read-only mapping with the same keys the old hard-coded dicts had (id, text,
+interaction, options, expected, hint, timed, time_limit) and min_matches,
+plus its expected answers normalised at load time:
+
+    expected_normalized   tuple of lowercased, whitespace-collapsed answers
+    expected_tokens       tuple of token tuples, one per answer
+
+Lookups go through per-type and per-(type, number) dicts. Saving or deleting
+a question (e.g. in the admin) drops the snapshot in that process through
+signals.py; other processes notice the new version of the table
+(question count + latest updated_at) at their next check, at most every
+QUESTION_BANK_CHECK_INTERVAL seconds, the same way ml_registry watches the
+model file.
+"""
+import threading
+import time
+from types import MappingProxyType
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .models import EvaluationQuestion
+
+# Punctuation (except apostrophes) separates words like whitespace does
+_PUNCTUATION = str.maketrans({c: " " for c in '!"#$%&()*+,-./:;<=>?@[\\]^`{|}~‘“”…–—'} | {"’": "'"})
+
+
+def normalize(text):
+    return " ".join(str(text).lower().split())
+
+
+def tokenize(text):
+    return tuple(str(text).lower().translate(_PUNCTUATION).split())
+
+
+def _freeze(question):
+    expected = question.expected
+    answers = expected if isinstance(expected, list) else [expected]
+    return MappingProxyType({
+        "id": question.number,
+        "text": question.text,
+        "interaction": question.interaction,
+        "options": tuple(question.options or ()),
+        "expected": tuple(expected) if isinstance(expected, list) else expected,
+        "hint": question.hint,
+        "min_matches": question.min_matches,
+        "timed": question.timed,
+        "time_limit": question.time_limit,
+        "expected_normalized": tuple(normalize(answer) for answer in answers),
+        "expected_tokens": tuple(tokenize(answer) for answer in answers),
+    })
+
+
+class QuestionBank:
+    """Immutable snapshot of the question table."""
+
+    def __init__(self, questions, version):
+        self.version = version
+        by_type = {}
+        for question in questions:
+            by_type.setdefault(question.dyslexia_type, []).append(_freeze(question))
+        self._by_type = MappingProxyType({key: tuple(items) for key, items in by_type.items()})
+        self._by_key = MappingProxyType({
+            (key, question["id"]): question for key, items in self._by_type.items() for question in items
+        })
+
+    def questions(self, dyslexia_type):
+        return self._by_type.get(dyslexia_type, ())
+
+    def question(self, dyslexia_type, number):
+        return self._by_key.get((dyslexia_type, number))
+
+    @property
+    def types(self):
+        return tuple(self._by_type)
+
+
+def _table_version():
+    row = EvaluationQuestion.objects.aggregate(count=Count("pk"), updated=Max("updated_at"))
+    return (row["count"], row["updated"].isoformat() if row["updated"] else None)
+
+
+_bank = None
+_last_check = 0.0
+_lock = threading.Lock()
+
+
+def get_bank():
+    global _bank, _last_check
+    bank = _bank
+    interval = getattr(settings, "QUESTION_BANK_CHECK_INTERVAL", 5)
+    if bank is not None and (interval is None or time.monotonic() - _last_check < interval):
+        return bank
+    with _lock:
+        version = _table_version()
+        _last_check = time.monotonic()
+        if _bank is None or _bank.version != version:
+            questions = EvaluationQuestion.objects.order_by("dyslexia_type", "number")
+            _bank = QuestionBank(list(questions), version)
+        return _bank
+
+
+def invalidate():
+    global _bank
+    with _lock:
+        _bank = None
+
+
+def get_questions(dyslexia_type):
+    """The questions of one test, in order (empty for an unknown type)."""
+    return get_bank().questions(dyslexia_type)
+
+
+def get_question(dyslexia_type, number):
+    return get_bank().question(dyslexia_type, number)
@@ -0,0 +1,130 @@
+"""
+Answer matching for the evaluation test.
+
+Each question's expected answers are compiled once (per question bank
+snapshot) into:
+
+    words      set of the one-word answers
+    phrases    multi-word answers as space-padded token strings
+    vocab      every expected word, for min_matches questions
+
+A response is tokenised once and scored in a single pass over its tokens
+(and the result memoised per question, as the same answers keep coming):
+
+    min_matches set   credit if at least that many distinct expected words
+                      were said, in any order ("8 of the 10 numbers")
+    timed             credit for any attempt (not empty, not "no_response")
+    otherwise         credit if the response contains an expected answer as
+                      whole words, or is itself a whole-word part of one
+                      (the old two-way substring check, on word boundaries)
+
+score_submission() scores one set of answers, score_batch() many at once
+against the same compiled questions.
+"""
+import threading
+from types import MappingProxyType
+
+from . import question_bank
+from .question_bank import tokenize
+
+NO_RESPONSE = "no_response"
+MEMO_SIZE = 4096
+
+
+class CompiledQuestion:
+    __slots__ = ("id", "timed", "min_matches", "words", "phrases", "vocab", "_memo")
+
+    def __init__(self, question):
+        self.id = question["id"]
+        self.timed = bool(question.get("timed"))
+        self.min_matches = question.get("min_matches")
+        answers = [tokens for tokens in question["expected_tokens"] if tokens]
+        self.words = frozenset(tokens[0] for tokens in answers if len(tokens) == 1)
+        self.phrases = tuple(f" {' '.join(tokens)} " for tokens in answers if len(tokens) > 1)
+        self.vocab = frozenset(word for tokens in answers for word in tokens)
+        # Children mostly give the same few answers, so results are memoised
+        # by raw response (bounded, dropped wholesale when full).
+        self._memo = {}
+
+    def score_response(self, response):
+        result = self._memo.get(response)
+        if result is None:
+            result = self.score(tokenize(response))
+            if len(self._memo) >= MEMO_SIZE:
+                self._memo.clear()
+            self._memo[response] = result
+        return result
+
+    def score(self, tokens):
+        """1 or 0 for an already tokenised response."""
+        if not tokens or not self.vocab:
+            return 0
+        if self.min_matches:
+            return int(len(self.vocab.intersection(tokens)) >= self.min_matches)
+        if self.timed:
+            return int(tokens != (NO_RESPONSE,))
+        if not self.words.isdisjoint(tokens):
+            return 1
+        if self.phrases:
+            # `said in phrase` also accepts a partial answer, e.g. "s u" for "s u n"
+            said = f" {' '.join(tokens)} "
+            for phrase in self.phrases:
+                if phrase in said or said in phrase:
+                    return 1
+        return 0
+
+
+class ScoringEngine:
+    def __init__(self, questions):
+        self.questions = tuple(CompiledQuestion(q) for q in questions)
+
+    def score_submission(self, responses):
+        """Score one submission, {question id: raw response}. Returns (score, {id: 0/1})."""
+        results = {}
+        for question in self.questions:
+            response = responses.get(question.id) or responses.get(str(question.id)) or ""
+            results[question.id] = question.score_response(response)
+        return sum(results.values()), results
+
+    def score_batch(self, submissions):
+        """Scores of many submissions: [score, ...]."""
+        # Question by question, so each compiled question (and its memo) stays hot
+        scores = [0] * len(submissions)
+        for question in self.questions:
+            q_id, key, score_response = question.id, str(question.id), question.score_response
+            for i, responses in enumerate(submissions):
+                scores[i] += score_response(responses.get(q_id) or responses.get(key) or "")
+        return scores
+
+
+_engines = MappingProxyType({})
+_engines_bank = None
+_lock = threading.Lock()
+
+
+def get_engine(dyslexia_type):
+    """Compiled engine for one test, rebuilt whenever the question bank snapshot changes."""
+    global _engines, _engines_bank
+    bank = question_bank.get_bank()
+    engines = _engines
+    if _engines_bank is not bank:
+        with _lock:
+            if _engines_bank is not bank:
+                _engines = MappingProxyType({})
+                _engines_bank = bank
+            engines = _engines
+    engine = engines.get(dyslexia_type)
+    if engine is None:
+        engine = ScoringEngine(bank.questions(dyslexia_type))
+        with _lock:
+            if _engines_bank is bank:
+                _engines = MappingProxyType({**_engines, dyslexia_type: engine})
+    return engine
+
+
+def score_submission(dyslexia_type, responses):
+    return get_engine(dyslexia_type).score_submission(responses)
+
+
+def score_batch(dyslexia_type, submissions):
+    return get_engine(dyslexia_type).score_batch(submissions)
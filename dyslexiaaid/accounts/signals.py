@@ -0,0 +1,58 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from lessons.models import Attempt, Lesson
+
+from . import feature_store, question_bank, suggestion_cache, tts
+from .models import EvaluationData, EvaluationQuestion
+
+
+@receiver(post_save, sender=EvaluationData)
+def evaluation_saved(sender, instance, created, **kwargs):
+    """New evaluation results change the child's ML features."""
+    child_id = feature_store.evaluation_child_id(instance)
+    if created:
+        feature_store.record_evaluation(instance)
+    else:
+        feature_store.rebuild(child_id)
+    suggestion_cache.invalidate(child_id)
+
+
+@receiver(post_delete, sender=EvaluationData)
+def evaluation_deleted(sender, instance, **kwargs):
+    child_id = feature_store.evaluation_child_id(instance)
+    feature_store.record_evaluation(instance, sign=-1)
+    suggestion_cache.invalidate(child_id)
+
+
+@receiver(post_save, sender=Attempt)
+def attempt_saved(sender, instance, created, **kwargs):
+    if created:
+        feature_store.record_attempt(instance)
+    else:
+        feature_store.rebuild(instance.child_id)
+    suggestion_cache.invalidate(instance.child_id)
+
+
+@receiver(post_delete, sender=Attempt)
+def attempt_deleted(sender, instance, **kwargs):
+    feature_store.record_attempt(instance, sign=-1)
+    suggestion_cache.invalidate(instance.child_id)
+
+
+@receiver(post_save, sender=EvaluationQuestion)
+@receiver(post_delete, sender=EvaluationQuestion)
+def question_changed(sender, **kwargs):
+    """Admin edits to the question bank: rebuild the cached snapshot on next use."""
+    question_bank.invalidate()
+
+
+@receiver(post_save, sender=Lesson)
+def lesson_saved(sender, instance, **kwargs):
+    """Render the lesson's audio in the background if its text is new (tts.py)."""
+    tts.request_render([instance.content_text, instance.prompt])
+
+
+@receiver(post_save, sender=EvaluationQuestion)
+def question_saved(sender, instance, **kwargs):
+    tts.request_render([instance.text])
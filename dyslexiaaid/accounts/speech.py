@@ -0,0 +1,141 @@
+"""
+Speech to text on uploaded answers.
+
+The upload is handed to the recognizer as the file object Django already
+holds, nothing is written to or re-read from a shared path:
+
+    up to STT_MEMORY_MAX_BYTES    kept in memory by AudioUploadHandler and read
+                                  straight from its buffer (no copy)
+    larger uploads                spooled by Django to a temporary file of
+                                  their own, deleted when the request ends
+
+so concurrent requests never see each other's audio. recognize() takes any
+binary file object (upload, BytesIO over a job payload, ...) and returns the
+JSON the endpoint has always returned; the engine is an stt_backends backend,
+and the endpoint cleans the audio up (audio_preprocess.py) and runs it in
+the worker pool of stt_pool.py unless the result cache (stt_cache.py)
+already has the same audio.
+"""
+import hashlib
+import io
+import time
+import wave
+
+from django.conf import settings
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+from . import audio_preprocess, stt_backends, stt_cache, stt_pool
+
+
+class AudioUploadHandler(MemoryFileUploadHandler):
+    """Keep uploads up to STT_MEMORY_MAX_BYTES in memory, whatever FILE_UPLOAD_MAX_MEMORY_SIZE says."""
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.activated = content_length <= getattr(settings, "STT_MEMORY_MAX_BYTES", 2_621_440)
+
+
+def upload_handlers(request):
+    """Handlers for an audio upload; set them before request.POST/FILES is touched."""
+    return [AudioUploadHandler(request), TemporaryFileUploadHandler(request)]
+
+
+def audio_source(upload):
+    """Readable binary file object over an UploadedFile, without copying it."""
+    upload.seek(0)
+    # InMemoryUploadedFile wraps a BytesIO, TemporaryUploadedFile its own temp file
+    return upload.file
+
+
+def payload_source(payload):
+    """File object over audio bytes stored elsewhere (e.g. a job payload)."""
+    if isinstance(payload, memoryview):
+        payload = payload.tobytes()
+    # BytesIO shares the bytes object until it is written to
+    return io.BytesIO(payload)
+
+
+def default_backend():
+    """The configured engine (STT_BACKEND / STT_BACKEND_OPTIONS), for recognition outside the pool."""
+    return stt_backends.create(getattr(settings, "STT_BACKEND", "google"),
+                               **getattr(settings, "STT_BACKEND_OPTIONS", {}))
+
+
+def recognize(fileobj, backend=None):
+    """{'success': True, 'text': ...} or {'success': False, 'error': ...}.
+
+    sr.RequestError (service unreachable, quota) is raised for the caller to
+    retry or report.
+    """
+    return stt_backends.recognize(fileobj, backend or default_backend())
+
+
+def fingerprint(fileobj):
+    """Hash of the audio itself: format and samples of a WAV, so a different
+    header or metadata chunk doesn't matter; the raw bytes of anything else."""
+    digest = hashlib.blake2b(digest_size=16)
+    try:
+        with wave.open(fileobj) as wav:
+            digest.update(f"{wav.getnchannels()}:{wav.getsampwidth()}:{wav.getframerate()}".encode())
+            while chunk := wav.readframes(65536):
+                digest.update(chunk)
+    except (wave.Error, EOFError):
+        digest = hashlib.blake2b(b"raw", digest_size=16)
+        fileobj.seek(0)
+        while chunk := fileobj.read(1 << 16):
+            digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+def preprocess(fileobj, backend):
+    """(file object, report) after audio_preprocess, or the file untouched with STT_PREPROCESS off."""
+    if not getattr(settings, "STT_PREPROCESS", True):
+        return fileobj, None
+    return audio_preprocess.preprocess(
+        fileobj,
+        target_rate=backend.sample_rate,
+        threshold_db=getattr(settings, "STT_TRIM_THRESHOLD_DB", -35.0),
+        pad_ms=getattr(settings, "STT_TRIM_PAD_MS", 150),
+    )
+
+
+def transcribe(fileobj, user_key=None, timings=None):
+    """The endpoint's JSON for an upload: from the result cache, or recognised
+    in the worker pool (and cached, even if this request stops waiting).
+
+    The audio is preprocessed first, so the cache is keyed on the cleaned
+    clip. `timings`, when given, is filled with the preprocessing report and
+    the recognition time. Raises what RecognitionPool.recognize raises.
+    """
+    pool = stt_pool.get_pool()
+    fileobj, report = preprocess(fileobj, pool.backend)
+    if timings is not None:
+        timings["preprocessing"] = report
+    key = None
+    if getattr(settings, "STT_CACHE_ENABLED", True):
+        key = stt_cache.key(fingerprint(fileobj), pool.version)
+        result = stt_cache.get(key)
+        if result is not None:
+            return {**result, 'cached': True}
+    on_result = (lambda result: stt_cache.store(key, result)) if key else None
+    started = time.perf_counter()
+    result = pool.recognize(fileobj, user_key=user_key, key=key, on_result=on_result)
+    recognize_ms = (time.perf_counter() - started) * 1000
+    audio_preprocess.record_recognition(report, recognize_ms)
+    if timings is not None:
+        timings["recognize_ms"] = recognize_ms
+    return result
+
+
+def server_timing(timings):
+    """Server-Timing header value for a transcribe() timings dict."""
+    parts = []
+    report = timings.get("preprocessing")
+    if report is not None:
+        parts.append(f"preprocess;dur={report['preprocess_ms']:.1f}")
+        parts.append(f'trim;desc="{report["bytes_saved"]} bytes saved"')
+        if "latency_saved_ms" in report:
+            parts.append(f"saved;desc=\"recognition time saved (estimated)\";dur={report['latency_saved_ms']:.1f}")
+    if "recognize_ms" in timings:
+        parts.append(f"recognize;dur={timings['recognize_ms']:.1f}")
+    return ", ".join(parts)
@@ -0,0 +1,136 @@
+"""
+Speech recognition engines behind one interface.
+
+    google   Google Web Speech API (what the app has always used; needs network)
+    sphinx   CMU PocketSphinx, offline (`pip install pocketsphinx`)
+    stub     deterministic stand-in for tests and offline development
+
+A backend turns an sr.AudioData into text, raising sr.UnknownValueError when
+nothing intelligible was said and sr.RequestError when the engine itself
+failed. `version` identifies the engine and its configuration, so results
+can be cached per version.
+
+This module does not touch Django, so it can be imported by the spawned
+recognition workers (stt_pool.py).
+"""
+import hashlib
+import io
+import time
+
+import speech_recognition as sr
+
+
+class SpeechBackend:
+    name = None
+    # Rate audio is resampled down to before recognition (audio_preprocess.py)
+    sample_rate = 16000
+
+    def __init__(self, language="en-US"):
+        self.language = language
+
+    @property
+    def version(self):
+        return f"{self.name}:{self.language}"
+
+    def transcribe(self, audio_data):
+        raise NotImplementedError
+
+
+class GoogleBackend(SpeechBackend):
+    name = "google"
+
+    def __init__(self, language="en-US", key=None):
+        super().__init__(language)
+        self.key = key
+        self._recognizer = sr.Recognizer()
+
+    def transcribe(self, audio_data):
+        return self._recognizer.recognize_google(audio_data, key=self.key, language=self.language)
+
+
+class SphinxBackend(SpeechBackend):
+    name = "sphinx"
+
+    def __init__(self, language="en-US", keyword_entries=None):
+        super().__init__(language)
+        self.keyword_entries = keyword_entries
+        self._recognizer = sr.Recognizer()
+
+    def transcribe(self, audio_data):
+        # sr raises RequestError when pocketsphinx isn't installed
+        return self._recognizer.recognize_sphinx(audio_data, language=self.language,
+                                                 keyword_entries=self.keyword_entries)
+
+
+class StubBackend(SpeechBackend):
+    """Answers without any engine: silence is not understood, anything else
+    gives `text`, or a word derived from the audio bytes when text is None
+    (the same clip always gives the same word). `delay` simulates engine time."""
+
+    name = "stub"
+
+    def __init__(self, language="en-US", text=None, delay=0.0):
+        super().__init__(language)
+        self.text = text
+        self.delay = delay
+
+    @property
+    def version(self):
+        return f"stub:{self.text}"
+
+    def transcribe(self, audio_data):
+        if self.delay:
+            time.sleep(self.delay)
+        if not audio_data.frame_data.strip(b"\x00"):
+            raise sr.UnknownValueError()
+        if self.text is not None:
+            return self.text
+        return "stub " + hashlib.blake2b(audio_data.frame_data, digest_size=4).hexdigest()
+
+
+BACKENDS = {backend.name: backend for backend in (GoogleBackend, SphinxBackend, StubBackend)}
+
+
+def create(name, **options):
+    try:
+        backend_class = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown speech backend {name!r} (choose from {', '.join(BACKENDS)})") from None
+    return backend_class(**options)
+
+
+def recognize(fileobj, backend):
+    """{'success': True, 'text': ...} or {'success': False, 'error': ...} for a WAV/AIFF/FLAC file object.
+
+    sr.RequestError (service unreachable, quota) is raised for the caller to
+    retry or report.
+    """
+    recognizer = sr.Recognizer()
+    try:
+        with sr.AudioFile(fileobj) as source:
+            audio_data = recognizer.record(source)
+        text = backend.transcribe(audio_data)
+    except sr.UnknownValueError:
+        return {'success': False, 'error': 'Could not understand audio'}
+    except ValueError as e:
+        # Not a WAV/AIFF/FLAC file
+        return {'success': False, 'error': str(e)}
+    return {'success': True, 'text': text}
+
+
+# =========================
+# Recognition worker processes (stt_pool.py)
+# =========================
+_worker_backend = None
+
+
+def init_worker(name, options):
+    global _worker_backend
+    _worker_backend = create(name, **options)
+
+
+def recognize_in_worker(data, submitted):
+    """(result, seconds queued, seconds recognising) for audio bytes, in a pool worker."""
+    started = time.time()
+    result = recognize(io.BytesIO(data), _worker_backend)
+    return result, started - submitted, time.time() - started
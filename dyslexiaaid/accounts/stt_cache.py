@@ -0,0 +1,58 @@
+"""
+Content-addressed cache of speech recognition results.
+
+Children re-record the same short answers ("cat", "sun") over and over, and
+clients retry after a timeout with the very same upload. A result is stored
+under
+
+    stt:<STT_CACHE_VERSION>:<backend version>:<audio fingerprint>
+
+where the fingerprint hashes the decoded samples and their format
+(speech.fingerprint), so the same recording in a different WAV header still
+hits, and changing the engine, its options or STT_CACHE_VERSION starts over.
+
+Entries live in the "stt_results" cache alias, a LocMemCache configured in
+settings as a bounded LRU with a TTL; point it at a shared backend to share
+results between workers.
+"""
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+CACHE_ALIAS = "stt_results"
+
+_stats = {"hits": 0, "misses": 0, "stores": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def key(fingerprint, backend_version):
+    return f"stt:{getattr(settings, 'STT_CACHE_VERSION', 1)}:{backend_version}:{fingerprint}"
+
+
+def get(cache_key):
+    result = caches[CACHE_ALIAS].get(cache_key)
+    _count("misses" if result is None else "hits")
+    return result
+
+
+def store(cache_key, result):
+    caches[CACHE_ALIAS].set(cache_key, result)
+    _count("stores")
+
+
+def clear():
+    caches[CACHE_ALIAS].clear()
+
+
+def stats():
+    with _stats_lock:
+        snapshot = dict(_stats)
+    lookups = snapshot["hits"] + snapshot["misses"]
+    snapshot["hit_rate"] = snapshot["hits"] / lookups if lookups else None
+    return snapshot
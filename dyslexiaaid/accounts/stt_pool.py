@@ -0,0 +1,296 @@
+"""
+Recognition worker tier for speech_to_text_api.
+
+Recognition is blocking (a network round trip for google, CPU for sphinx),
+so it runs in a bounded pool of STT_WORKERS processes of its own instead of
+tying up web workers for its whole duration. A request waits for its result
+at most STT_TIMEOUT seconds (504 afterwards), and load is shed instead of
+queued without bound:
+
+    429  the user already has STT_MAX_PER_USER recognitions in flight
+    503  STT_WORKERS + STT_MAX_QUEUE recognitions are in flight (Retry-After)
+
+A recognition that times out while running keeps its slot until the worker
+finishes it, so the limits follow what the workers are really doing. One
+that times out while still queued is cancelled, unless another request
+with the same audio is waiting for it too.
+STT_WORKERS = 0 runs recognition in the calling thread (tests, development).
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+from . import stt_backends
+from .prediction_broker import Histogram
+
+
+class Rejected(Exception):
+    def __init__(self, message, status, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class RecognitionTimeout(Exception):
+    pass
+
+
+# =========================
+# Web process side
+# =========================
+class RecognitionPool:
+    def __init__(self, backend_name="google", options=None, workers=2, max_queue=8, max_per_user=2,
+                 timeout=15.0, start_method="spawn"):
+        self.backend_name = backend_name
+        self.options = dict(options or {})
+        self.backend = stt_backends.create(backend_name, **self.options)
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_per_user = max_per_user
+        self.timeout = timeout
+        self.start_method = start_method
+
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._per_user = {}
+        # cache key -> [future of the recognition in progress, requests coalesced onto it]
+        self._by_key = {}
+
+        self.counters = {"submitted": 0, "completed": 0, "timeouts": 0, "errors": 0,
+                         "rejected_user": 0, "rejected_busy": 0, "pool_restarts": 0, "coalesced": 0}
+        bounds = [50, 100, 250, 500, 1000, 2500, 5000, 10000]
+        self.queue_ms = Histogram([1, 5, 10, 50, 100, 500, 1000, 5000])
+        self.recognize_ms = Histogram(bounds)
+        self.total_ms = Histogram(bounds)
+
+    @property
+    def version(self):
+        return self.backend.version
+
+    @property
+    def capacity(self):
+        return max(self.workers, 1) + self.max_queue
+
+    def recognize(self, fileobj, user_key=None, key=None, on_result=None):
+        """Recognise a WAV/AIFF/FLAC file object; the endpoint's JSON result.
+
+        Calls with the same `key` (the audio's cache key) while one is in
+        progress wait for that one instead of recognising again.
+        on_result(result) is called once the engine answers, also when the
+        caller has timed out by then. Raises Rejected when overloaded,
+        RecognitionTimeout after `timeout` seconds and sr.RequestError when
+        the engine failed.
+        """
+        if key is not None and self.workers > 0:
+            with self._lock:
+                entry = self._by_key.get(key)
+                if entry is not None:
+                    entry[1] += 1
+                    self.counters["coalesced"] += 1
+            if entry is not None:
+                try:
+                    return self._wait(entry[0])[0]
+                finally:
+                    with self._lock:
+                        entry[1] -= 1
+
+        self._acquire(user_key)
+        started = time.perf_counter()
+        try:
+            if self.workers <= 0:
+                try:
+                    result = stt_backends.recognize(fileobj, self.backend)
+                except Exception:
+                    self._count("errors")
+                    raise
+                finally:
+                    self._release(user_key)
+                self.recognize_ms.observe((time.perf_counter() - started) * 1000)
+                if on_result is not None:
+                    on_result(result)
+            else:
+                result = self._run_in_pool(fileobj.read(), user_key, key, on_result)
+        finally:
+            self.total_ms.observe((time.perf_counter() - started) * 1000)
+        self._count("completed")
+        return result
+
+    def _run_in_pool(self, data, user_key, key, on_result):
+        try:
+            try:
+                future = self._get_executor().submit(stt_backends.recognize_in_worker, data, time.time())
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM); start a fresh pool once
+                self._reset_executor()
+                future = self._get_executor().submit(stt_backends.recognize_in_worker, data, time.time())
+        except BaseException:
+            self._release(user_key)
+            raise
+        entry = [future, 0]
+        if key is not None:
+            with self._lock:
+                self._by_key[key] = entry
+
+        # Released by whoever sees the future finish first: this thread, or
+        # the pool once a timed out recognition is done
+        once = threading.Lock()
+
+        def release():
+            if once.acquire(blocking=False):
+                self._release(user_key)
+
+        def done(future):
+            release()
+            if key is not None:
+                with self._lock:
+                    if self._by_key.get(key) is entry:
+                        del self._by_key[key]
+            if on_result is not None and not future.cancelled() and future.exception() is None:
+                on_result(future.result()[0])
+
+        future.add_done_callback(done)
+        try:
+            result, queue_seconds, run_seconds = self._wait(future, cancel=entry)
+        finally:
+            if future.done():
+                release()
+        self.queue_ms.observe(queue_seconds * 1000)
+        self.recognize_ms.observe(run_seconds * 1000)
+        return result
+
+    def _wait(self, future, cancel=None):
+        """The future's result. On timeout a queued future is cancelled if
+        `cancel` (its [future, waiters] entry) has no other request waiting."""
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            if cancel is not None:
+                with self._lock:
+                    alone = not cancel[1]
+                if alone:
+                    # Outside the lock: cancel() runs the done callback
+                    future.cancel()
+            self._count("timeouts")
+            raise RecognitionTimeout(f"Recognition took longer than {self.timeout}s") from None
+        except CancelledError:
+            # Dropped with the pool after a worker died, or cancelled by its
+            # owner just before this request joined it
+            self._count("timeouts")
+            raise RecognitionTimeout("Recognition was cancelled") from None
+        except BrokenProcessPool:
+            self._count("errors")
+            self._reset_executor()
+            raise
+        except Exception:
+            self._count("errors")
+            raise
+
+    def stats(self):
+        with self._lock:
+            in_flight, users = self._in_flight, len(self._per_user)
+        return {
+            **self.counters,
+            "backend": self.version,
+            "workers": self.workers,
+            "capacity": self.capacity,
+            "in_flight": in_flight,
+            "users_in_flight": users,
+            "queue_ms": self.queue_ms.snapshot(),
+            "recognize_ms": self.recognize_ms.snapshot(),
+            "total_ms": self.total_ms.snapshot(),
+        }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None and self._pid == os.getpid():
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    # -------------------------------------------------------------------------
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _acquire(self, user_key):
+        with self._lock:
+            if user_key is not None and self._per_user.get(user_key, 0) >= self.max_per_user:
+                self.counters["rejected_user"] += 1
+                raise Rejected("Too many recognitions in progress for this user", 429, retry_after=1)
+            if self._in_flight >= self.capacity:
+                self.counters["rejected_busy"] += 1
+                raise Rejected("Speech recognition is busy, try again shortly", 503,
+                               retry_after=max(1, round((self.recognize_ms.snapshot()["mean"] or 1000) / 1000)))
+            self._in_flight += 1
+            if user_key is not None:
+                self._per_user[user_key] = self._per_user.get(user_key, 0) + 1
+            self.counters["submitted"] += 1
+
+    def _release(self, user_key):
+        with self._lock:
+            self._in_flight -= 1
+            if user_key is not None:
+                left = self._per_user.get(user_key, 1) - 1
+                if left:
+                    self._per_user[user_key] = left
+                else:
+                    self._per_user.pop(user_key, None)
+
+    def _get_executor(self):
+        # Pools don't survive a fork; each web worker process starts its own.
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context(self.start_method),
+                        initializer=stt_backends.init_worker,
+                        initargs=(self.backend_name, self.options),
+                    )
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _reset_executor(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self.counters["pool_restarts"] += 1
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = RecognitionPool(
+                    backend_name=getattr(settings, "STT_BACKEND", "google"),
+                    options=getattr(settings, "STT_BACKEND_OPTIONS", {}),
+                    workers=getattr(settings, "STT_WORKERS", 2),
+                    max_queue=getattr(settings, "STT_MAX_QUEUE", 8),
+                    max_per_user=getattr(settings, "STT_MAX_PER_USER", 2),
+                    timeout=getattr(settings, "STT_TIMEOUT", 15.0),
+                    start_method=getattr(settings, "STT_POOL_START_METHOD", "spawn"),
+                )
+    return _pool
+
+
+def reset_pool():
+    """Drop the pool so the next request builds one from the current settings (tests)."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
@@ -0,0 +1,289 @@
+"""
+Streaming speech to text over a WebSocket (ws://<host>/speech-to-text/stream/).
+
+Instead of uploading a finished recording to speech_to_text_api, the page
+sends the microphone's PCM frames as they are captured and gets transcripts
+back while the child is still speaking:
+
+    client -> {"type": "start", "sample_rate": 16000, "sample_width": 2}
+    server <- {"type": "ready"}
+    client -> binary frames of mono little-endian PCM, any size
+    server <- {"type": "partial", "text": "cat", "audio_seconds": 0.5}   (as they come)
+    client -> {"type": "stop"}
+    server <- {"type": "final", "success": true, "text": "cat"}           (then closes)
+
+The final message is the JSON speech_to_text_api returns, plus "type" (and
+"status" when it was refused). For timed questions, where any attempt
+counts, the first partial is already the answer.
+
+The engines aren't streaming ones, so every STT_STREAM_PARTIAL_SECONDS of new
+audio the whole clip so far is recognised again, one recognition per
+connection at a time, through the same worker pool and per-user limits as the
+upload endpoint. When the last partial already covered all the audio it is
+the final result; otherwise the clip goes through speech.transcribe (result
+cache included). The session cookie authenticates the connection; it is
+refused (close code 4401) without a logged-in user or from a foreign Origin.
+
+Plain ASGI, mounted by config/asgi.py, no Channels needed. The evaluation
+page (StreamRecognizer in static_evaluation.html) uses it in browsers
+without the Web Speech API's SpeechRecognition.
+"""
+import asyncio
+import io
+import json
+import logging
+import threading
+import time
+import wave
+from http.cookies import SimpleCookie
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+import speech_recognition as sr
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import auth
+
+from . import speech, stt_pool
+from .prediction_broker import Histogram
+
+logger = logging.getLogger(__name__)
+
+PATH = "/speech-to-text/stream/"
+
+_stats = {"streams": 0, "refused": 0, "partials": 0, "finals": 0, "finals_from_partial": 0, "audio_seconds": 0.0}
+_stats_lock = threading.Lock()
+first_partial_ms = Histogram([100, 250, 500, 1000, 2000, 5000])
+final_ms = Histogram([50, 100, 250, 500, 1000, 2500, 5000])
+
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def stats():
+    with _stats_lock:
+        snapshot = dict(_stats)
+    return {
+        **snapshot,
+        # from the first audio frame to the first transcript
+        "first_partial_ms": first_partial_ms.snapshot(),
+        # from "stop" to the final message
+        "final_ms": final_ms.snapshot(),
+    }
+
+
+def pcm_to_wav(pcm, sample_rate, sample_width):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(sample_width)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+    buffer.seek(0)
+    return buffer
+
+
+# =========================
+# Authentication
+# =========================
+def _headers(scope):
+    return {name.decode("latin1").lower(): value.decode("latin1") for name, value in scope.get("headers", [])}
+
+
+def _origin_allowed(headers):
+    origin = headers.get("origin")
+    if not origin:
+        return True  # not a browser
+    if origin in getattr(settings, "CSRF_TRUSTED_ORIGINS", []):
+        return True
+    return urlsplit(origin).netloc == headers.get("host")
+
+
+def _session_user(headers):
+    cookie = SimpleCookie(headers.get("cookie", ""))
+    morsel = cookie.get(settings.SESSION_COOKIE_NAME)
+    if morsel is None:
+        return None
+    store = import_module(settings.SESSION_ENGINE).SessionStore(morsel.value)
+    # auth.get_user only needs request.session (and checks the session hash)
+    user = auth.get_user(SimpleNamespace(session=store))
+    return user if user.is_authenticated else None
+
+
+# =========================
+# One connection
+# =========================
+class RecognitionStream:
+    def __init__(self, send, user_key):
+        self._send = send
+        self.user_key = user_key
+        self.sample_rate = None
+        self.sample_width = None
+        self.pcm = bytearray()
+        self.first_audio = None
+        self.partial_seconds = getattr(settings, "STT_STREAM_PARTIAL_SECONDS", 0.5)
+        self.max_seconds = getattr(settings, "STT_STREAM_MAX_SECONDS", 60)
+        self._partial = None
+        self._partial_bytes = 0
+        self._partial_result = None  # (bytes covered, result) of the latest partial
+        self._sent_first = False
+        self._last_text = None
+
+    @property
+    def seconds(self):
+        if not self.sample_rate:
+            return 0.0
+        return len(self.pcm) / (self.sample_rate * self.sample_width)
+
+    async def send_json(self, data):
+        await self._send({"type": "websocket.send", "text": json.dumps(data)})
+
+    async def start(self, message):
+        try:
+            sample_rate = int(message.get("sample_rate", 16000))
+            sample_width = int(message.get("sample_width", 2))
+            channels = int(message.get("channels", 1))
+        except (TypeError, ValueError):
+            sample_rate = None
+        if not sample_rate or sample_rate < 8000 or sample_width not in (1, 2, 3, 4):
+            await self.send_json({"type": "error", "error": "Unsupported audio format"})
+            return
+        if channels != 1:
+            await self.send_json({"type": "error", "error": "Only mono audio can be streamed"})
+            return
+        self.sample_rate, self.sample_width = sample_rate, sample_width
+        await self.send_json({"type": "ready"})
+
+    async def feed(self, data):
+        """Add audio; False once the clip is as long as allowed."""
+        if self.first_audio is None:
+            self.first_audio = time.perf_counter()
+        self.pcm += data
+        if self.seconds >= self.max_seconds:
+            return False
+        self._maybe_partial()
+        return True
+
+    def _maybe_partial(self):
+        if self._partial is not None and not self._partial.done():
+            return
+        frame_bytes = self.sample_rate * self.sample_width
+        if (len(self.pcm) - self._partial_bytes) / frame_bytes < self.partial_seconds:
+            return
+        # Whole frames only
+        self._partial_bytes = len(self.pcm) - len(self.pcm) % self.sample_width
+        self._partial = asyncio.ensure_future(self._run_partial(bytes(self.pcm[:self._partial_bytes])))
+
+    def _recognize(self, pcm):
+        wav = pcm_to_wav(pcm, self.sample_rate, self.sample_width)
+        return stt_pool.get_pool().recognize(wav, user_key=self.user_key)
+
+    async def _run_partial(self, pcm):
+        try:
+            result = await sync_to_async(self._recognize, thread_sensitive=False)(pcm)
+        except (stt_pool.Rejected, stt_pool.RecognitionTimeout, sr.RequestError) as e:
+            # Partials are best effort; the final result reports errors
+            logger.debug("Partial recognition skipped: %s", e)
+            return
+        except Exception:
+            # e.g. BrokenProcessPool: still best effort, finish() must go on
+            logger.warning("Partial recognition failed", exc_info=True)
+            return
+        self._partial_result = (len(pcm), result)
+        text = result.get("text")
+        if not result.get("success") or text == self._last_text:
+            return
+        self._last_text = text
+        if not self._sent_first:
+            self._sent_first = True
+            first_partial_ms.observe((time.perf_counter() - self.first_audio) * 1000)
+        _count("partials")
+        seconds = len(pcm) / (self.sample_rate * self.sample_width)
+        await self.send_json({"type": "partial", "text": text, "audio_seconds": round(seconds, 2)})
+
+    async def finish(self):
+        started = time.perf_counter()
+        if self._partial is not None:
+            await self._partial
+        covered, result = self._partial_result or (None, None)
+        whole = len(self.pcm) - len(self.pcm) % self.sample_width
+        if not whole:
+            message = {"type": "final", "success": False, "error": "No audio"}
+        elif covered == whole:
+            _count("finals_from_partial")
+            message = {"type": "final", **result}
+        else:
+            message = await sync_to_async(self._final, thread_sensitive=False)(bytes(self.pcm[:whole]))
+        _count("finals")
+        _count("audio_seconds", self.seconds)
+        final_ms.observe((time.perf_counter() - started) * 1000)
+        await self.send_json(message)
+
+    def _final(self, pcm):
+        wav = pcm_to_wav(pcm, self.sample_rate, self.sample_width)
+        try:
+            return {"type": "final", **speech.transcribe(wav, user_key=self.user_key)}
+        except stt_pool.Rejected as e:
+            return {"type": "final", "success": False, "error": str(e), "status": e.status}
+        except stt_pool.RecognitionTimeout as e:
+            return {"type": "final", "success": False, "error": str(e), "status": 504}
+        except sr.RequestError as e:
+            return {"type": "final", "success": False, "error": f"Speech service error: {e}", "status": 502}
+        except Exception:
+            # The client waits for a final message whatever happened
+            logger.exception("Final recognition failed")
+            return {"type": "final", "success": False, "error": "Speech recognition failed", "status": 500}
+
+    def cancel(self):
+        if self._partial is not None:
+            self._partial.cancel()
+
+
+async def application(scope, receive, send):
+    message = await receive()
+    if message["type"] != "websocket.connect":
+        return
+    headers = _headers(scope)
+    user = await sync_to_async(_session_user)(headers) if _origin_allowed(headers) else None
+    if user is None:
+        _count("refused")
+        await send({"type": "websocket.close", "code": 4401})
+        return
+
+    await send({"type": "websocket.accept"})
+    _count("streams")
+    stream = RecognitionStream(send, user.pk)
+    try:
+        while True:
+            message = await receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes") is not None:
+                if stream.sample_rate is None:
+                    await stream.send_json({"type": "error", "error": "Send a start message first"})
+                    continue
+                if await stream.feed(message["bytes"]):
+                    continue
+                # Too long: finish with what we have
+            else:
+                try:
+                    control = json.loads(message.get("text") or "{}")
+                except ValueError:
+                    control = {}
+                if control.get("type") == "start":
+                    await stream.start(control)
+                    continue
+                if control.get("type") != "stop":
+                    await stream.send_json({"type": "error", "error": "Unknown message"})
+                    continue
+                if stream.sample_rate is None:
+                    await send({"type": "websocket.close", "code": 1000})
+                    return
+            await stream.finish()
+            await send({"type": "websocket.close", "code": 1000})
+            return
+    finally:
+        stream.cancel()
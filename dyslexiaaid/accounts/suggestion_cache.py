@@ -0,0 +1,69 @@
+"""
+Per-child cache of the ML suggestion shown on child_dashboard.
+
+A child's features only change when a new EvaluationData or lessons.Attempt
+row is written, so the suggestion is computed once and kept until then
+(see signals.py). Each entry remembers the model version it was predicted
+with, so a model reload makes every older entry a miss.
+
+Entries live in the "ml_suggestions" cache alias, a LocMemCache configured in
+settings as a bounded LRU with a TTL. Invalidation only reaches the process
+that saved the row, so other workers may serve the old suggestion until the
+TTL runs out; point the alias at a shared backend to make it reach every
+worker.
+"""
+import threading
+
+from django.core.cache import caches
+
+from .ml_registry import registry
+
+CACHE_ALIAS = "ml_suggestions"
+
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+_stats_lock = threading.Lock()
+
+
+def _key(child_id):
+    return f"ml-suggestion:{child_id}"
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def get_suggestion(child_id, compute):
+    """Return (features, suggested_type) for a child.
+
+    ``compute(child_id)`` is only called on a miss and must return the same
+    pair.
+    """
+    cache = caches[CACHE_ALIAS]
+    entry = cache.get(_key(child_id))
+    if entry is not None and registry.version is not None and entry["model_version"] == registry.version:
+        _count("hits")
+        return entry["features"], entry["suggested_type"]
+
+    _count("misses")
+    features, suggested_type = compute(child_id)
+    entry = {
+        "model_version": registry.version,
+        "features": list(features),
+        "suggested_type": str(suggested_type),
+    }
+    cache.set(_key(child_id), entry)
+    return entry["features"], entry["suggested_type"]
+
+
+def invalidate(child_id):
+    caches[CACHE_ALIAS].delete(_key(child_id))
+    _count("invalidations")
+
+
+def stats():
+    with _stats_lock:
+        snapshot = dict(_stats)
+    lookups = snapshot["hits"] + snapshot["misses"]
+    snapshot["hit_rate"] = snapshot["hits"] / lookups if lookups else None
+    return snapshot
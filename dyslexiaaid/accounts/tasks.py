@@ -0,0 +1,129 @@
+"""
+Background task definitions (see jobs.py): training data export, model
+training, speech to text and text to speech. Each takes the Job and its args
+and returns a JSON-serialisable result.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from . import online_training, speech, tts
+from .jobs import PermanentError, task
+from .models import EvaluationData
+
+
+# =========================
+# Training data export
+# =========================
+def training_data_rows():
+    """One row of ANN training features per evaluation."""
+    data = []
+    for eval in EvaluationData.objects.select_related("user").iterator(chunk_size=500):
+        row = {
+            'user_id': eval.user.id,
+            'dyslexia_type': eval.dyslexia_type,
+            'age': getattr(eval.user, 'age', None),
+
+            # TTS Features
+            'tts_usage_count': eval.tts_usage_count,
+            'tts_questions_used_count': len(eval.tts_questions_used),
+
+            # STT Features
+            'stt_accuracy': eval.stt_accuracy,
+            'total_responses': len(eval.stt_responses),
+            'empty_responses': sum(1 for r in eval.stt_responses.values() if not r.get('response')),
+
+            # Timing Features
+            'completion_time': eval.completion_time,
+            'avg_response_time': np.mean(list(eval.response_times.values())) if eval.response_times else 0,
+
+            # Performance Features
+            'score': eval.score,
+            'percentage': eval.percentage,
+
+            # Derived Features
+            'uses_tts_frequently': 1 if eval.tts_usage_count > 2 else 0,
+            'slow_responder': 1 if eval.completion_time > 300 else 0,  # >5 minutes
+        }
+
+        # Add question-specific features
+        for q_id, response_data in eval.stt_responses.items():
+            row[f'q{q_id}_response_length'] = len(response_data.get('response', ''))
+            row[f'q{q_id}_processing_time'] = response_data.get('processing_time', 0)
+            row[f'q{q_id}_used_tts'] = 1 if response_data.get('used_tts', False) else 0
+
+        data.append(row)
+    return data
+
+
+def job_result_path(job, suffix):
+    os.makedirs(settings.JOBS_RESULT_DIR, exist_ok=True)
+    return os.path.join(settings.JOBS_RESULT_DIR, f"{job.pk}{suffix}")
+
+
+@task("export_training_data", max_retries=1)
+def export_training_data(job):
+    df = pd.DataFrame(training_data_rows())
+    path = job_result_path(job, ".csv")
+    tmp = path + ".tmp"
+    df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+    return {"rows": len(df), "file": os.path.basename(path), "filename": "dyslexia_training_data.csv"}
+
+
+# =========================
+# Model training
+# =========================
+@task("train_model", max_retries=0)
+def train_model(job, mode="online"):
+    if mode == "online":
+        report = online_training.update()
+    elif mode == "online_full":
+        report = online_training.full_retrain()
+    elif mode == "forest":
+        from ml.train_model import train_model as train_forest
+
+        # Write where the registry loads from, whatever the worker's working directory
+        train_forest(model_path=os.fspath(settings.ML_MODEL_PATH),
+                     forest_path=os.fspath(settings.ML_MODEL_ARRAYS_PATH),
+                     compact_path=os.fspath(settings.ML_MODEL_COMPACT_PATH))
+        report = {"mode": "forest", "published": True}
+    else:
+        raise PermanentError(f"Unknown training mode {mode!r}")
+    report.pop("batch_seconds", None)
+    return report
+
+
+# =========================
+# Speech to text
+# =========================
+@task("speech_to_text", max_retries=2, retry_delay=2)
+def speech_to_text(job):
+    if not job.payload:
+        raise PermanentError("No audio")
+    # sr.RequestError (service unreachable, quota) propagates and is retried
+    backend = speech.default_backend()
+    audio, _ = speech.preprocess(speech.payload_source(job.payload), backend)
+    return speech.recognize(audio, backend)
+
+
+# =========================
+# Text to speech
+# =========================
+@task("render_tts", max_retries=3, retry_delay=10)
+def render_tts(job, texts, rate=None):
+    # A failed text doesn't stop the others; the retry finds those already stored
+    rendered, failed = {}, []
+    try:
+        for text in texts:
+            try:
+                rendered[text] = tts.render(text, rate)
+            except Exception as e:
+                failed.append(f"{type(e).__name__}: {e}")
+    finally:
+        tts.rendered(texts, rate)
+    if failed:
+        raise RuntimeError(f"{len(failed)} of {len(texts)} texts failed, first: {failed[0]}")
+    return {"rendered": len(rendered), "keys": list(rendered.values())}
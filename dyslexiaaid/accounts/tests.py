@@ -1,3 +1,1325 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+import speech_recognition as sr
+from asgiref.sync import async_to_sync
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.files.uploadedfile import InMemoryUploadedFile, SimpleUploadedFile, TemporaryUploadedFile
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from . import (audio_preprocess, error_patterns, fluency, jobs, online_training, question_bank, scoring, speech,
+               stt_backends, stt_cache, stt_pool, stt_stream, suggestion_cache, tts)
+from .evaluation_writer import EvaluationWriter
+from .ml_registry import model_reloaded, registry
+from .models import ChildFeatures, CustomUser, EvaluationData, EvaluationQuestion, Job
+from lessons.models import Attempt, Lesson
+
+
+# =========================
+# Background jobs
+# =========================
+@override_settings(JOBS_BROKER="eager")
+class JobTests(TestCase):
+    def setUp(self):
+        jobs.reset_broker()
+        self.addCleanup(jobs.reset_broker)
+        self.result_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.result_dir, ignore_errors=True)
+        self.staff = CustomUser.objects.create_user("staff", password="pw", is_staff=True, role="PARENT")
+        self.child = CustomUser.objects.create_user("kid", password="pw", role="CHILD")
+
+    def test_export_runs_in_background_and_is_downloadable(self):
+        EvaluationData.objects.create(user=self.child, dyslexia_type="Visual dyslexia", score=3, total_questions=5,
+                                      stt_responses={"1": {"response": "cat", "processing_time": 1.2}})
+        self.client.force_login(self.staff)
+        with self.settings(JOBS_RESULT_DIR=self.result_dir), self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.get(reverse("export_training_data")).status_code, 405)
+            self.assertFalse(Job.objects.exists())
+            response = self.client.post(reverse("export_training_data"))
+        job_id = response.json()["job_id"]
+
+        status = self.client.get(reverse("job_status", args=[job_id])).json()
+        self.assertEqual(status["status"], Job.SUCCEEDED)
+        self.assertEqual(status["result"]["rows"], 1)
+        self.assertIsNotNone(status["queue_seconds"])
+        self.assertIsNotNone(status["run_seconds"])
+
+        with self.settings(JOBS_RESULT_DIR=self.result_dir):
+            download = self.client.get(status["result_url"])
+        self.assertIn(b"q1_response_length", b"".join(download.streaming_content))
+
+    @override_settings(STT_BACKGROUND=True)
+    def test_stt_is_retried_then_fails(self):
+        self.client.force_login(self.child)
+        with mock.patch.object(sr.Recognizer, "record"), \
+                mock.patch.object(sr, "AudioFile"), \
+                mock.patch.object(sr.Recognizer, "recognize_google", side_effect=sr.RequestError("quota")), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("speech_to_text"), {"audio": _upload(b"RIFF")})
+
+        job = Job.objects.get(pk=response.json()["job_id"])
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, jobs.TASKS["speech_to_text"].max_retries + 1)
+        self.assertIsNone(job.payload)
+        self.assertEqual(jobs.stats()["tasks"]["speech_to_text"]["failed"], 1)
+
+    @override_settings(STT_BACKGROUND=True)
+    def test_stt_enqueues_and_is_polled(self):
+        self.client.force_login(self.child)
+        with mock.patch.object(sr.Recognizer, "record"), \
+                mock.patch.object(sr, "AudioFile"), \
+                mock.patch.object(sr.Recognizer, "recognize_google", return_value="cat"), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("speech_to_text"), {"audio": _upload(b"RIFF")})
+            # The request returns before the job runs (on commit)
+            self.assertEqual(response.status_code, 202)
+
+        status = self.client.get(response.json()["status_url"]).json()
+        self.assertEqual(status["status"], Job.SUCCEEDED)
+        self.assertEqual(status["result"], {"success": True, "text": "cat"})
+
+    def test_forest_training_writes_where_the_registry_loads(self):
+        artifacts = {name: os.path.join(self.result_dir, f"model.{name}") for name in ("pkl", "forest", "compact")}
+        self.client.force_login(self.staff)
+        cwd = os.getcwd()
+        self.addCleanup(os.chdir, cwd)
+        os.chdir(self.result_dir)  # a worker started outside dyslexiaaid/
+        X, y = _forest_data()
+        with self.settings(ML_MODEL_PATH=artifacts["pkl"], ML_MODEL_ARRAYS_PATH=artifacts["forest"],
+                           ML_MODEL_COMPACT_PATH=artifacts["compact"]), \
+                mock.patch("ml.train_model.load_training_set", return_value=(X, y)), \
+                mock.patch("builtins.print"), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("train_model_job"), {"mode": "forest"})
+        self.assertEqual(Job.objects.get(pk=response.json()["job_id"]).status, Job.SUCCEEDED)
+        self.assertTrue(all(os.path.exists(path) for path in artifacts.values()))
+        self.assertEqual(sorted(os.listdir(self.result_dir)), ["model.compact", "model.forest", "model.pkl"])
+
+    def test_jobs_are_private(self):
+        job = Job.objects.create(name="speech_to_text", user=self.staff)
+        self.client.force_login(self.child)
+        self.assertEqual(self.client.get(reverse("job_status", args=[job.pk])).status_code, 403)
+
+    @override_settings(JOBS_BROKER="local")
+    def test_local_queue_is_drained_by_run_pending(self):
+        jobs.reset_broker()
+        job = Job.objects.create(name="export_training_data")
+        with self.settings(JOBS_RESULT_DIR=self.result_dir):
+            self.assertEqual(jobs.run_pending(), 1)
+            self.assertEqual(jobs.run_pending(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertTrue(os.path.exists(os.path.join(self.result_dir, job.result["file"])))
+
+    @override_settings(JOBS_BROKER="local", JOBS_LEASE_SECONDS=60)
+    def test_jobs_of_a_dead_worker_are_recovered(self):
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        jobs.reset_broker()
+        long_ago = timezone.now() - timedelta(hours=2)
+        retried = Job.objects.create(name="export_training_data", status=Job.RUNNING, started_at=long_ago, attempts=1)
+        failed = Job.objects.create(name="train_model", status=Job.RUNNING, started_at=long_ago, attempts=1)
+        running = Job.objects.create(name="export_training_data", status=Job.RUNNING, started_at=timezone.now(),
+                                     attempts=1)
+        with self.settings(JOBS_RESULT_DIR=self.result_dir):
+            self.assertEqual(jobs.run_pending(), 1)
+        for job in (retried, failed, running):
+            job.refresh_from_db()
+        self.assertEqual((retried.status, retried.attempts), (Job.SUCCEEDED, 2))
+        self.assertEqual(failed.status, Job.FAILED)
+        self.assertIn("LeaseExpired", failed.error)
+        self.assertEqual(running.status, Job.RUNNING)
+
+    def test_attempt_that_outlived_its_lease_does_not_overwrite(self):
+        def slow(job):
+            jobs.recover_stale(lease=0)  # the worker looks dead while this runs
+            return {"done": True}
+
+        job = Job.objects.create(name="slow")
+        with mock.patch.dict(jobs.TASKS, {"slow": jobs.TaskSpec(slow, "slow", max_retries=1, retry_delay=1)}):
+            jobs.run_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result), (Job.RETRYING, None))
+
+
+# =========================
+# Question bank
+# =========================
+@override_settings(QUESTION_BANK_CHECK_INTERVAL=None)
+class QuestionBankTests(TestCase):
+    def setUp(self):
+        question_bank.invalidate()
+        self.addCleanup(question_bank.invalidate)
+
+    def test_seeded_bank_is_indexed_and_normalised(self):
+        questions = question_bank.get_questions("Rapid naming deficit")
+        self.assertEqual([q["id"] for q in questions], [1, 2, 3, 4, 5])
+        self.assertEqual(questions[0]["expected_tokens"], (("red",), ("yellow",), ("blue",), ("green",)))
+        self.assertIs(question_bank.get_question("Rapid naming deficit", 4), questions[3])
+        self.assertEqual(question_bank.get_questions("Unknown"), ())
+        with self.assertRaises(TypeError):
+            questions[0]["text"] = "changed"
+
+    def test_admin_edit_invalidates_the_cache(self):
+        before = question_bank.get_bank()
+        self.assertIs(question_bank.get_bank(), before)
+        question = EvaluationQuestion.objects.get(dyslexia_type="Surface dyslexia", number=1)
+        question.expected = "Boat"
+        question.save()
+        self.assertEqual(question_bank.get_question("Surface dyslexia", 1)["expected_normalized"], ("boat",))
+
+
+@override_settings(QUESTION_BANK_CHECK_INTERVAL=None)
+class ScoringTests(TestCase):
+    def setUp(self):
+        question_bank.invalidate()
+        self.addCleanup(question_bank.invalidate)
+
+    def test_thresholds_and_word_boundaries(self):
+        engine = scoring.get_engine("Rapid naming deficit")
+        _, results = engine.score_submission({
+            2: "monday tuesday wednesday thursday",  # 4 of 7 days
+            4: "one two three four five six seven eight",  # 8 of 10 numbers
+            1: "red",
+        })
+        self.assertEqual(results, {1: 1, 2: 0, 3: 0, 4: 1, 5: 0})
+        self.assertEqual(scoring.score_batch("Phonological dyslexia", [
+            {1: "cat", 2: "s u", 3: "cat", 4: "f", 5: "bat"},
+            {1: "scatter", 2: "sun", 3: "concatenate", 4: "fish", 5: "b a t"},
+        ]), [5, 0])
+
+
+    def test_interrupted_rescore_resumes_and_rebuilds_every_child(self):
+        from django.db.models.query import QuerySet
+
+        children = [CustomUser.objects.create_user(f"kid{i}", password="pw", role="CHILD") for i in range(2)]
+        for child in children:
+            EvaluationData.objects.create(user=child, dyslexia_type="Phonological dyslexia", score=0,
+                                          total_questions=5, stt_responses={"1": {"response": "cat"}})
+        checkpoint = os.path.join(tempfile.mkdtemp(), "rescore.json")
+        self.addCleanup(shutil.rmtree, os.path.dirname(checkpoint), ignore_errors=True)
+
+        bulk_update, writes = QuerySet.bulk_update, []
+
+        def killed_after_first_page(queryset, objs, fields, batch_size=None):
+            if writes:
+                raise RuntimeError("killed")
+            writes.append(len(objs))
+            return bulk_update(queryset, objs, fields, batch_size=batch_size)
+
+        options = {"chunk_size": 1, "checkpoint": checkpoint, "stdout": io.StringIO()}
+        with mock.patch.object(QuerySet, "bulk_update", autospec=True, side_effect=killed_after_first_page):
+            with self.assertRaisesMessage(RuntimeError, "killed"):
+                call_command("rescore_evaluations", **options)
+        self.assertEqual(list(EvaluationData.objects.order_by("pk").values_list("score", flat=True)), [1, 0])
+
+        call_command("rescore_evaluations", resume=True, **options)
+        self.assertEqual(list(EvaluationData.objects.order_by("pk").values_list("score", flat=True)), [1, 1])
+        # The child re-scored before the interruption has its features rebuilt too
+        self.assertEqual([ChildFeatures.objects.get(child=child).score_sum for child in children], [1, 1])
+        self.assertFalse(os.path.exists(checkpoint))
+
+
+# =========================
+# Write-behind evaluation writer
+# =========================
+class EvaluationWriterTests(TransactionTestCase):
+    def test_buffered_records_resolve_and_are_flushed_in_batches(self):
+        child = CustomUser.objects.create_user("kid", password="pw", role="CHILD")
+        writer = EvaluationWriter(batch_size=10, flush_interval=0.05)
+        self.addCleanup(writer.close)
+
+        records = [
+            writer.submit(EvaluationData(user=child, dyslexia_type="Visual dyslexia", score=1, total_questions=5))
+            for _ in range(25)
+        ]
+        self.assertIsNotNone(writer.get(str(records[-1].submission_id)))
+        self.assertTrue(writer.drain(timeout=5))
+
+        self.assertEqual(EvaluationData.objects.count(), 25)
+        self.assertEqual(writer.get(str(records[0].submission_id)).pk, records[0].pk)
+        # post_save is sent for bulk-written rows, so the feature store keeps up
+        self.assertEqual(ChildFeatures.objects.get(child=child).evaluation_count, 25)
+        stats = writer.stats()
+        self.assertEqual(stats["written"], 25)
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertGreaterEqual(stats["flushes"], 3)
+
+    def test_close_drains_the_buffer(self):
+        child = CustomUser.objects.create_user("kid", password="pw", role="CHILD")
+        writer = EvaluationWriter(batch_size=100, flush_interval=60)
+        for _ in range(5):
+            writer.submit(EvaluationData(user=child, dyslexia_type="Visual dyslexia"))
+        writer.close()
+        self.assertEqual(EvaluationData.objects.count(), 5)
+
+
+# =========================
+# Speech to text uploads
+# =========================
+def _stub_text(wav):
+    return speech.recognize(io.BytesIO(wav), stt_backends.StubBackend())["text"]
+
+
+@override_settings(STT_BACKEND="stub", STT_BACKEND_OPTIONS={}, STT_WORKERS=0)
+class SpeechUploadTests(TestCase):
+    def setUp(self):
+        stt_pool.reset_pool()
+        stt_cache.clear()
+        self.addCleanup(stt_pool.reset_pool)
+
+    def test_concurrent_uploads_are_isolated(self):
+        clips = [_wav(bytes([i + 1]) * (1000 + i * 10)) for i in range(16)]
+        uploads = [_upload(clip) for clip in clips]
+        barrier = threading.Barrier(len(uploads))
+
+        def transcribe(upload):
+            barrier.wait()
+            return speech.recognize(speech.audio_source(upload), stt_backends.StubBackend())["text"]
+
+        with ThreadPoolExecutor(max_workers=len(uploads)) as pool:
+            texts = list(pool.map(transcribe, uploads))
+        self.assertEqual(texts, [_stub_text(clip) for clip in clips])
+        self.assertEqual(len(set(texts)), len(clips))
+
+    @override_settings(STT_MEMORY_MAX_BYTES=4096)
+    def test_only_large_uploads_are_spooled(self):
+        user = CustomUser.objects.create_user("kid", password="pw", role="CHILD")
+        self.client.force_login(user)
+        for size, upload_class in ((1000, InMemoryUploadedFile), (20000, TemporaryUploadedFile)):
+            clip = _wav(b"\x07" * size)
+            with mock.patch.object(speech, "audio_source", wraps=speech.audio_source) as source:
+                response = self.client.post(reverse("speech_to_text"), {"audio": _upload(clip)})
+            self.assertEqual(response.json(), {"success": True, "text": _stub_text(clip)})
+            self.assertIsInstance(source.call_args.args[0], upload_class)
+
+
+class RecognitionPoolTests(TestCase):
+    def _pool(self, **options):
+        pool = stt_pool.RecognitionPool("stub", {"text": "cat", "delay": 0.3}, **options)
+        self.addCleanup(pool.shutdown)
+        return pool
+
+    def _run_together(self, pool, user_keys):
+        barrier = threading.Barrier(len(user_keys))
+
+        def call(user_key):
+            barrier.wait()
+            try:
+                return pool.recognize(io.BytesIO(_wav(b"\x07" * 800)), user_key=user_key)["text"]
+            except stt_pool.Rejected as e:
+                return e.status
+            except stt_pool.RecognitionTimeout:
+                return "timeout"
+
+        with ThreadPoolExecutor(max_workers=len(user_keys)) as executor:
+            return sorted(map(str, executor.map(call, user_keys)))
+
+    def test_overload_is_shed_with_429_and_503(self):
+        pool = self._pool(workers=1, max_queue=1, max_per_user=1)
+        # Two slots in total
+        self.assertEqual(self._run_together(pool, [1, 2, 3]), ["503", "cat", "cat"])
+        # One slot per user
+        self.assertEqual(self._run_together(pool, [4, 4]), ["429", "cat"])
+        stats = pool.stats()
+        self.assertEqual((stats["rejected_user"], stats["rejected_busy"], stats["completed"]), (1, 1, 3))
+        self.assertEqual(stats["in_flight"], 0)
+        self.assertEqual(stats["recognize_ms"]["count"], 3)
+
+    def test_slow_recognition_times_out(self):
+        pool = self._pool(workers=1, timeout=0.05)
+        self.assertEqual(self._run_together(pool, [1]), ["timeout"])
+        self.assertEqual(pool.stats()["timeouts"], 1)
+
+
+    def test_queued_recognition_outlives_its_timed_out_owner_while_others_wait(self):
+        pool = self._pool(workers=1, timeout=0.1)
+        # Threads instead of processes, so the worker can be kept busy from here
+        executor = ThreadPoolExecutor(max_workers=1, initializer=stt_backends.init_worker,
+                                      initargs=("stub", {"text": "sun", "delay": 0.2}))
+        self.addCleanup(executor.shutdown)
+        executor.submit(time.sleep, 0.3)
+        clip = _wav(b"\x07" * 800)
+
+        def owner():
+            with self.assertRaises(stt_pool.RecognitionTimeout):
+                pool.recognize(io.BytesIO(clip), key="clip")
+
+        with mock.patch.object(pool, "_get_executor", return_value=executor):
+            first = threading.Thread(target=owner)
+            first.start()
+            time.sleep(0.03)
+            pool.timeout = 2.0  # only for the request joining it
+            result = pool.recognize(io.BytesIO(clip), key="clip")
+            first.join()
+        self.assertEqual(result["text"], "sun")
+        self.assertEqual((pool.stats()["coalesced"], pool.stats()["timeouts"]), (1, 1))
+
+@override_settings(STT_BACKEND="stub", STT_BACKEND_OPTIONS={"text": "sun"}, STT_WORKERS=0)
+class SpeechCacheTests(TestCase):
+    def setUp(self):
+        stt_pool.reset_pool()
+        stt_cache.clear()
+        self.addCleanup(stt_pool.reset_pool)
+
+    def test_fingerprint_is_of_the_audio(self):
+        fingerprint = lambda wav: speech.fingerprint(io.BytesIO(wav))  # noqa: E731
+        self.assertEqual(fingerprint(_wav(b"\x07" * 800)), fingerprint(_wav(b"\x07" * 800)))
+        self.assertNotEqual(fingerprint(_wav(b"\x07" * 800)), fingerprint(_wav(b"\x07" * 800, rate=8000)))
+        self.assertNotEqual(fingerprint(_wav(b"\x07" * 800)), fingerprint(b"not a wav"))
+
+    def test_same_audio_is_recognised_once(self):
+        hits = stt_cache.stats()["hits"]
+        with mock.patch.object(stt_backends.StubBackend, "transcribe", autospec=True, return_value="sun") as engine:
+            first = speech.transcribe(io.BytesIO(_wav(b"\x07" * 800)))
+            again = speech.transcribe(io.BytesIO(_wav(b"\x07" * 800)))
+            other = speech.transcribe(io.BytesIO(_wav(b"\x08" * 800)))
+        self.assertEqual(first, {"success": True, "text": "sun"})
+        self.assertEqual(again, {"success": True, "text": "sun", "cached": True})
+        self.assertNotIn("cached", other)
+        self.assertEqual(engine.call_count, 2)
+        self.assertEqual(stt_cache.stats()["hits"], hits + 1)
+
+    @override_settings(STT_BACKEND_OPTIONS={"text": "sun", "delay": 0.3}, STT_WORKERS=1, STT_TIMEOUT=0.05)
+    def test_retry_after_timeout_gets_the_finished_result(self):
+        clip = _wav(b"\x07" * 800)
+        with self.assertRaises(stt_pool.RecognitionTimeout):
+            speech.transcribe(io.BytesIO(clip))
+        # The recognition carries on in the pool and lands in the cache
+        for _ in range(200):
+            if not stt_pool.get_pool().stats()["in_flight"]:
+                break
+            time.sleep(0.05)
+        self.assertEqual(speech.transcribe(io.BytesIO(clip)), {"success": True, "text": "sun", "cached": True})
+
+
+@override_settings(STT_BACKEND="stub", STT_BACKEND_OPTIONS={"text": "cat"}, STT_WORKERS=0,
+                   STT_STREAM_PARTIAL_SECONDS=0.5)
+class SpeechStreamTests(TestCase):
+    def setUp(self):
+        stt_pool.reset_pool()
+        stt_cache.clear()
+        self.addCleanup(stt_pool.reset_pool)
+        self.child = CustomUser.objects.create_user("kid", password="pw", role="CHILD")
+
+    def _scope(self, logged_in=True):
+        headers = [(b"host", b"testserver"), (b"origin", b"http://testserver")]
+        if logged_in:
+            self.client.force_login(self.child)
+            headers.append((b"cookie", f"sessionid={self.client.cookies['sessionid'].value}".encode()))
+        return {"type": "websocket", "path": stt_stream.PATH, "headers": headers}
+
+    @staticmethod
+    def _connect(scope):
+        from config.asgi import application
+
+        inbound, outbound = asyncio.Queue(), asyncio.Queue()
+        task = asyncio.ensure_future(application(scope, inbound.get, outbound.put))
+        return inbound, outbound, task
+
+    @staticmethod
+    async def _next(outbound):
+        message = await asyncio.wait_for(outbound.get(), 5)
+        return json.loads(message["text"]) if "text" in message else message
+
+    def test_partials_then_final_in_endpoint_shape(self):
+        scope = self._scope()
+
+        async def scenario():
+            inbound, outbound, task = self._connect(scope)
+            half_second = b"\x10\x00" * 8000  # 16 kHz, 16 bit
+            await inbound.put({"type": "websocket.connect"})
+            self.assertEqual(await self._next(outbound), {"type": "websocket.accept"})
+            await inbound.put({"type": "websocket.receive", "text": json.dumps({"type": "start", "sample_rate": 16000})})
+            self.assertEqual(await self._next(outbound), {"type": "ready"})
+
+            await inbound.put({"type": "websocket.receive", "bytes": half_second})
+            # A transcript arrives while the child is still speaking
+            self.assertEqual(await self._next(outbound), {"type": "partial", "text": "cat", "audio_seconds": 0.5})
+
+            await inbound.put({"type": "websocket.receive", "bytes": half_second[:4000]})
+            await inbound.put({"type": "websocket.receive", "text": json.dumps({"type": "stop"})})
+            final = await self._next(outbound)
+            self.assertEqual(await self._next(outbound), {"type": "websocket.close", "code": 1000})
+            await task
+            return final
+
+        self.assertEqual(async_to_sync(scenario)(), {"type": "final", "success": True, "text": "cat"})
+
+    def test_final_is_sent_when_recognition_crashes(self):
+        from concurrent.futures.process import BrokenProcessPool
+
+        scope = self._scope()
+
+        async def scenario():
+            inbound, outbound, task = self._connect(scope)
+            await inbound.put({"type": "websocket.connect"})
+            await self._next(outbound)
+            await inbound.put({"type": "websocket.receive", "text": json.dumps({"type": "start", "sample_rate": 16000})})
+            await self._next(outbound)
+            await inbound.put({"type": "websocket.receive", "bytes": b"\x10\x00" * 8000})
+            await inbound.put({"type": "websocket.receive", "text": json.dumps({"type": "stop"})})
+            final = await self._next(outbound)
+            self.assertEqual(await self._next(outbound), {"type": "websocket.close", "code": 1000})
+            await task
+            return final
+
+        with mock.patch.object(stt_pool.RecognitionPool, "recognize", side_effect=BrokenProcessPool("worker died")), \
+                self.assertLogs("accounts.stt_stream", "WARNING"):
+            final = async_to_sync(scenario)()
+        self.assertEqual(final, {"type": "final", "success": False, "error": "Speech recognition failed",
+                                 "status": 500})
+
+    def test_evaluation_page_connects_to_the_stream(self):
+        self.client.force_login(self.child)
+        response = self.client.get(reverse("evaluation_test", args=["Rapid naming deficit"]))
+        self.assertEqual(response.context["stt_stream_path"], stt_stream.PATH)
+        self.assertContains(response, "new StreamRecognizer(")
+
+    def test_anonymous_connection_is_refused(self):
+        scope = self._scope(logged_in=False)
+
+        async def scenario():
+            inbound, outbound, task = self._connect(scope)
+            await inbound.put({"type": "websocket.connect"})
+            message = await self._next(outbound)
+            await task
+            return message
+
+        self.assertEqual(async_to_sync(scenario)(), {"type": "websocket.close", "code": 4401})
+
+
+class AudioPreprocessTests(TestCase):
+    def test_stereo_44k_clip_is_downmixed_resampled_and_trimmed(self):
+        rate = 44100
+        silence = np.zeros(rate)
+        tone = 0.5 * np.sin(2 * np.pi * 440 * np.arange(rate // 2) / rate)
+        mono = np.concatenate([silence, tone, silence])
+        stereo = (np.stack([mono, mono], axis=1) * 32767).astype("<i2")
+        clip = _wav(stereo.tobytes(), rate=rate, channels=2, sample_width=2)
+
+        audio, report = audio_preprocess.preprocess(io.BytesIO(clip), target_rate=16000, pad_ms=100)
+        with wave.open(audio) as wav:
+            self.assertEqual((wav.getnchannels(), wav.getframerate()), (1, 16000))
+            self.assertAlmostEqual(wav.getnframes() / 16000, 0.7, delta=0.03)
+        self.assertAlmostEqual(report["seconds_in"], 2.5)
+        self.assertGreater(report["bytes_saved"], len(clip) * 0.85)
+
+        # Read 3 frames (60 ms) at a time, the clip comes out byte for byte the same
+        reads = []
+        readframes = wave.Wave_read.readframes
+        with mock.patch.object(wave.Wave_read, "readframes", autospec=True,
+                               side_effect=lambda wav, n: reads.append(n) or readframes(wav, n)):
+            blocked, _ = audio_preprocess.preprocess(io.BytesIO(clip), target_rate=16000, pad_ms=100, block_frames=3)
+        self.assertEqual(blocked.getvalue(), audio.getvalue())
+        self.assertLessEqual(max(reads), 3 * 882)
+
+    def test_clean_clip_is_passed_through(self):
+        source = io.BytesIO(_wav(b"\x07" * 800))
+        audio, report = audio_preprocess.preprocess(source)
+        self.assertIs(audio, source)
+        self.assertIsNone(report)
+
+    @override_settings(STT_BACKEND="stub", STT_BACKEND_OPTIONS={"text": "cat"}, STT_WORKERS=0)
+    def test_savings_are_reported_per_request(self):
+        stt_pool.reset_pool()
+        stt_cache.clear()
+        self.addCleanup(stt_pool.reset_pool)
+        self.client.force_login(CustomUser.objects.create_user("kid", password="pw", role="CHILD"))
+        padded = b"\x80" * 16000 + b"\xf0\x10" * 4000 + b"\x80" * 16000  # 8 bit: 1 s silence either side
+        response = self.client.post(reverse("speech_to_text"), {"audio": _upload(_wav(padded))})
+        self.assertEqual(response.json(), {"success": True, "text": "cat"})
+        self.assertIn("bytes saved", response["Server-Timing"])
+        self.assertIn("recognize;dur=", response["Server-Timing"])
+
+
+def _tone(seconds, rate=16000):
+    return 0.5 * np.sin(2 * np.pi * 220 * np.arange(int(seconds * rate)) / rate)
+
+
+def _pcm16_wav(signal, rate=16000):
+    return _wav((np.asarray(signal) * 32767).astype("<i2").tobytes(), rate=rate, sample_width=2)
+
+
+class FluencyTests(TestCase):
+    def test_pauses_phonation_and_rate_from_streamed_blocks(self):
+        quiet = lambda seconds: np.zeros(int(seconds * 16000))  # noqa: E731
+        clip = _pcm16_wav(np.concatenate([quiet(0.5), _tone(0.4), quiet(0.5), _tone(0.4), quiet(0.1), _tone(0.2),
+                                          quiet(0.3)]))
+        # Blocks of 7 frames put runs across block boundaries
+        metrics = fluency.analyze(io.BytesIO(clip), transcript="cat sun", block_frames=7)
+        self.assertEqual(metrics, fluency.analyze(io.BytesIO(clip), transcript="cat sun"))
+        self.assertEqual(metrics["duration_s"], 2.4)
+        self.assertEqual(metrics["time_to_first_phonation_s"], 0.5)
+        self.assertEqual(metrics["speaking_time_s"], 1.6)
+        # The 100 ms gap is too short to be a pause
+        self.assertEqual((metrics["pause_count"], metrics["pause_total_s"], metrics["segments"]), (1, 0.5, 2))
+        self.assertEqual(metrics["voiced_ratio"], 0.417)
+        self.assertEqual(metrics["words_per_second"], 1.25)
+        self.assertIsNone(fluency.analyze(io.BytesIO(b"not a wav")))
+
+    @override_settings(EVALUATION_WRITE_BEHIND=False, QUESTION_BANK_CHECK_INTERVAL=None)
+    def test_recorded_answers_are_saved_with_the_evaluation(self):
+        question_bank.invalidate()
+        self.client.force_login(CustomUser.objects.create_user("kid", password="pw", role="CHILD"))
+        clip = _pcm16_wav(np.concatenate([np.zeros(8000), _tone(1.0)]))
+        response = self.client.post(reverse("speech_fluency"), {
+            "audio": _upload(clip), "dyslexia_type": "Rapid naming deficit", "question_id": "1", "transcript": "seven",
+        })
+        self.assertEqual(response.json()["metrics"]["words"], 1)
+
+        self.client.post(reverse("evaluation_test", args=["Rapid naming deficit"]), {"q1": "seven"})
+        metrics = EvaluationData.objects.get().speech_fluency_metrics
+        self.assertEqual(list(metrics), ["1"])
+        self.assertEqual(metrics["1"]["time_to_first_phonation_s"], 0.5)
+        self.assertEqual(metrics["1"]["words"], 1)
+        self.assertNotIn("Rapid naming deficit", self.client.session["speech_fluency"])
+
+    @override_settings(STT_BACKGROUND=True, STT_MAX_PER_USER=0)
+    def test_fluency_uploads_are_not_recognised(self):
+        self.client.force_login(CustomUser.objects.create_user("kid", password="pw", role="CHILD"))
+        with mock.patch.object(stt_pool.RecognitionPool, "recognize") as recognize:
+            response = self.client.post(reverse("speech_fluency"), {
+                "audio": _upload(_pcm16_wav(_tone(0.5))), "dyslexia_type": "Rapid naming deficit", "question_id": "1",
+            })
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("words", response.json()["metrics"])
+        recognize.assert_not_called()
+        self.assertFalse(Job.objects.exists())
+        self.assertIn("1", self.client.session["speech_fluency"]["Rapid naming deficit"])
+
+        response = self.client.post(reverse("speech_fluency"), {"audio": _upload(b"RIFF"), "question_id": "1"})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(QUESTION_BANK_CHECK_INTERVAL=None)
+class ErrorPatternTests(TestCase):
+    def setUp(self):
+        question_bank.invalidate()
+
+    def test_errors_are_classified(self):
+        cases = {
+            ("bat", "dat"): ("reversal", "b", "d"),
+            ("dog", "tog"): ("phoneme", "d", "t"),
+            ("from", "form"): ("transposition", "ro", "or"),
+            ("cat", "ct"): ("omission", "a", None),
+            ("sun", "suns"): ("addition", None, "s"),
+            ("was", "saw"): ("word_reversal", "was", "saw"),
+            ("bed", "elephant"): ("word_substitution", "bed", "elephant"),
+        }
+        for (expected, response), error in cases.items():
+            self.assertEqual(error_patterns.analyze_pair(expected, response), (1, (error + (0,),)))
+        # Of two alternatives one word off, the one with fewer wrong letters
+        self.assertEqual(error_patterns.analyze_answer(["cat", "dog"], "dot"),
+                         ("dog", (("substitution", "g", "t", 0),)))
+
+    def test_timed_answer_lists_are_sequences(self):
+        entries = error_patterns.analyze_evaluation(
+            {"1": {"response": "red yelow green", "expected": ["red", "yellow", "blue", "green"]},
+             "5": {"response": "dog cat mouse rabbit", "expected": ["dog", "cat", "mouse", "rabbit"]}},
+            question_bank.get_questions("Rapid naming deficit"),
+        )
+        self.assertEqual(entries, [{
+            "question": "1", "expected": "red yellow blue green", "response": "red yelow green",
+            "errors": [{"type": "omission", "expected": "l", "response": None, "word": 1},
+                       {"type": "word_omission", "expected": "blue", "response": None, "word": 2}],
+        }])
+
+    def test_batch_mode_fills_stored_evaluations(self):
+        child = CustomUser.objects.create_user("kid", password="pw", role="CHILD")
+        for response in ("dat", "bat", "dat"):
+            EvaluationData.objects.create(user=child, dyslexia_type="Phonological dyslexia",
+                                          stt_responses={"5": {"response": response, "expected": "bat"}})
+        out = io.StringIO()
+        call_command("mine_error_patterns", "--chunk-size", "2", stdout=out)
+        self.assertIn("of 3 evaluations", out.getvalue())
+        self.assertIn("updated 3", out.getvalue())
+        self.assertEqual(
+            [row.error_patterns for row in EvaluationData.objects.order_by("pk")],
+            [[{"question": "5", "expected": "bat", "response": "dat",
+               "errors": [{"type": "reversal", "expected": "b", "response": "d", "word": 0}]}], [],
+             [{"question": "5", "expected": "bat", "response": "dat",
+               "errors": [{"type": "reversal", "expected": "b", "response": "d", "word": 0}]}]],
+        )
+        # The answer without errors is mined too, so nothing is left for a second run
+        out = io.StringIO()
+        call_command("mine_error_patterns", stdout=out)
+        self.assertIn("of 0 evaluations", out.getvalue())
+        out = io.StringIO()
+        call_command("mine_error_patterns", "--all", stdout=out)
+        self.assertIn("of 3 evaluations", out.getvalue())
+        self.assertIn("updated 0", out.getvalue())
+
+
+
+@override_settings(TTS_SYNTHESIZER="stub", TTS_SYNTHESIZER_OPTIONS={}, TTS_RATE="normal", JOBS_BROKER="eager")
+class TextToSpeechTests(TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        settings_override = self.settings(TTS_ROOT=root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.child = CustomUser.objects.create_user("kid", password="pw", role="CHILD")
+
+    def test_audio_is_rendered_once_per_text(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            lesson = Lesson.objects.create(title="Sounds", content_text="The  cat sat\non the mat.", prompt="Who sat?")
+        key = tts.key("The cat sat on the mat.")
+        self.assertTrue(os.path.exists(tts.path(key)))
+        self.assertNotEqual(key, tts.key("The cat sat on the mat.", rate="slow"))
+        self.assertNotEqual(key, tts.key("The dog sat on the mat."))
+
+        jobs_before = Job.objects.filter(name="render_tts").count()
+        with self.captureOnCommitCallbacks(execute=True):
+            lesson.level = 2
+            lesson.save()  # same texts: nothing to render
+        self.assertEqual(Job.objects.filter(name="render_tts").count(), jobs_before)
+
+        renders = tts.stats()["renders"]
+        with self.captureOnCommitCallbacks(execute=True):
+            lesson.content_text = "The dog sat on the mat."
+            lesson.save()
+        self.assertEqual(tts.stats()["renders"], renders + 1)
+        with open(tts.path(tts.key("The dog sat on the mat.")), "rb") as f:
+            self.assertEqual(f.read(), tts.get_synthesizer().synthesize("The dog sat on the mat."))
+
+    def test_audio_is_served_immutable(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            lesson = Lesson.objects.create(title="Rhymes", content_text="Red bed, blue shoe.", prompt="")
+        self.client.force_login(self.child)
+        page = self.client.get(reverse("lesson_detail", args=[lesson.pk]))
+        url = page.context["content_audio_url"]
+        self.assertEqual(url, reverse("tts_audio", args=[tts.key("Red bed, blue shoe."), "wav"]))
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "audio/wav")
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertIn("max-age=31536000", response["Cache-Control"])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+        self.assertEqual(self.client.get(reverse("tts_audio", args=["0" * 32, "wav"])).status_code, 404)
+
+
+def _wav(frames, rate=16000, channels=1, sample_width=1):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(sample_width)
+        wav.setframerate(rate)
+        wav.writeframes(frames)
+    return buffer.getvalue()
+
+
+def _upload(data, name="answer.wav"):
+    return SimpleUploadedFile(name, data, content_type="audio/wav")
+
+
+# =========================
+# Feature store
+# =========================
+class FeatureStoreTests(TestCase):
+    def setUp(self):
+        self.child = CustomUser.objects.create_user("kid", password="pw", role="CHILD")
+
+    def _evaluation(self, score, **fields):
+        return EvaluationData.objects.create(user=self.child, dyslexia_type="Visual dyslexia", score=score,
+                                             total_questions=5, response_times={"1": 2.0, "2": "n/a"}, **fields)
+
+    def _features(self):
+        return ChildFeatures.objects.get(child=self.child)
+
+    def test_writes_update_the_sums(self):
+        evaluation = self._evaluation(3)
+        Attempt.objects.create(child=self.child, lesson=Lesson.objects.create(title="L", content_text="x"),
+                               is_correct=True, time_spent_ms=1500, tts_plays=2)
+        features = self._features()
+        self.assertEqual((features.evaluation_count, features.score_sum, features.response_time_count,
+                          features.attempt_correct_count, features.attempt_time_ms_sum), (1, 3, 1, 1, 1500))
+
+        evaluation.score = 5
+        evaluation.save()
+        self.assertEqual(self._features().score_sum, 5)
+        evaluation.delete()
+        self.assertEqual((self._features().evaluation_count, self._features().score_sum), (0, 0))
+
+    def test_deleting_an_uncounted_row_recounts(self):
+        old = self._evaluation(5)
+        ChildFeatures.objects.all().delete()  # stored before the feature store existed
+        self._evaluation(1)
+        old.delete()
+        self.assertEqual((self._features().evaluation_count, self._features().score_sum), (1, 1))
+        self.child.delete()  # the cascade must not fail either
+        self.assertFalse(ChildFeatures.objects.exists())
+
+    def test_backfill_and_rebuild_count_the_full_history(self):
+        from importlib import import_module
+
+        from django.apps import apps
+
+        self._evaluation(2)
+        self._evaluation(4)
+        ChildFeatures.objects.all().delete()
+        import_module("accounts.migrations.0013_backfill_child_features").backfill(apps, None)
+        self.assertEqual((self._features().evaluation_count, self._features().score_sum), (2, 6))
+
+        ChildFeatures.objects.filter(child=self.child).update(score_sum=0, evaluation_count=0)
+        call_command("rebuild_features", stdout=io.StringIO())
+        self.assertEqual((self._features().evaluation_count, self._features().score_sum), (2, 6))
+
+
+class SuggestionCacheTests(TestCase):
+    def setUp(self):
+        self.child = CustomUser.objects.create_user("kid", password="pw", role="CHILD")
+        caches[suggestion_cache.CACHE_ALIAS].clear()
+        patcher = mock.patch.object(registry, "version", "v1")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.computed = 0
+
+    def _compute(self, child_id):
+        self.computed += 1
+        return [float(self.computed)], "Visual dyslexia"
+
+    def test_writes_invalidate_the_cached_suggestion(self):
+        suggestion_cache.get_suggestion(self.child.id, self._compute)
+        self.assertEqual(suggestion_cache.get_suggestion(self.child.id, self._compute)[0], [1.0])
+        evaluation = EvaluationData.objects.create(user=self.child, dyslexia_type="Visual dyslexia", score=2,
+                                                   total_questions=5)
+        self.assertEqual(suggestion_cache.get_suggestion(self.child.id, self._compute)[0], [2.0])
+        Attempt.objects.create(child=self.child, lesson=Lesson.objects.create(title="L", content_text="x"))
+        self.assertEqual(suggestion_cache.get_suggestion(self.child.id, self._compute)[0], [3.0])
+        evaluation.delete()
+        self.assertEqual(suggestion_cache.get_suggestion(self.child.id, self._compute)[0], [4.0])
+
+    def test_entries_expire_and_follow_the_model_version(self):
+        self.assertIsNotNone(caches[suggestion_cache.CACHE_ALIAS].default_timeout)
+        suggestion_cache.get_suggestion(self.child.id, self._compute)
+        with mock.patch.object(registry, "version", "v2"):
+            self.assertEqual(suggestion_cache.get_suggestion(self.child.id, self._compute)[0], [2.0])
+        self.assertEqual(self.computed, 2)
+
+
+# =========================
+# ML training data
+# =========================
+def _metrics_csv(directory, name, sid, trials=3, aois=2):
+    """A small metrics CSV: `aois` rows per trial repeating the trial columns."""
+    rows = ["sid,task,trialid,n_fix_trial,mean_fix_dur_trial,n_sacc_trial,n_regress_trial,"
+            "aoi,dwell_time_aoi,skipped_aoi,n_revisits_aoi"]
+    for trial in range(1, trials + 1):
+        for aoi in range(aois):
+            rows.append(f"{sid},T1,{trial},{sid % 7 + trial},{150.5 + trial},{trial * 2},{sid % 3},"
+                        f"line_{aoi:03d},{100 + aoi * trial},{aoi % 2},{aoi}")
+    path = os.path.join(directory, f"{name}_metrics.csv")
+    with open(path, "w") as f:
+        f.write("\n".join(rows) + "\n")
+    return path
+
+
+class TrainingDataTests(TestCase):
+    def setUp(self):
+        self.data = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data, ignore_errors=True)
+        for sid in range(1, 6):
+            _metrics_csv(self.data, f"s{sid}", sid, trials=sid + 1, aois=3)
+
+    def test_parallel_loader_matches_the_serial_one(self):
+        from ml.train_model import AOI_COLUMNS, COLUMNS, FEATURES, load_data
+
+        for aoi in (False, True):
+            serial, features = load_data(self.data, workers=1, aoi=aoi)
+            parallel, _ = load_data(self.data, workers=2, aoi=aoi)
+            self.assertEqual(features, FEATURES)
+            pd.testing.assert_frame_equal(parallel, serial)
+
+            wanted = {**COLUMNS, **AOI_COLUMNS} if aoi else COLUMNS
+            self.assertEqual(list(serial.columns), [*wanted, "label"])
+            for column, dtype in wanted.items():
+                self.assertEqual(serial[column].dtype, np.dtype(dtype), column)
+
+    def test_loader_reads_every_row_in_file_order(self):
+        from ml.train_model import COLUMNS, list_data_files, load_data
+
+        expected = pd.concat([pd.read_csv(path)[list(COLUMNS)] for path in list_data_files(self.data)],
+                             ignore_index=True)
+        df, _ = load_data(self.data, workers=2)
+        self.assertEqual(len(df), 3 * sum(sid + 1 for sid in range(1, 6)))
+        np.testing.assert_array_equal(df["sid"].to_numpy(), expected["sid"].to_numpy())
+        np.testing.assert_allclose(df["mean_fix_dur_trial"].to_numpy(),
+                                   expected["mean_fix_dur_trial"].to_numpy(dtype=np.float32))
+
+    def test_collapse_keeps_one_row_per_trial(self):
+        from ml.features import collapse_trials
+        from ml.train_model import load_data
+
+        df, _ = load_data(self.data, workers=1, aoi=True)
+        trials, report = collapse_trials(df, aggregate_aoi=True)
+        self.assertEqual((report["rows_in"], report["rows_out"], report["reduction"]), (60, 20, 3.0))
+        self.assertFalse(trials.duplicated(["sid", "task", "trialid"]).any())
+        # Same trial ids in every file stay apart per sid, in file order
+        self.assertEqual(trials["sid"].tolist(), [sid for sid in range(1, 6) for _ in range(sid + 1)])
+
+        trial = trials[(trials["sid"] == 4) & (trials["trialid"] == 3)].iloc[0]
+        self.assertEqual((trial["n_fix_trial"], trial["n_sacc_trial"], trial["n_regress_trial"]), (7, 6, 1))
+        self.assertAlmostEqual(trial["mean_fix_dur_trial"], 153.5)
+        # dwell 100, 103, 106; skipped 0, 1, 0; revisits 0, 1, 2
+        self.assertEqual((trial["n_aoi"], trial["max_dwell_time_aoi"], trial["n_skipped_aoi"],
+                          trial["n_revisits_aoi"]), (3, 106, 1, 3))
+        self.assertAlmostEqual(trial["mean_dwell_time_aoi"], 103)
+        self.assertAlmostEqual(trial["skip_rate_aoi"], 1 / 3)
+        self.assertAlmostEqual(trial["mean_revisits_aoi"], 1)
+
+    def test_collapse_without_aoi_aggregates(self):
+        from ml.features import collapse_trials
+        from ml.train_model import FEATURES, load_data
+
+        df, _ = load_data(self.data, workers=1)
+        trials, _ = collapse_trials(df)
+        self.assertEqual(list(trials.columns), ["sid", "task", "trialid", *FEATURES, "label"])
+        self.assertEqual(len(trials), 20)
+
+class FeatureCacheTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.data = os.path.join(self.root, "data")
+        os.makedirs(self.data)
+
+    def _cache(self, name="cache"):
+        from ml.feature_cache import FeatureCache
+
+        return FeatureCache(cache_dir=os.path.join(self.root, name), data_path=self.data)
+
+    def test_rows_follow_file_order_whatever_the_history(self):
+        cache = self._cache()
+        _metrics_csv(self.data, "Subject_2", 2)
+        _metrics_csv(self.data, "Subject_4", 4)
+        cache.refresh(workers=1)
+        _metrics_csv(self.data, "Subject_1", 1, trials=2)  # sorts before the cached files
+        matrix, report = cache.load(workers=1)
+        self.assertEqual((report["new"], report["rows"]), (1, 8))
+
+        rebuilt, _ = self._cache("fresh").load(workers=1)
+        np.testing.assert_array_equal(matrix, rebuilt)
+        self.assertEqual(matrix[0, 0], 1 % 7 + 1)  # Subject_1's first trial comes first
+
+    def test_missing_matrix_is_rebuilt(self):
+        cache = self._cache()
+        _metrics_csv(self.data, "Subject_2", 2)
+        expected = np.array(cache.load(workers=1)[0])
+        os.remove(cache.matrix_path)
+        _metrics_csv(self.data, "Subject_3", 3)  # forces the rewrite path
+        matrix, report = cache.load(workers=1)
+        self.assertEqual(report["parsed"], 2)
+        np.testing.assert_array_equal(matrix[:3], expected)
+
+
+# =========================
+# ML model artifacts
+# =========================
+def _forest_data(n=400, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, 4)).astype(np.float32)
+    labels = np.array(["Phonological", "Surface", "Visual"], dtype=object)
+    y = labels[(X[:, 0] > 0).astype(int) + (X[:, 1] > 0.5).astype(int)]
+    return X, y
+
+
+def _fitted_forest(n_estimators=20, max_depth=None, seed=0):
+    from sklearn.ensemble import RandomForestClassifier
+
+    X, y = _forest_data(seed=seed)
+    return RandomForestClassifier(n_estimators=n_estimators, max_depth=max_depth, random_state=seed).fit(X, y), X, y
+
+
+class ModelSearchTests(TestCase):
+    def test_recommends_the_fastest_configuration_close_to_the_best(self):
+        from ml.model_search import recommend
+
+        results = [
+            {"n_estimators": 200, "cv_accuracy": 0.90, "forest_p50_us": 90.0, "forest_size_kb": 900},
+            {"n_estimators": 50, "cv_accuracy": 0.895, "forest_p50_us": 30.0, "forest_size_kb": 300},
+            {"n_estimators": 10, "cv_accuracy": 0.85, "forest_p50_us": 10.0, "forest_size_kb": 100},
+        ]
+        self.assertEqual(recommend(results, tolerance=0.01)["n_estimators"], 50)
+        self.assertEqual(recommend(results, tolerance=0.0)["n_estimators"], 200)
+        self.assertEqual(recommend(results, tolerance=0.1)["n_estimators"], 10)
+
+    def test_grid_search_picks_the_best_cross_validated_configuration(self):
+        from contextlib import redirect_stdout
+
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.model_selection import StratifiedKFold, cross_val_score, train_test_split
+
+        from ml.model_search import run_search
+
+        report_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, report_dir, ignore_errors=True)
+        X, y = _forest_data()
+        with redirect_stdout(io.StringIO()):
+            choice, results = run_search(X, y, folds=3, n_jobs=2, tolerance=0.0, repeats=20,
+                                         n_estimators=[5, 15], max_depth=[1, None], report_dir=report_dir)
+
+        self.assertEqual(len(results), 4)
+        self.assertEqual(choice["cv_accuracy"], max(r["cv_accuracy"] for r in results))
+        # One split can't separate three labels
+        self.assertIsNone(choice["max_depth"])
+        X_train, _, y_train, _ = train_test_split(X, y, test_size=0.2, random_state=42)
+        folds = StratifiedKFold(n_splits=3, shuffle=True, random_state=42)
+        expected = cross_val_score(RandomForestClassifier(n_estimators=choice["n_estimators"], random_state=42),
+                                   X_train, y_train, cv=folds).mean()
+        self.assertAlmostEqual(choice["cv_accuracy"], expected)
+        with open(os.path.join(report_dir, "model_search.json")) as f:
+            self.assertEqual(json.load(f)["recommended"], choice)
+
+class ArrayForestTests(TestCase):
+    def assertMatchesSklearn(self, model, X):
+        from ml.forest_arrays import ArrayForest
+
+        forest = ArrayForest.from_model(model)
+        np.testing.assert_array_equal(forest.predict_proba(X), model.predict_proba(X))
+        np.testing.assert_array_equal(forest.predict(X), model.predict(X))
+        self.assertEqual(forest.predict_one(X[0]), model.predict(X[:1])[0])
+        return forest
+
+    def test_predictions_match_sklearn(self):
+        X_test, _ = _forest_data(n=300, seed=1)
+        for max_depth in (None, 3):
+            model, _, _ = _fitted_forest(max_depth=max_depth)
+            self.assertMatchesSklearn(model, X_test)
+
+    def test_walks_end_on_self_pointing_leaves(self):
+        model, X, _ = _fitted_forest()
+        forest = self.assertMatchesSklearn(model, X)
+        leaves = forest.apply(X)
+        np.testing.assert_array_equal(forest.left[leaves], leaves)
+        np.testing.assert_array_equal(forest.right[leaves], leaves)
+        np.testing.assert_array_equal(leaves - forest.roots, model.apply(X))
+
+    def test_single_leaf_trees(self):
+        from sklearn.ensemble import RandomForestClassifier
+
+        X, y = _forest_data()
+        model = RandomForestClassifier(n_estimators=5, min_samples_split=len(X) + 1, random_state=0).fit(X, y)
+        forest = self.assertMatchesSklearn(model, X)
+        self.assertEqual(forest.max_depth, 0)
+
+    def test_other_layouts_are_rejected(self):
+        from ml.forest_arrays import FORMAT_VERSION, ArrayForest, export_forest
+
+        model, X, _ = _fitted_forest(n_estimators=2)
+        arrays = export_forest(model)
+        unversioned = {key: value for key, value in arrays.items() if key != "format"}
+        for other in (dict(arrays, format=np.int64(FORMAT_VERSION - 1)),
+                      dict(arrays, format=np.int64(FORMAT_VERSION + 1)), unversioned):
+            with self.assertRaisesRegex(ValueError, "layout"):
+                ArrayForest(other)
+        with self.assertRaisesRegex(ValueError, "features"):
+            ArrayForest(arrays).predict(X[:, :3])
+
+class CompactForestTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.path = os.path.join(self.root, "model.compact.forest")
+
+    def test_compact_forest_keeps_accuracy_and_agrees_with_the_full_model(self):
+        from ml.compress_model import compress_model
+        from ml.forest_arrays import load_forest
+
+        model, X, y = _fitted_forest(n_estimators=40)
+        X_test, y_test = _forest_data(n=200, seed=1)
+        report = compress_model(model, X_test, y_test, path=self.path, max_depth=6, n_trees=20)
+        self.assertTrue(report["written"])
+        self.assertLess(report["nodes_after"], report["nodes_before"])
+        self.assertGreaterEqual(report["after"]["accuracy"], report["before"]["accuracy"] - 0.02)
+        self.assertGreaterEqual(report["agreement"], 0.9)
+
+        predictions = load_forest(self.path).predict(X_test)
+        self.assertEqual(float(np.mean(predictions == y_test)), report["after"]["accuracy"])
+        self.assertEqual(float(np.mean(predictions == model.predict(X_test))), report["agreement"])
+
+    def test_rejected_compression_removes_the_old_artifact(self):
+        from ml.compress_model import compress_model
+
+        model, X, y = _fitted_forest()
+        with open(self.path, "wb") as f:
+            f.write(b"compressed from an older model")
+        report = compress_model(model, X, y, path=self.path, max_depth=1, n_trees=1, tolerance=-1)
+        self.assertFalse(report["written"])
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(os.listdir(self.root), [])
+
+
+# =========================
+# ML serving
+# =========================
+class PredictionBrokerTests(TestCase):
+    def _broker(self, predict, **options):
+        from .prediction_broker import PredictionBroker
+
+        return PredictionBroker(predict=predict, **options)
+
+    def _predict_all(self, broker, rows):
+        with ThreadPoolExecutor(len(rows)) as executor:
+            return list(executor.map(broker.predict_one, rows))
+
+    def test_concurrent_requests_share_one_predict(self):
+        calls = []
+
+        def predict(rows):
+            calls.append(len(rows))
+            return [f"label-{row[0]:.0f}" for row in rows]
+
+        broker = self._broker(predict, max_batch_size=4, window=1.0, timeout=5.0)
+        labels = self._predict_all(broker, [[i, 0.0] for i in range(4)])
+        self.assertEqual(labels, ["label-0", "label-1", "label-2", "label-3"])
+        self.assertEqual(calls, [4])
+        self.assertEqual((broker.counters["batched"], broker.counters["direct"]), (4, 0))
+
+    def test_timed_out_requests_predict_directly_and_are_skipped(self):
+        gate, batches = threading.Event(), []
+
+        def predict(rows):
+            if isinstance(rows, np.ndarray):  # the dispatcher's batch
+                batches.append(len(rows))
+                gate.wait(5)
+            return ["label"] * len(rows)
+
+        broker = self._broker(predict, max_batch_size=1, window=0, timeout=0.05)
+        self.assertEqual(broker.predict_one([1.0]), "label")  # its batch is stuck at the gate
+        self.assertEqual(broker.predict_one([2.0]), "label")  # still queued when it gives up
+        gate.set()
+        deadline = time.monotonic() + 5
+        while broker.counters["abandoned"] < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(batches, [1])
+        self.assertEqual(broker.counters["abandoned"], 1)
+        self.assertEqual((broker.counters["timeouts"], broker.counters["direct"]), (2, 2))
+
+    def test_failed_batch_falls_back_to_direct_predictions(self):
+        def predict(rows):
+            if isinstance(rows, np.ndarray):
+                raise ValueError("bad batch")
+            return ["label"] * len(rows)
+
+        broker = self._broker(predict, window=0, timeout=5.0)
+        self.assertEqual(broker.predict_one([1.0]), "label")
+        self.assertEqual((broker.counters["errors"], broker.counters["direct"]), (1, 1))
+
+    def test_batching_is_off_by_default(self):
+        from . import prediction_broker
+
+        with mock.patch.object(prediction_broker.broker, "predict_one") as batched, \
+                mock.patch.object(registry, "predict", return_value=["label"]) as direct:
+            self.assertEqual(prediction_broker.predict_one([1.0]), "label")
+        batched.assert_not_called()
+        direct.assert_called_once_with([[1.0]])
+
+
+class ModelRegistryTests(TestCase):
+    def setUp(self):
+        from .ml_registry import ModelRegistry
+
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.paths = {}
+        for name in ("pkl", "forest", "compact", "online"):
+            self.paths[name] = os.path.join(self.root, f"model.{name}")
+            with open(self.paths[name], "w") as f:
+                f.write(name)
+        self.loads = []
+        self.registry = ModelRegistry(loader=self._load)
+
+    def _load(self, path):
+        self.loads.append(path)
+        with open(path) as f:
+            return f.read()
+
+    def _settings(self, **flags):
+        return self.settings(ML_MODEL_PATH=self.paths["pkl"], ML_MODEL_ARRAYS_PATH=self.paths["forest"],
+                             ML_MODEL_COMPACT_PATH=self.paths["compact"], ML_ONLINE_MODEL_PATH=self.paths["online"],
+                             **{"ML_MODEL_MMAP": True, "ML_MODEL_COMPACT": True, "ML_MODEL_ONLINE": True,
+                                "ML_MODEL_CHECK_INTERVAL": 0, **flags})
+
+    def _rewrite(self, name, content):
+        mtime = os.stat(self.paths[name]).st_mtime_ns
+        with open(self.paths[name], "w") as f:
+            f.write(content)
+        os.utime(self.paths[name], ns=(mtime + 10 ** 9, mtime + 10 ** 9))
+
+    def test_loads_on_first_use_only(self):
+        with self._settings():
+            self.assertFalse(self.registry.is_loaded)
+            self.assertEqual(self.loads, [])
+            self.assertEqual(self.registry.get(), "online")
+            self.assertEqual(self.registry.get(), "online")
+        self.assertEqual(len(self.loads), 1)
+        self.assertEqual(self.registry.stats()["loads"], 1)
+
+    def test_serves_online_then_compact_then_forest_then_pickle(self):
+        with self._settings():
+            for name in ("online", "compact", "forest", "pkl"):
+                self.assertEqual(self.registry.path, self.paths[name])
+                self.assertEqual(self.registry.get(), name)
+                if name != "pkl":
+                    os.remove(self.paths[name])
+        with self._settings(ML_MODEL_ONLINE=False, ML_MODEL_COMPACT=False, ML_MODEL_MMAP=False):
+            self.assertEqual(self.registry.path, self.paths["pkl"])
+
+    def test_reloads_when_the_artifact_changes(self):
+        received = []
+
+        def on_reload(sender, version, **kwargs):
+            received.append(version)
+
+        model_reloaded.connect(on_reload)
+        self.addCleanup(model_reloaded.disconnect, on_reload)
+        with self._settings(ML_MODEL_VERIFY_HASH=True):
+            self.registry.get()
+            version = self.registry.version
+            self._rewrite("online", "online")  # touched, same content
+            self.registry.get()
+            self.assertEqual(len(self.loads), 1)
+
+            self._rewrite("online", "online v2")
+            self.assertEqual(self.registry.get(), "online v2")
+            self.assertNotEqual(self.registry.version, version)
+        self.assertEqual(len(self.loads), 2)
+        self.assertEqual(received, [version, self.registry.version])
+
+    def test_keeps_the_loaded_model_between_checks(self):
+        with self._settings(ML_MODEL_CHECK_INTERVAL=None):
+            self.registry.get()
+            self._rewrite("online", "online v2")
+            self.assertEqual(self.registry.get(), "online")
+            self.assertEqual(self.registry.reload(), "online v2")
+
+    def test_memory_mapped_forest_predicts_like_the_pickle(self):
+        import joblib
+
+        from ml.forest_arrays import export_forest, save_forest
+
+        from .ml_registry import load_artifact
+
+        model, X, _ = _fitted_forest()
+        pkl, forest = os.path.join(self.root, "model.pkl"), os.path.join(self.root, "model.forest")
+        joblib.dump(model, pkl)
+        save_forest(export_forest(model), forest)
+
+        mapped = load_artifact(forest)
+        self.assertIsInstance(mapped.threshold, np.memmap)
+        self.assertFalse(mapped.value.flags.writeable)
+        with self.settings(ML_MODEL_COMPILE=False):
+            pickled = load_artifact(pkl)
+        self.assertIs(type(pickled), type(model))
+        np.testing.assert_array_equal(mapped.predict_proba(X), pickled.predict_proba(X))
+        np.testing.assert_array_equal(mapped.predict(X), pickled.predict(X))
+        np.testing.assert_array_equal(load_artifact(pkl).predict(X), pickled.predict(X))
+
+
+class OnlineModelTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.path = os.path.join(self.root, "model.online.pkl")
+        self.child = CustomUser.objects.create_user("kid", password="pw", role="CHILD")
+
+    def _evaluations(self, n, dyslexia_type=None):
+        """Visual evaluations score high and answer fast, Phonological ones the opposite."""
+        rows = []
+        for i in range(n):
+            visual = i % 2 == 0
+            rows.append(EvaluationData.objects.create(
+                user=self.child, dyslexia_type=dyslexia_type or ("Visual dyslexia" if visual else "Phonological dyslexia"),
+                score=5 if visual else 1, total_questions=5, stt_accuracy=90.0 if visual else 30.0,
+                completion_time=20.0 if visual else 80.0, response_times={"1": 2.0 if visual else 9.0},
+            ))
+        return rows
+
+    def test_partial_fit_learns_batch_by_batch(self):
+        from sklearn.preprocessing import StandardScaler
+
+        from ml.online_model import OnlineModel
+
+        X, y = _forest_data()
+        model = OnlineModel(["a", "b", "c", "d"], ["Phonological", "Surface", "Visual"])
+        self.assertFalse(model.is_fitted)
+        for start in range(0, len(X), 100):
+            model.partial_fit(X[start:start + 100], y[start:start + 100], watermark=start + 100)
+        self.assertEqual((model.n_seen, model.watermark, len(model.history)), (400, 400, 4))
+        np.testing.assert_allclose(model.scaler.mean_, StandardScaler().fit(X.astype(np.float64)).mean_)
+        self.assertGreater(np.mean(model.predict(X) == y), 0.6)  # linear, chance is 1/3
+        self.assertEqual(model.predict_proba(X[:2]).shape, (2, 3))
+
+    def test_update_learns_only_the_new_evaluations(self):
+        first = self._evaluations(20)
+        report = online_training.update(self.path, batch_size=8)
+        self.assertEqual((report["mode"], report["rows"], report["batches"]), ("full", 20, 3))
+        self.assertEqual(report["watermark"], first[-1].pk)
+
+        new = self._evaluations(6)
+        self._evaluations(2, dyslexia_type="Unknown")
+        with self.assertLogs("accounts.online_training", "WARNING") as logs:
+            report = online_training.update(self.path, batch_size=8)
+        self.assertIn("{'Unknown': 2}", logs.output[0])
+        self.assertEqual((report["mode"], report["since"], report["rows"], report["skipped"]),
+                         ("incremental", first[-1].pk, 6, 2))
+        self.assertTrue(report["published"])
+        model = online_training.online_model.load(self.path)
+        self.assertEqual((model.n_seen, model.updates), (26, 1))
+        self.assertEqual(model.watermark, new[-1].pk + 2)  # past the unlabelled rows too
+        visual, phonological = new[0], new[1]
+        self.assertEqual(list(model.predict([online_training.evaluation_features(visual),
+                                             online_training.evaluation_features(phonological)])),
+                         ["Visual", "Phonological"])
+
+        report = online_training.update(self.path)
+        self.assertEqual((report["rows"], report["published"]), (0, False))
+
+    @override_settings(ML_ONLINE_FULL_RETRAIN_EVERY=1)
+    def test_update_model_command_retrains_periodically(self):
+        self._evaluations(10)
+        out = io.StringIO()
+        call_command("update_model", "--path", self.path, stdout=out)
+        self.assertIn("full: 10 rows", out.getvalue())
+
+        self._evaluations(4)
+        call_command("update_model", "--path", self.path, stdout=out)
+        self.assertIn("incremental: 4 rows", out.getvalue())
+        out = io.StringIO()
+        call_command("update_model", "--path", self.path, stdout=out)
+        self.assertIn("full: 14 rows", out.getvalue())
+        self.assertIn("agreement with the previous model", out.getvalue())
+        self.assertEqual(online_training.online_model.load(self.path).updates, 0)
+
+    def test_every_evaluation_type_reaches_the_model(self):
+        for dyslexia_type in ("Rapid naming deficit", "Developmental dyslexia", "Acquired dyslexia"):
+            self._evaluations(3)
+            self._evaluations(4, dyslexia_type=dyslexia_type)
+        out = io.StringIO()
+        call_command("update_model", "--path", self.path, stdout=out)
+        self.assertIn("full: 21 rows", out.getvalue())
+        self.assertNotIn("skipped", out.getvalue())
+
+        model = online_training.online_model.load(self.path)
+        self.assertEqual(list(model.classes_), online_training.CLASSES)
+        self.assertNotIn("Double Deficit", online_training.CLASSES)
+        rapid = EvaluationData.objects.filter(dyslexia_type="Rapid naming deficit")
+        self.assertEqual({online_training.evaluation_label(e) for e in rapid}, {"Rapid Naming"})
+        self.assertEqual((model.n_seen, model.watermark), (21, EvaluationData.objects.latest("pk").pk))
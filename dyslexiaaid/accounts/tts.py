@@ -0,0 +1,269 @@
+"""
+Server-side text to speech for lessons and evaluation questions.
+
+Browsers' speechSynthesis sounds different on every device (and is missing on
+some), so the texts children hear (Lesson.content_text, Lesson.prompt and the
+question texts) are rendered once on the server and served as audio files:
+
+    gtts   Google Translate's TTS through gTTS (needs network), MP3
+    stub   deterministic stand-in for tests and offline development, WAV
+
+A rendering is stored under a content-addressed key,
+
+    blake2b(TTS_CACHE_VERSION, synthesizer version (engine + voice), rate, text)
+
+in TTS_ROOT/<key[:2]>/<key>.<ext>, so the file for a given text never changes:
+it is served with an ETag and a one-year immutable Cache-Control, editing a
+text gives it a new key (the old file is simply no longer used, see
+`render_tts --prune`), and saving a lesson or question whose text is already
+rendered costs nothing. Texts without audio yet are rendered by the
+"render_tts" background job (tasks.py); until it is done pages fall back to
+the browser voice.
+"""
+import hashlib
+import io
+import math
+import os
+import tempfile
+import threading
+import time
+import wave
+
+from django.conf import settings
+from django.urls import reverse
+
+RATES = ("normal", "slow")
+
+_stats = {"hits": 0, "misses": 0, "renders": 0, "failures": 0, "render_seconds": 0.0, "queued": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name, value=1):
+    with _stats_lock:
+        _stats[name] += value
+
+
+# =========================
+# Synthesizers
+# =========================
+class Synthesizer:
+    name = None
+    extension = None
+    content_type = None
+
+    def __init__(self, lang="en"):
+        self.lang = lang
+
+    @property
+    def version(self):
+        return f"{self.name}:{self.lang}"
+
+    def synthesize(self, text, rate="normal"):
+        """Audio bytes of `text` spoken at `rate` (one of RATES)."""
+        raise NotImplementedError
+
+
+class GttsSynthesizer(Synthesizer):
+    name = "gtts"
+    extension = "mp3"
+    content_type = "audio/mpeg"
+
+    def __init__(self, lang="en", tld="com"):
+        super().__init__(lang)
+        self.tld = tld  # accent: "com", "co.uk", "com.au", ...
+
+    @property
+    def version(self):
+        return f"gtts:{self.lang}:{self.tld}"
+
+    def synthesize(self, text, rate="normal"):
+        from gtts import gTTS
+
+        buffer = io.BytesIO()
+        gTTS(text, lang=self.lang, tld=self.tld, slow=rate == "slow").write_to_fp(buffer)
+        return buffer.getvalue()
+
+
+class StubSynthesizer(Synthesizer):
+    """A short tone per word, pitched from the word's hash: the same text
+    always gives the same bytes, and longer texts give longer audio."""
+
+    name = "stub"
+    extension = "wav"
+    content_type = "audio/wav"
+
+    def __init__(self, lang="en", sample_rate=8000, word_seconds=0.15):
+        super().__init__(lang)
+        self.sample_rate = sample_rate
+        self.word_seconds = word_seconds
+
+    def synthesize(self, text, rate="normal"):
+        seconds = self.word_seconds * (1.5 if rate == "slow" else 1.0)
+        length = int(self.sample_rate * seconds)
+        frames = bytearray()
+        for word in text.split():
+            pitch = 200 + hashlib.blake2b(word.encode(), digest_size=2).digest()[0] * 2
+            frames += bytes(
+                128 + int(60 * math.sin(2 * math.pi * pitch * i / self.sample_rate)) for i in range(length)
+            )
+            frames += bytes([128]) * (length // 3)
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(1)
+            wav.setframerate(self.sample_rate)
+            wav.writeframes(bytes(frames))
+        return buffer.getvalue()
+
+
+SYNTHESIZERS = {cls.name: cls for cls in (GttsSynthesizer, StubSynthesizer)}
+
+_synthesizer = None
+_synthesizer_config = None
+_synthesizer_lock = threading.Lock()
+
+
+def get_synthesizer():
+    """The configured synthesizer (rebuilt when the settings change, e.g. in tests)."""
+    global _synthesizer, _synthesizer_config
+    config = (settings.TTS_SYNTHESIZER, tuple(sorted(getattr(settings, "TTS_SYNTHESIZER_OPTIONS", {}).items())))
+    with _synthesizer_lock:
+        if config != _synthesizer_config:
+            name, options = config
+            if name not in SYNTHESIZERS:
+                raise ValueError(f"Unknown TTS synthesizer {name!r}, expected one of {sorted(SYNTHESIZERS)}")
+            _synthesizer, _synthesizer_config = SYNTHESIZERS[name](**dict(options)), config
+        return _synthesizer
+
+
+# =========================
+# Content-addressed store
+# =========================
+def clean(text):
+    return " ".join(str(text or "").split())
+
+
+def _rate(rate):
+    rate = rate or getattr(settings, "TTS_RATE", "normal")
+    if rate not in RATES:
+        raise ValueError(f"Unknown TTS rate {rate!r}, expected one of {RATES}")
+    return rate
+
+
+def key(text, rate=None):
+    """Key of `text` rendered by the configured synthesizer at `rate`."""
+    identity = "\n".join((str(getattr(settings, "TTS_CACHE_VERSION", 1)), get_synthesizer().version,
+                          _rate(rate), clean(text)))
+    return hashlib.blake2b(identity.encode(), digest_size=16).hexdigest()
+
+
+def path(audio_key, extension=None):
+    extension = extension or get_synthesizer().extension
+    return os.path.join(settings.TTS_ROOT, audio_key[:2], f"{audio_key}.{extension}")
+
+
+# Renders of the same key in this process wait for each other instead of
+# synthesizing twice
+_rendering = {}
+_rendering_lock = threading.Lock()
+
+
+def render(text, rate=None):
+    """Key of `text`, synthesizing and storing it first unless already stored."""
+    audio_key = key(text, rate)
+    target = path(audio_key)
+    if os.path.exists(target):
+        _count("hits")
+        return audio_key
+    with _rendering_lock:
+        lock = _rendering.setdefault(audio_key, threading.Lock())
+    with lock:
+        if os.path.exists(target):
+            _count("hits")
+            return audio_key
+        _count("misses")
+        started = time.perf_counter()
+        try:
+            audio = get_synthesizer().synthesize(clean(text), _rate(rate))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            # Written aside and renamed, so a reader never sees half a file
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(audio)
+            os.replace(tmp, target)
+        except Exception:
+            _count("failures")
+            raise
+        finally:
+            with _rendering_lock:
+                _rendering.pop(audio_key, None)
+        _count("renders")
+        _count("render_seconds", time.perf_counter() - started)
+    return audio_key
+
+
+def audio_urls(texts, rate=None):
+    """{text: URL of its audio} for the texts already rendered, queueing a
+    render_tts job for the others (their URL is None for now)."""
+    if not getattr(settings, "TTS_ENABLED", True):
+        return {text: None for text in texts}
+    extension = get_synthesizer().extension
+    urls, missing = {}, []
+    for text in texts:
+        if not clean(text):
+            urls[text] = None
+            continue
+        audio_key = key(text, rate)
+        if os.path.exists(path(audio_key, extension)):
+            urls[text] = reverse("tts_audio", args=[audio_key, extension])
+        else:
+            urls[text] = None
+            missing.append(text)
+    if missing:
+        request_render(missing, rate)
+    return urls
+
+
+# Texts queued by this process and not rendered yet, so a page opened many
+# times before the job ran doesn't queue it many times
+_queued = set()
+_queued_lock = threading.Lock()
+
+
+def request_render(texts, rate=None):
+    """Queue a background render of the texts that have no audio yet."""
+    from . import jobs
+
+    if not getattr(settings, "TTS_ENABLED", True):
+        return None
+    with _queued_lock:
+        pending = []
+        for text in dict.fromkeys(clean(text) for text in texts):
+            if not text:
+                continue
+            audio_key = key(text, rate)
+            if audio_key not in _queued and not os.path.exists(path(audio_key)):
+                _queued.add(audio_key)
+                pending.append(text)
+    if not pending:
+        return None
+    _count("queued", len(pending))
+    return jobs.enqueue("render_tts", texts=pending, rate=_rate(rate))
+
+
+def rendered(texts, rate=None):
+    """Called by the render job: these texts may be queued again if their files go."""
+    with _queued_lock:
+        for text in texts:
+            _queued.discard(key(text, rate))
+
+
+def stats():
+    with _stats_lock:
+        snapshot = dict(_stats)
+    lookups = snapshot["hits"] + snapshot["misses"]
+    snapshot["hit_rate"] = snapshot["hits"] / lookups if lookups else None
+    snapshot["render_ms_mean"] = (round(snapshot["render_seconds"] / snapshot["renders"] * 1000, 1)
+                                  if snapshot["renders"] else None)
+    snapshot["synthesizer"] = get_synthesizer().version
+    return snapshot
@@ -1,4 +1,4 @@
-from django.urls import path
+from django.urls import path, re_path
 from . import views
 from django.contrib.auth import views as auth_views
 
@@ -43,4 +43,17 @@ urlpatterns = [
     path("test/<str:dyslexia_type>/", views.evaluation_test, name="evaluation_test"),
     # path("evaluation/result/<int:evaluation_id>/", views.evaluation_result, name="evaluation_result"),
     path('speech-to-text/', views.speech_to_text_api, name='speech_to_text'),
+    path('speech-to-text/fluency/', views.speech_fluency_api, name='speech_fluency'),
+    path('ml/status/', views.ml_model_status, name='ml_model_status'),
+    path('speech-to-text/status/', views.stt_status, name='stt_status'),
+    re_path(r'^tts/(?P<key>[0-9a-f]{32})\.(?P<extension>mp3|wav)$', views.tts_audio, name='tts_audio'),
+    path('tts/status/', views.tts_status, name='tts_status'),
+    path('evaluations/writer/status/', views.evaluation_writer_status, name='evaluation_writer_status'),
+    path('ml/train/', views.train_model_job, name='train_model_job'),
+    path('export/training-data/', views.export_training_data, name='export_training_data'),
+
+    # Background jobs
+    path('jobs/stats/', views.job_stats, name='job_stats'),
+    path('jobs/<uuid:job_id>/', views.job_status, name='job_status'),
+    path('jobs/<uuid:job_id>/result/', views.job_result, name='job_result'),
 ]   
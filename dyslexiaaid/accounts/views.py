@@ -2,28 +2,36 @@
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth import login, logout
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponseForbidden, JsonResponse, HttpResponse
+from django.http import HttpResponseForbidden, JsonResponse, HttpResponse, FileResponse
 from .forms import ParentRegisterForm, ChildRegisterForm, IndependentRegisterForm, DyslexiaTypeForm, ChildProfileEditForm
 from .forms import DyslexiaTypeForm
 from django.contrib import messages
 import time 
 from .models import CustomUser, ChildProfile
-import joblib
-import pandas as pd
 import os
 from django.utils import timezone
-import speech_recognition as sr
 import json
 from django.http import JsonResponse
 
 # NEW: Import the EvaluationData model
 from .models import EvaluationData
-import numpy as np  # NEW: For data export functionality
 
 
 
-# Load ML model (do this once when server starts)
-ml_model = joblib.load("ml/dyslexia_model.pkl")
+# ML model is loaded lazily on first prediction (see ml_registry.py)
+from .ml_registry import registry as ml_registry
+from .prediction_broker import broker as prediction_broker, predict_one
+from . import evaluation_writer, feature_store, question_bank, scoring, suggestion_cache
+
+# Background jobs (export, training, speech to text)
+from django.conf import settings
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+import speech_recognition as sr
+from . import audio_preprocess, error_patterns, fluency, jobs, speech, stt_cache, stt_pool, stt_stream, tts
+from django.views.decorators.http import etag
+from django.utils.cache import patch_cache_control
+from .models import Job
 
 def parent_register(request):
     if request.method == "POST":
@@ -245,8 +253,7 @@ def child_dashboard(request, child_id):
     # ✅ Optional: ML suggestion (for reference only)
     suggested_type = None
     try:
-        features = get_user_features(profile.child.id)
-        suggested_type = ml_model.predict([features])[0]
+        features, suggested_type = suggestion_cache.get_suggestion(profile.child.id, compute_suggestion)
     except Exception as e:
         print("ML suggestion error:", e)
 
@@ -413,194 +420,23 @@ def about_us(request):
 def get_user_features(user_id):
     """
     Fetch user-specific features.
-    For now, load a placeholder CSV. Later link with your DB or uploaded data.
+    Reads the child's row in the ChildFeatures store (kept up to date by signals.py),
+    picking the inputs the served model was trained on.
     """
-    # Example placeholder: each user gets same mock data
-    df = pd.DataFrame([{
-        "n_fix_trial": 120,
-        "mean_fix_dur_trial": 220,
-        "n_sacc_trial": 85,
-        "n_regress_trial": 15
-    }])
-    return df[["n_fix_trial", "mean_fix_dur_trial", "n_sacc_trial", "n_regress_trial"]].iloc[0].tolist()
+    return feature_store.get_user_features(user_id, ml_registry.feature_names)
+
+def compute_suggestion(user_id):
+    """Features and ML suggested type for a child (cached by suggestion_cache)."""
+    features = get_user_features(user_id)
+    return features, predict_one(features)
 
 # --------------------------------------------------Evaluation Area ---------------------------------------------------
 
 @login_required
 
 def evaluation_test(request, dyslexia_type):
-    questions_bank = {
-        "Phonological dyslexia": [
-            {
-                "id": 1,
-                "text": "Say the word 'cat' aloud and record your pronunciation.",
-                "interaction": "speech_recognition",
-                "expected": "cat",
-                "hint": "Speak clearly into your microphone"
-            },
-            {
-                "id": 2, 
-                "text": "Break the word 'sun' into individual sounds (phonemes).",
-                "interaction": "speech_recognition",
-                "expected": "s u n",
-                "hint": "Say each sound separately: s - u - n"
-            },
-            {
-                "id": 3,
-                "text": "Which word rhymes with 'bat'? Choose one.",
-                "interaction": "multiple_choice",
-                "options": ["cat", "bed", "book", "run"],
-                "expected": "cat",
-                "hint": "Think of words that sound similar at the end"
-            },
-            {
-                "id": 4,
-                "text": "What is the first sound you hear in 'fish'?",
-                "interaction": "multiple_choice",
-                "options": ["f", "sh", "i", "h"],
-                "expected": "f",
-                "hint": "Focus on the beginning sound"
-            },
-            {
-                "id": 5,
-                "text": "Blend these sounds together: /b/ /a/ /t/",
-                "interaction": "speech_recognition",
-                "expected": "bat",
-                "hint": "Say the sounds quickly together: b-a-t"
-            }
-        ],
-        "Surface dyslexia": [
-            {
-                "id": 1,
-                "text": "Read this word aloud: 'yacht'",
-                "interaction": "speech_recognition",
-                "expected": "yacht",
-                "hint": "Try to recognize the whole word"
-            },
-            {
-                "id": 2,
-                "text": "Which spelling is correct?",
-                "interaction": "multiple_choice",
-                "options": ["friend", "frend"],
-                "expected": "friend",
-                "hint": "Think about common spelling patterns"
-            },
-            {
-                "id": 3,
-                "text": "Read this sight word: 'the'",
-                "interaction": "speech_recognition",
-                "expected": "the",
-                "hint": "Say it naturally"
-            },
-            {
-                "id": 4,
-                "text": "Which word is spelled correctly?",
-                "interaction": "multiple_choice",
-                "options": ["knight", "nite"],
-                "expected": "knight",
-                "hint": "Consider standard English spelling"
-            },
-            {
-                "id": 5,
-                "text": "Does this sentence make sense? 'The cat sat on the mat.'",
-                "interaction": "multiple_choice",
-                "options": ["Yes", "No"],
-                "expected": "Yes",
-                "hint": "Think about word meaning in context"
-            }
-        ],
-        "Visual dyslexia": [
-            {
-                "id": 1,
-                "text": "Which letter is different? b d p q",
-                "interaction": "multiple_choice",
-                "options": ["b", "d", "p", "q"],
-                "expected": "q",
-                "hint": "Look carefully at each letter shape"
-            },
-            {
-                "id": 2,
-                "text": "Do these words look the same? 'was' and 'saw'",
-                "interaction": "multiple_choice",
-                "options": ["Yes", "No"],
-                "expected": "No",
-                "hint": "Look at the letter order"
-            },
-            {
-                "id": 3,
-                "text": "Find the matching shapes: circle circle square triangle",
-                "interaction": "multiple_choice",
-                "options": ["1st and 2nd", "2nd and 3rd", "3rd and 4th", "All different"],
-                "expected": "1st and 2nd",
-                "hint": "Look for identical shapes"
-            },
-            {
-                "id": 4,
-                "text": "Which word has no reversed letters?",
-                "interaction": "multiple_choice",
-                "options": ["bog", "dog", "qog", "pog"],
-                "expected": "dog",
-                "hint": "Look for normally oriented letters"
-            },
-            {
-                "id": 5,
-                "text": "Which number looks normal?",
-                "interaction": "multiple_choice",
-                "options": ["2", "5", "Ɛ", "7"],
-                "expected": "7",
-                "hint": "Think about normal number shapes"
-            }
-        ],
-        "Rapid naming deficit": [
-            {
-                "id": 1,
-                "text": "Name these colors: red yellow blue green",
-                "interaction": "speech_recognition",
-                "expected": ["red", "yellow", "blue", "green"],
-                "timed": True,
-                "time_limit": 8,
-                "hint": "Say the color names in order"
-            },
-            {
-                "id": 2,
-                "text": "Say the days of the week starting from Monday",
-                "interaction": "speech_recognition",
-                "expected": "monday tuesday wednesday thursday friday saturday sunday",
-                "timed": True,
-                "time_limit": 10,
-                "hint": "Go as fast as you can while being clear"
-            },
-            {
-                "id": 3,
-                "text": "Name these shapes: star heart diamond club",
-                "interaction": "speech_recognition",
-                "expected": ["star", "heart", "diamond", "club"],
-                "timed": True,
-                "time_limit": 6,
-                "hint": "Say the shape names in order"
-            },
-            {
-                "id": 4,
-                "text": "Count from 1 to 10",
-                "interaction": "speech_recognition",
-                "expected": "one two three four five six seven eight nine ten",
-                "timed": True,
-                "time_limit": 8,
-                "hint": "Say the numbers in order quickly"
-            },
-            {
-                "id": 5,
-                "text": "Name these animals: dog cat mouse rabbit",
-                "interaction": "speech_recognition",
-                "expected": ["dog", "cat", "mouse", "rabbit"],
-                "timed": True,
-                "time_limit": 6,
-                "hint": "Say the animal names rapidly"
-            }
-        ]
-    }
-
-    questions = questions_bank.get(dyslexia_type, [])
+    # Cached, pre-normalised questions (see question_bank.py)
+    questions = question_bank.get_questions(dyslexia_type)
     
     if request.method == "POST":
         # NEW: Process the collected interaction data
@@ -617,7 +453,7 @@ def evaluation_test(request, dyslexia_type):
         # NEW: Collect STT response data for ML training
         stt_responses_data = {}
         
-        # Collect responses and calculate score
+        # Collect responses
         for question in questions:
             q_id = question['id']
             response = request.POST.get(f'q{q_id}', '').strip().lower()
@@ -631,43 +467,15 @@ def evaluation_test(request, dyslexia_type):
                 'processing_time': response_times.get(str(q_id), 0),
                 'used_tts': q_id in tts_usage  # Track if TTS was used for this question
             }
-            
-            # Enhanced scoring logic
-            if response and question.get('expected'):
-                expected = question['expected']
-                
-                # Handle different question types
-                if question.get('timed', False):
-                    # For timed exercises, check if they attempted it
-                    if response and response != 'no_response':
-                        score += 1
-                
-                elif question['id'] == 4 and dyslexia_type == "Rapid naming deficit":
-                    # "Count from 1 to 10" - check if they said most numbers
-                    numbers = ['one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine', 'ten']
-                    said_numbers = [num for num in numbers if num in response]
-                    if len(said_numbers) >= 8:  # At least 8 out of 10 numbers
-                        score += 1
-                
-                elif question['id'] == 2 and dyslexia_type == "Rapid naming deficit":
-                    # "Days of the week" - check if they said most days
-                    days = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
-                    said_days = [day for day in days if day in response]
-                    if len(said_days) >= 5:  # At least 5 out of 7 days
-                        score += 1
-                
-                elif isinstance(expected, list):
-                    # Check if response matches any expected value
-                    if any(exp.lower() in response or response in exp.lower() for exp in expected):
-                        score += 1
-                
-                else:
-                    # Exact match or contains check for speech responses
-                    expected_str = str(expected).lower()
-                    if (response == expected_str or 
-                        expected_str in response or 
-                        response in expected_str):
-                        score += 1
+        
+        # Fluency of the recorded answers (collected by speech_to_text_api)
+        fluency_by_type = request.session.get('speech_fluency', {})
+        recorded = fluency_by_type.pop(dyslexia_type, {})
+        request.session['speech_fluency'] = fluency_by_type
+        speech_fluency_metrics = {q_id: recorded[q_id] for q_id in stt_responses_data if q_id in recorded}
+        
+        # Score all answers in one pass with the precompiled matcher (see scoring.py)
+        score, _ = scoring.score_submission(dyslexia_type, responses)
         
         # NEW: Calculate STT accuracy for ML features
         stt_accuracy = (score / total_questions) * 100 if total_questions > 0 else 0
@@ -681,6 +489,9 @@ def evaluation_test(request, dyslexia_type):
             stt_responses=stt_responses_data,
             stt_accuracy=stt_accuracy,
             response_times=response_times,
+            speech_fluency_metrics=speech_fluency_metrics,
+            # Reversals, omissions, ... in the answers (see error_patterns.py)
+            error_patterns=error_patterns.analyze_evaluation(stt_responses_data, questions),
             completion_time=completion_time,
             score=score,
             total_questions=total_questions,
@@ -704,7 +515,8 @@ def evaluation_test(request, dyslexia_type):
                     pass
         
         # NEW: Save the comprehensive evaluation data
-         # evaluation_data_record.save() #temporary lng muna
+        # Buffered: written in the background with other submissions (evaluation_writer.py)
+        evaluation_writer.submit(evaluation_data_record)
         
         # Store evaluation data in session (original functionality preserved)
         evaluation_data = {
@@ -712,7 +524,7 @@ def evaluation_test(request, dyslexia_type):
             'score': score,
             'total_questions': total_questions,
             'percentage': evaluation_data_record.percentage,
-            'data_id': evaluation_data_record.id  # NEW: Store the data record ID
+            'data_id': str(evaluation_data_record.submission_id)  # NEW: resolves with evaluation_writer.get()
             
         }
         
@@ -736,97 +548,217 @@ def evaluation_test(request, dyslexia_type):
     # For GET requests, store start time for timing the evaluation
     request.session['evaluation_start_time'] = time.time()
     
+    # Server-rendered question audio where it is ready (tts.py)
+    audio = tts.audio_urls([question["text"] for question in questions])
     context = {
         "dyslexia_type": dyslexia_type,
-        "questions": questions,
+        "questions": [dict(question, tts_url=audio.get(question["text"])) for question in questions],
+        # Fallback recogniser for browsers without SpeechRecognition
+        "stt_stream_path": stt_stream.PATH,
     }
-    return render(request, "evaluation/static_evaluation.html", context)
+    return render(request, "Evaluation/static_evaluation.html", context)
 
 
 # Speech recognition API endpoint
+# The upload goes from the buffer Django received it into (speech.py) to the
+# recognition worker pool (stt_pool.py), unless the same audio was recognised
+# before (stt_cache.py). With STT_BACKGROUND it runs as a background job instead
+# (tasks.py); the response then carries the job to poll, or the result
+# straight away when the job already finished.
+@csrf_exempt
 @login_required
 def speech_to_text_api(request):
+    # Upload handlers can only be swapped before the CSRF check reads request.POST
+    request.upload_handlers = speech.upload_handlers(request)
+    return _speech_to_text_api(request)
+
+@csrf_protect
+def _speech_to_text_api(request):
     if request.method == "POST" and request.FILES.get('audio'):
-        recognizer = sr.Recognizer()
         audio_file = request.FILES['audio']
-        
+        if getattr(settings, 'STT_BACKGROUND', False):
+            job = jobs.enqueue("speech_to_text", user=request.user, payload=audio_file.read())
+            return _job_response(job)
         try:
-            # Save temporary audio file
-            with open('temp_audio.wav', 'wb') as f:
-                for chunk in audio_file.chunks():
-                    f.write(chunk)
-            
-            # Convert speech to text
-            with sr.AudioFile('temp_audio.wav') as source:
-                audio_data = recognizer.record(source)
-                text = recognizer.recognize_google(audio_data)
-                
-            return JsonResponse({'success': True, 'text': text})
-            
-        except sr.UnknownValueError:
-            return JsonResponse({'success': False, 'error': 'Could not understand audio'})
+            timings = {}
+            result = speech.transcribe(speech.audio_source(audio_file), user_key=request.user.pk, timings=timings)
+        except stt_pool.Rejected as e:
+            response = JsonResponse({'success': False, 'error': str(e)}, status=e.status)
+            response['Retry-After'] = str(e.retry_after)
+            return response
+        except stt_pool.RecognitionTimeout as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=504)
         except sr.RequestError as e:
-            return JsonResponse({'success': False, 'error': f'Speech recognition error: {e}'})
-        except Exception as e:
-            return JsonResponse({'success': False, 'error': str(e)})
+            return JsonResponse({'success': False, 'error': f'Speech service error: {e}'}, status=502)
+        response = JsonResponse(result)
+        # Per-request preprocessing savings and recognition time, for the browser's dev tools
+        response['Server-Timing'] = speech.server_timing(timings)
+        return response
     
     return JsonResponse({'success': False, 'error': 'Invalid request'})
 
+# Fluency of an evaluation answer (fluency.py). static_evaluation.html records
+# each spoken answer while the browser recognises it and posts the clip here
+# with the question and the browser's transcript; nothing is recognised on
+# the server, so it takes no recognition pool slot. The metrics wait in the
+# session until evaluation_test saves them with the evaluation.
+@csrf_exempt
+@login_required
+def speech_fluency_api(request):
+    request.upload_handlers = speech.upload_handlers(request)
+    return _speech_fluency_api(request)
+
+@csrf_protect
+def _speech_fluency_api(request):
+    dyslexia_type, question_id = request.POST.get('dyslexia_type'), request.POST.get('question_id')
+    if request.method != "POST" or not request.FILES.get('audio') or not (dyslexia_type and question_id):
+        return JsonResponse({'success': False, 'error': 'Invalid request'}, status=400)
+    if not getattr(settings, 'STT_FLUENCY_ENABLED', True):
+        return JsonResponse({'success': False, 'error': 'Fluency analysis is disabled'}, status=404)
+    metrics = fluency.analyze(
+        speech.audio_source(request.FILES['audio']),
+        transcript=request.POST.get('transcript') or None,
+        min_pause_ms=getattr(settings, 'STT_FLUENCY_MIN_PAUSE_MS', 250),
+        margin_db=getattr(settings, 'STT_FLUENCY_MARGIN_DB', 12.0),
+    )
+    if metrics is None:
+        return JsonResponse({'success': False, 'error': 'Unsupported audio format'}, status=400)
+    _store_fluency(request, dyslexia_type, question_id, metrics)
+    return JsonResponse({'success': True, 'metrics': metrics})
+
+def _store_fluency(request, dyslexia_type, question_id, metrics):
+    """Keep an answer's fluency metrics in the session until evaluation_test saves them."""
+    by_type = request.session.get('speech_fluency', {})
+    by_type.setdefault(dyslexia_type, {})[str(question_id)] = metrics
+    request.session['speech_fluency'] = by_type
+
 # NEW: Data export for ANN training
+# Built by a background job; download it from job_result once it's done.
 @login_required
 def export_training_data(request):
     """Export all evaluation data as CSV for ANN model training"""
     if not request.user.is_staff:
         return HttpResponseForbidden("Admin access required")
-    
-    evaluations = EvaluationData.objects.all()
-    
-    data = []
-    for eval in evaluations:
-        row = {
-            'user_id': eval.user.id,
-            'dyslexia_type': eval.dyslexia_type,
-            'age': getattr(eval.user, 'age', None),
-            
-            # TTS Features
-            'tts_usage_count': eval.tts_usage_count,
-            'tts_questions_used_count': len(eval.tts_questions_used),
-            
-            # STT Features
-            'stt_accuracy': eval.stt_accuracy,
-            'total_responses': len(eval.stt_responses),
-            'empty_responses': sum(1 for r in eval.stt_responses.values() if not r.get('response')),
-            
-            # Timing Features
-            'completion_time': eval.completion_time,
-            'avg_response_time': np.mean(list(eval.response_times.values())) if eval.response_times else 0,
-            
-            # Performance Features
-            'score': eval.score,
-            'percentage': eval.percentage,
-            
-            # Derived Features
-            'uses_tts_frequently': 1 if eval.tts_usage_count > 2 else 0,
-            'slow_responder': 1 if eval.completion_time > 300 else 0,  # >5 minutes
-        }
-        
-        # Add question-specific features
-        for q_id, response_data in eval.stt_responses.items():
-            row[f'q{q_id}_response_length'] = len(response_data.get('response', ''))
-            row[f'q{q_id}_processing_time'] = response_data.get('processing_time', 0)
-            row[f'q{q_id}_used_tts'] = 1 if response_data.get('used_tts', False) else 0
-        
-        data.append(row)
-    
-    df = pd.DataFrame(data)
-    
-    # Export to CSV
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="dyslexia_training_data.csv"'
-    df.to_csv(response, index=False)
-    
+    if request.method != "POST":
+        return JsonResponse({'success': False, 'error': 'Invalid request'}, status=405)
+
+    job = jobs.enqueue("export_training_data", user=request.user)
+    return _job_response(job)
+
+# Retrain (or incrementally update) the suggestion model in the background
+@login_required
+def train_model_job(request):
+    if not request.user.is_staff:
+        return HttpResponseForbidden("Admin access required")
+    if request.method != "POST":
+        return JsonResponse({'success': False, 'error': 'Invalid request'}, status=405)
+
+    mode = request.POST.get("mode", "online")
+    if mode not in ("online", "online_full", "forest"):
+        return JsonResponse({'success': False, 'error': f'Unknown mode {mode}'}, status=400)
+    job = jobs.enqueue("train_model", user=request.user, mode=mode)
+    return _job_response(job)
+
+# =========================
+# Job polling
+# =========================
+def _job_response(job):
+    job.refresh_from_db()
+    if job.status == Job.SUCCEEDED and job.name == "speech_to_text":
+        # Same shape as the old synchronous endpoint
+        return JsonResponse({**job.result, 'job_id': str(job.id)})
+    return JsonResponse({
+        'success': True,
+        'job_id': str(job.id),
+        'status': job.status,
+        'status_url': reverse('job_status', args=[job.id]),
+    }, status=200 if job.is_done else 202)
+
+def _get_job(request, job_id):
+    job = get_object_or_404(Job, pk=job_id)
+    if job.user_id != request.user.id and not request.user.is_staff:
+        return None
+    return job
+
+@login_required
+def job_status(request, job_id):
+    job = _get_job(request, job_id)
+    if job is None:
+        return HttpResponseForbidden("Not your job")
+    data = job.as_dict()
+    if job.status == Job.SUCCEEDED and (job.result or {}).get("file"):
+        data["result_url"] = reverse('job_result', args=[job.id])
+    return JsonResponse(data)
+
+@login_required
+def job_result(request, job_id):
+    job = _get_job(request, job_id)
+    if job is None:
+        return HttpResponseForbidden("Not your job")
+    if job.status != Job.SUCCEEDED or not (job.result or {}).get("file"):
+        return JsonResponse({'success': False, 'error': 'No file for this job', 'status': job.status}, status=404)
+    path = os.path.join(settings.JOBS_RESULT_DIR, job.result["file"])
+    return FileResponse(open(path, "rb"), as_attachment=True,
+                        filename=job.result.get("filename", job.result["file"]))
+
+@login_required
+def job_stats(request):
+    if not request.user.is_staff:
+        return HttpResponseForbidden("Admin access required")
+    return JsonResponse(jobs.stats())
+
+# Write-behind buffer of evaluation submissions in this worker
+@login_required
+def evaluation_writer_status(request):
+    if not request.user.is_staff:
+        return HttpResponseForbidden("Admin access required")
+    return JsonResponse(evaluation_writer.writer.stats())
+
+# Speech recognition pool load and latency for this worker
+@login_required
+def stt_status(request):
+    if not request.user.is_staff:
+        return HttpResponseForbidden("Admin access required")
+    return JsonResponse({
+        **stt_pool.get_pool().stats(),
+        "cache": stt_cache.stats(),
+        "stream": stt_stream.stats(),
+        "preprocessing": audio_preprocess.stats(),
+    })
+
+# Rendered text to speech audio (tts.py). The URL names the content, so the
+# file never changes: browsers keep it for a year and revalidate by ETag
+@login_required
+@etag(lambda request, key, extension: key)
+def tts_audio(request, key, extension):
+    synthesizer = tts.get_synthesizer()
+    if extension != synthesizer.extension:
+        return JsonResponse({'error': 'Unknown audio format'}, status=404)
+    try:
+        f = open(tts.path(key, extension), "rb")
+    except FileNotFoundError:
+        return JsonResponse({'error': 'Audio not rendered'}, status=404)
+    response = FileResponse(f, content_type=synthesizer.content_type)
+    patch_cache_control(response, private=True, max_age=365 * 24 * 60 * 60, immutable=True)
     return response
 
+@login_required
+def tts_status(request):
+    if not request.user.is_staff:
+        return HttpResponseForbidden("Admin access required")
+    return JsonResponse(tts.stats())
+
+# ML model load-time / memory metrics for this worker
+@login_required
+def ml_model_status(request):
+    if not request.user.is_staff:
+        return HttpResponseForbidden("Admin access required")
+    return JsonResponse({
+        **ml_registry.stats(),
+        "broker": prediction_broker.stats(),
+        "suggestion_cache": suggestion_cache.stats(),
+    })
+
 # Evaluation results page (placeholder for Gemma integration)
 @login_required
 def evaluation_results(request, child_id):
@@ -851,6 +783,7 @@ def evaluation_results(request, child_id):
     context = {
         'child_profile': child_profile,
         'evaluation_data': evaluation_data,
+        'evaluation': evaluation_writer.get(evaluation_data.get('data_id')),
         'severity': severity,
         'percentage': percentage,
         'dyslexia_type': evaluation_data.get('dyslexia_type', 'Unknown')
@@ -2,6 +2,8 @@
 ASGI config for config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP goes to Django; the streaming speech to text WebSocket
+(accounts/stt_stream.py) is served next to it, e.g. `uvicorn config.asgi:application`.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -13,4 +15,22 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Needs the app registry, so imported after Django is set up
+from accounts import stt_stream  # noqa: E402
+
+websocket_routes = {
+    stt_stream.PATH: stt_stream.application,
+}
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "websocket":
+        handler = websocket_routes.get(scope["path"])
+        if handler is None:
+            await receive()  # websocket.connect
+            await send({"type": "websocket.close", "code": 4404})
+            return
+        return await handler(scope, receive, send)
+    return await django_application(scope, receive, send)
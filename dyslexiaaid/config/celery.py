@@ -0,0 +1,24 @@
+"""
+Celery app for background jobs when JOBS_BROKER = "celery".
+
+    celery -A config worker -l info
+
+Every job goes through the single run_job task; the task definitions,
+retries and timing live in accounts/jobs.py, the same for every broker.
+"""
+import os
+
+from celery import Celery
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+app = Celery("config")
+app.config_from_object("django.conf:settings", namespace="CELERY")
+
+
+@app.task(name="accounts.run_job", ignore_result=True)
+def run_job_task(job_id):
+    # Celery's Django fixup has set Django up by the time a task runs
+    from accounts.jobs import run_job
+
+    run_job(job_id)
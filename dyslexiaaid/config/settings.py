@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -87,6 +88,40 @@ DATABASES = {
 }
 
 
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Per-child ML suggestions (accounts.suggestion_cache). LocMemCache evicts
+    # least recently used keys; CULL_FREQUENCY == MAX_ENTRIES drops exactly
+    # one entry at a time. It is per process, so the signals only invalidate
+    # the worker that saved the row; the TTL bounds how long the others serve
+    # a stale suggestion. Use a shared backend (Redis/Memcached) to drop it.
+    'ml_suggestions': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ml-suggestions',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+            'CULL_FREQUENCY': 5000,
+        },
+    },
+    # Speech recognition results by audio fingerprint (accounts.stt_cache)
+    'stt_results': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'stt-results',
+        'TIMEOUT': 24 * 60 * 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 2000,
+            'CULL_FREQUENCY': 2000,
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -128,3 +163,134 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# ML model
+# Loaded lazily by accounts.ml_registry on the first prediction.
+
+ML_MODEL_PATH = BASE_DIR / "ml" / "dyslexia_model.pkl"
+
+# Flat-array export of the same forest (written by ml/train_model.py). When it
+# exists it is memory mapped read-only, so all workers share one copy of it.
+ML_MODEL_ARRAYS_PATH = BASE_DIR / "ml" / "dyslexia_model.forest"
+ML_MODEL_MMAP = True
+
+# Depth-capped, pruned copy with float32 thresholds and uint8 leaf
+# distributions (ml/compress_model.py). Served first when it exists; set
+# ML_MODEL_COMPACT = False to serve the full forest.
+ML_MODEL_COMPACT_PATH = BASE_DIR / "ml" / "dyslexia_model.compact.forest"
+ML_MODEL_COMPACT = True
+
+# Incrementally trained model over EvaluationData (accounts/online_training.py,
+# `manage.py update_model`). Published atomically to this path and served
+# first when it exists and ML_MODEL_ONLINE is on. Every
+# ML_ONLINE_FULL_RETRAIN_EVERY updates it is retrained from scratch instead,
+# to check the incremental model hasn't drifted.
+ML_ONLINE_MODEL_PATH = BASE_DIR / "ml" / "dyslexia_model.online.pkl"
+ML_MODEL_ONLINE = True
+ML_ONLINE_BATCH_SIZE = 500
+ML_ONLINE_FULL_RETRAIN_EVERY = 50
+
+# Convert a pickled forest into flat arrays on load (same predictions, much
+# lower latency for the single-row calls the dashboard makes).
+ML_MODEL_COMPILE = True
+
+# Micro-batching of concurrent dashboard predictions (accounts.prediction_broker).
+# Only worth it with threaded workers (gunicorn gthread); sync workers would
+# just pay the window on every request.
+ML_BATCH_ENABLED = False
+ML_BATCH_MAX_SIZE = 32
+ML_BATCH_WINDOW_MS = 5
+ML_BATCH_TIMEOUT_MS = 500
+
+# Load the model in the gunicorn master (run with --preload) so forked workers
+# share its pages copy-on-write.
+ML_MODEL_PRELOAD = os.environ.get("ML_MODEL_PRELOAD", "") == "1"
+
+# Seconds between checks of the artifact's mtime (None disables reloading).
+ML_MODEL_CHECK_INTERVAL = 5
+
+# Hash the artifact when its mtime changes and only reload on a content change.
+ML_MODEL_VERIFY_HASH = False
+
+# Background jobs (accounts/jobs.py): "local" runs them in a thread pool of
+# the web process with the Job table as the queue (`manage.py run_jobs` drains
+# leftovers), "celery" sends them to `celery -A config worker`, "eager" runs
+# them inline (tests).
+JOBS_BROKER = os.environ.get("JOBS_BROKER", "local")
+JOBS_LOCAL_WORKERS = 2
+# A RUNNING job older than this is taken to have lost its worker and is
+# re-queued by `manage.py run_jobs`; keep it above the longest task's run time.
+JOBS_LEASE_SECONDS = 3600
+JOBS_RESULT_DIR = BASE_DIR / "job_results"
+
+CELERY_BROKER_URL = os.environ.get("CELERY_BROKER_URL", "redis://localhost:6379/0")
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
+# Seconds between checks of the evaluation question table for edits made by
+# other processes (accounts/question_bank.py; None: only this process' edits).
+QUESTION_BANK_CHECK_INTERVAL = 5
+
+# Evaluation submissions are written in the background in batches
+# (accounts/evaluation_writer.py): a flush happens when BATCH_SIZE records are
+# waiting or the oldest has waited FLUSH_MS. A full buffer falls back to a
+# direct save.
+EVALUATION_WRITE_BEHIND = True
+EVALUATION_WRITER_BATCH_SIZE = 50
+EVALUATION_WRITER_FLUSH_MS = 1000
+EVALUATION_WRITER_MAX_QUEUE = 5000
+
+# Speech to text (accounts/speech.py): uploads up to STT_MEMORY_MAX_BYTES are
+# recognised from memory, larger ones from a per-request temporary file.
+# STT_BACKGROUND runs recognition as a job and the client polls for the text.
+STT_MEMORY_MAX_BYTES = 5 * 1024 * 1024
+STT_BACKGROUND = False
+
+# Recognition engine (accounts/stt_backends.py: "google", "sphinx", "stub")
+# and the worker pool it runs in (accounts/stt_pool.py). Requests beyond
+# STT_MAX_PER_USER per user get 429, beyond STT_WORKERS + STT_MAX_QUEUE in
+# total 503; STT_WORKERS = 0 recognises in the web worker itself.
+STT_BACKEND = os.environ.get("STT_BACKEND", "google")
+STT_BACKEND_OPTIONS = {"language": "en-US"}
+STT_WORKERS = 2
+STT_MAX_QUEUE = 8
+STT_MAX_PER_USER = 2
+STT_TIMEOUT = 15.0
+STT_POOL_START_METHOD = "spawn"
+
+# Downmix, resample and trim silence before recognition
+# (accounts/audio_preprocess.py): frames STT_TRIM_THRESHOLD_DB below the
+# loudest one count as silence, STT_TRIM_PAD_MS of it is kept around speech.
+STT_PREPROCESS = True
+STT_TRIM_THRESHOLD_DB = -35.0
+STT_TRIM_PAD_MS = 150
+
+# Fluency metrics of recorded evaluation answers (accounts/fluency.py): frames
+# STT_FLUENCY_MARGIN_DB above the background are voiced, silences of at least
+# STT_FLUENCY_MIN_PAUSE_MS between them are pauses.
+STT_FLUENCY_ENABLED = True
+STT_FLUENCY_MIN_PAUSE_MS = 250
+STT_FLUENCY_MARGIN_DB = 12.0
+
+# Cache recognition results by audio content (accounts/stt_cache.py); bump
+# STT_CACHE_VERSION to drop every stored result.
+STT_CACHE_ENABLED = True
+STT_CACHE_VERSION = 1
+
+# Streaming recognition over a WebSocket (accounts/stt_stream.py): a partial
+# transcript every STT_STREAM_PARTIAL_SECONDS of new audio, clips cut off at
+# STT_STREAM_MAX_SECONDS.
+STT_STREAM_PARTIAL_SECONDS = 0.5
+STT_STREAM_MAX_SECONDS = 60
+
+# Text to speech (accounts/tts.py): lesson and question texts are rendered by
+# TTS_SYNTHESIZER ("gtts", or "stub" offline) into content-addressed files
+# under TTS_ROOT (kept out of git; point it at persistent storage in
+# production). Bump TTS_CACHE_VERSION to render everything again.
+TTS_ENABLED = True
+TTS_SYNTHESIZER = os.environ.get("TTS_SYNTHESIZER", "gtts")
+TTS_SYNTHESIZER_OPTIONS = {"lang": "en", "tld": "com"}
+TTS_RATE = "normal"  # or "slow"
+TTS_ROOT = Path(os.environ.get("TTS_ROOT", BASE_DIR / "tts_audio"))
+TTS_CACHE_VERSION = 1
@@ -14,3 +14,12 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+# With gunicorn --preload this runs once in the master, before the fork.
+from django.conf import settings
+
+if settings.ML_MODEL_PRELOAD:
+    from accounts.ml_registry import registry
+
+    registry.preload()
+
@@ -7,6 +7,7 @@ import json
 
 from .models import Lesson, Attempt, Module
 from accounts.models import ChildProfile 
+from accounts import tts
 
 
 
@@ -52,9 +53,15 @@ def lesson_detail(request, pk):
     if getattr(request.user, "role", None) == "PARENT":
         return HttpResponseForbidden("Parents cannot take lessons.")
 
+    # Server-rendered audio (accounts/tts.py); None until rendered, the page
+    # then uses the browser's voice
+    audio = tts.audio_urls([lesson.content_text, lesson.prompt])
+
     return render(request, "lessons/lesson_detail.html", {
         "lesson": lesson,
         "title": lesson.title,
+        "content_audio_url": audio.get(lesson.content_text),
+        "prompt_audio_url": audio.get(lesson.prompt),
     })
 
 
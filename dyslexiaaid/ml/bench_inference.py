@@ -0,0 +1,63 @@
+# ml/bench_inference.py
+"""
+Prediction latency of the sklearn forest vs the flat-array engine.
+
+Reports p50/p99 per call for single rows (what child_dashboard does) and a
+few small batch sizes, and checks that both return the same labels.
+
+Run from dyslexiaaid/:
+    python -m ml.bench_inference --repeats 2000
+"""
+import argparse
+import time
+import warnings
+
+import joblib
+import numpy as np
+
+from ml.forest_arrays import ArrayForest
+
+MODEL_PATH = "ml/dyslexia_model.pkl"
+
+
+def _latencies(predict, rows, repeats):
+    samples = np.empty(repeats)
+    for i in range(repeats):
+        batch = rows[i % len(rows)]
+        started = time.perf_counter()
+        predict(batch)
+        samples[i] = time.perf_counter() - started
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeats", type=int, default=2000)
+    parser.add_argument("--batch-sizes", default="1,8,32,128")
+    args = parser.parse_args()
+
+    # sklearn warns about missing feature names on every numpy call
+    warnings.simplefilter("ignore", UserWarning)
+
+    model = joblib.load(MODEL_PATH)
+    compiled = ArrayForest.from_model(model)
+    rng = np.random.default_rng(0)
+    scale = np.array([300, 600, 300, 50])
+
+    print(f"{'batch':>5} {'engine':<8} {'p50 (µs)':>10} {'p99 (µs)':>10}")
+    for size in map(int, args.batch_sizes.split(",")):
+        batches = [rng.uniform(0, 1, (size, model.n_features_in_)) * scale for _ in range(64)]
+        for batch in batches:
+            if not (model.predict(batch) == compiled.predict(batch)).all():
+                raise SystemExit("❌ flat-array predictions differ from sklearn")
+        # sklearn is slow enough that fewer repeats give stable percentiles
+        for name, predict, repeats in (
+            ("sklearn", model.predict, max(args.repeats // 10, 50)),
+            ("compiled", compiled.predict, args.repeats),
+        ):
+            samples = _latencies(predict, batches, repeats) * 1e6
+            print(f"{size:>5} {name:<8} {np.percentile(samples, 50):>10.0f} {np.percentile(samples, 99):>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
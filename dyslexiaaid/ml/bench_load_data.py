@@ -0,0 +1,105 @@
+# ml/bench_load_data.py
+"""
+Wall time and peak memory of ml.train_model.load_data against the old loader.
+
+Each loader runs in a fresh interpreter so peak RSS is not polluted by the
+previous run; the pool variant also reports the largest worker's peak.
+Runs on the bundled CSVs and on a synthetic copy with every file repeated
+--scale times (hard links, so it takes no extra disk space).
+
+Run from dyslexiaaid/ (Unix only, uses the resource module):
+    python -m ml.bench_load_data --scale 100
+"""
+import argparse
+import glob
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from ml.train_model import DATA_PATH, list_data_files, load_data
+
+VARIANTS = ["legacy", "serial", "pool"]
+
+
+def legacy_load_data(data_path):
+    """load_data() as it was: every column, inferred dtypes, then concat."""
+    files = glob.glob(os.path.join(data_path, "*_metrics.csv"))
+    dfs = [pd.read_csv(f) for f in files]
+    df = pd.concat(dfs, ignore_index=True)
+    labels = ["Phonological", "Surface", "Visual", "Rapid Naming"] * (len(df) // 4 + 1)
+    df["label"] = labels[:len(df)]
+    return df
+
+
+def _run_variant(variant, data_path):
+    started = time.perf_counter()
+    if variant == "legacy":
+        df = legacy_load_data(data_path)
+    else:
+        df, _ = load_data(data_path, workers=1 if variant == "serial" else None)
+    elapsed = time.perf_counter() - started
+    # ru_maxrss is in KiB on Linux
+    print(json.dumps({
+        "rows": len(df),
+        "seconds": elapsed,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "worker_peak_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+        "frame_mb": df.memory_usage(deep=True).sum() / 1024 / 1024,
+    }))
+
+
+def _make_synthetic(scale):
+    target = tempfile.mkdtemp(prefix="dyslexia_bench_")
+    for path in list_data_files(DATA_PATH):
+        name = os.path.basename(path)
+        for i in range(scale):
+            copy = os.path.join(target, f"x{i:03d}_{name}")
+            try:
+                os.link(path, copy)
+            except OSError:
+                shutil.copyfile(path, copy)
+    return target
+
+
+def _measure(variant, data_path):
+    out = subprocess.run(
+        [sys.executable, "-m", "ml.bench_load_data", "--run", variant, data_path],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scale", type=int, default=100)
+    parser.add_argument("--run", nargs=2, metavar=("VARIANT", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        _run_variant(*args.run)
+        return
+
+    synthetic = _make_synthetic(args.scale)
+    try:
+        print(f"{os.cpu_count()} CPUs")
+        print(f"{'dataset':<10} {'loader':<7} {'rows':>10} {'seconds':>8} {'peak RSS':>10} {'worker peak':>12} {'frame':>9}")
+        for label, path in (("bundled", DATA_PATH), (f"x{args.scale}", synthetic)):
+            for variant in VARIANTS:
+                r = _measure(variant, path)
+                print(
+                    f"{label:<10} {variant:<7} {r['rows']:>10} {r['seconds']:>8.2f} "
+                    f"{r['peak_rss_mb']:>8.0f}MB {r['worker_peak_rss_mb']:>10.0f}MB {r['frame_mb']:>7.1f}MB"
+                )
+    finally:
+        shutil.rmtree(synthetic, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
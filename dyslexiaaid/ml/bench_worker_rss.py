@@ -0,0 +1,103 @@
+# ml/bench_worker_rss.py
+"""
+Per-worker memory of the different ways of serving the forest.
+
+Forks N workers the way gunicorn does and reports each worker's RSS, USS
+(pages only that worker owns) and PSS (shared pages split between workers):
+
+    pickle   every worker unpickles ml/dyslexia_model.pkl (the old behaviour)
+    mmap     every worker memory maps the flat-array forest read-only
+    preload  the master unpickles once before forking (gunicorn --preload)
+
+Run from dyslexiaaid/ on Linux:
+    python -m ml.bench_worker_rss --workers 4
+"""
+import argparse
+import gc
+import json
+import os
+import tempfile
+
+import joblib
+import numpy as np
+import psutil
+
+from ml.forest_arrays import export_forest, load_forest, save_forest
+
+MODEL_PATH = "ml/dyslexia_model.pkl"
+FOREST_PATH = "ml/dyslexia_model.forest"
+
+MB = 1024 * 1024
+
+
+def _sample_rows(n_features, n=256):
+    rng = np.random.default_rng(0)
+    return rng.uniform(0, 500, size=(n, n_features))
+
+
+def _worker(write_fd, load, preloaded):
+    model = preloaded if preloaded is not None else load()
+    # Predict so the pages the model needs are actually touched.
+    model.predict(_sample_rows(model.n_features_in_))
+    info = psutil.Process().memory_full_info()
+    os.write(write_fd, json.dumps({"rss": info.rss, "uss": info.uss, "pss": info.pss}).encode())
+    os.close(write_fd)
+    os._exit(0)
+
+
+def run_mode(mode, workers, forest_path):
+    preloaded = None
+    if mode == "pickle":
+        load = lambda: joblib.load(MODEL_PATH)  # noqa: E731
+    elif mode == "mmap":
+        load = lambda: load_forest(forest_path, mmap_mode="r")  # noqa: E731
+    else:
+        load = None
+        preloaded = joblib.load(MODEL_PATH)
+        gc.freeze()
+
+    children = []
+    for _ in range(workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            _worker(write_fd, load, preloaded)
+        os.close(write_fd)
+        children.append((pid, read_fd))
+
+    results = []
+    for pid, read_fd in children:
+        with os.fdopen(read_fd, "rb") as f:
+            results.append(json.loads(f.read()))
+        os.waitpid(pid, 0)
+
+    if preloaded is not None:
+        gc.unfreeze()
+        del preloaded
+        gc.collect()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--modes", default="pickle,mmap,preload")
+    args = parser.parse_args()
+
+    forest_path = FOREST_PATH
+    if not os.path.exists(forest_path):
+        forest_path = os.path.join(tempfile.mkdtemp(), "dyslexia_model.forest")
+        save_forest(export_forest(joblib.load(MODEL_PATH)), forest_path)
+
+    print(f"{args.workers} workers, model artifact {os.path.getsize(MODEL_PATH) / MB:.1f} MB")
+    print(f"{'mode':<8} {'RSS/worker':>11} {'USS/worker':>11} {'PSS/worker':>11} {'PSS total':>10}")
+    for mode in args.modes.split(","):
+        results = run_mode(mode, args.workers, forest_path)
+        mean = lambda key: sum(r[key] for r in results) / len(results) / MB  # noqa: E731
+        total_pss = sum(r["pss"] for r in results) / MB
+        print(f"{mode:<8} {mean('rss'):>9.1f}MB {mean('uss'):>9.1f}MB {mean('pss'):>9.1f}MB {total_pss:>8.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+# ml/compress_model.py
+"""
+Compact flat-array artifact for low-memory serving.
+
+Starting from the flat arrays of ml/forest_arrays.py:
+
+    * keep only the first --trees trees (forest trees are independent draws,
+      so a prefix is an unbiased smaller forest)
+    * cut every tree at --max-depth; a cut node becomes a leaf that predicts
+      the class distribution of the samples that reached it
+    * drop the nodes that became unreachable and renumber the rest, storing
+      node ids and feature ids in the narrowest unsigned dtype that fits
+    * store thresholds as float32, rounded down so ``float32(x) <= t`` makes
+      exactly the same decision as against the float64 threshold
+    * store leaf distributions as uint8 (fractions x 255)
+
+The result is re-scored on the held-out split. It is only written if its
+accuracy is within --tolerance of the full model, and a before/after report
+of artifact size, load time and predict latency is printed (and returned).
+When it isn't written, a compact artifact left from an earlier model is
+deleted: the web workers serve the compact file first, and it would outrank
+the newer model.
+
+Run from dyslexiaaid/:
+    python -m ml.compress_model --max-depth 8 --trees 25
+"""
+import argparse
+import os
+import time
+from collections import deque
+
+import joblib
+import numpy as np
+
+from ml.forest_arrays import FORMAT_VERSION, ArrayForest, export_forest, load_forest, save_forest
+
+# Default of settings.ML_MODEL_COMPACT_PATH, independent of the working directory
+COMPACT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dyslexia_model.compact.forest")
+VALUE_SCALE = 255
+
+
+def _index_dtype(n):
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if n <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def _floor_float32(threshold):
+    """Largest float32 <= each float64 threshold."""
+    t32 = threshold.astype(np.float32)
+    too_big = t32.astype(np.float64) > threshold
+    t32[too_big] = np.nextafter(t32[too_big], np.float32(-np.inf))
+    return t32
+
+
+def compress_forest(arrays, max_depth=None, n_trees=None):
+    """Return a compact copy of exported forest arrays."""
+    offsets = arrays["tree_offsets"]
+    left, right = arrays["left"], arrays["right"]
+    n_trees = min(n_trees or len(offsets) - 1, len(offsets) - 1)
+
+    kept, new_left, new_right, new_offsets = [], [], [], [0]
+    for root in offsets[:n_trees]:
+        # Breadth-first renumbering of the nodes that survive the depth cap.
+        first = len(kept)
+        ids = {int(root): first}
+        queue = deque([(int(root), 0)])
+        order = []
+        while queue:
+            node, depth = queue.popleft()
+            order.append((node, depth))
+            is_leaf = left[node] == node or (max_depth is not None and depth >= max_depth)
+            if not is_leaf:
+                for child in (int(left[node]), int(right[node])):
+                    ids[child] = first + len(ids)
+                    queue.append((child, depth + 1))
+        for node, depth in order:
+            new_id = ids[node]
+            kept.append(node)
+            is_leaf = left[node] == node or (max_depth is not None and depth >= max_depth)
+            new_left.append(new_id if is_leaf else ids[int(left[node])])
+            new_right.append(new_id if is_leaf else ids[int(right[node])])
+        new_offsets.append(len(kept))
+
+    kept = np.asarray(kept, dtype=np.int64)
+    node_dtype = _index_dtype(len(kept))
+    new_left = np.asarray(new_left, dtype=node_dtype)
+    is_leaf = new_left == np.arange(len(kept))
+
+    feature = arrays["feature"][kept].copy()
+    feature[is_leaf] = 0
+    threshold = _floor_float32(arrays["threshold"][kept])
+
+    value = np.zeros((len(kept), arrays["value"].shape[1]), dtype=np.uint8)
+    value[is_leaf] = np.rint(arrays["value"][kept][is_leaf] * VALUE_SCALE).astype(np.uint8)
+
+    depths = max_depth if max_depth is not None else int(arrays["max_depth"])
+    return {
+        "format": np.int64(FORMAT_VERSION),
+        "classes": arrays["classes"],
+        "n_features": arrays["n_features"],
+        "max_depth": np.int64(min(depths, int(arrays["max_depth"]))),
+        "tree_offsets": np.asarray(new_offsets, dtype=np.int64),
+        "feature": feature.astype(_index_dtype(int(arrays["n_features"]))),
+        "threshold": threshold,
+        "left": new_left,
+        "right": np.asarray(new_right, dtype=node_dtype),
+        "value": value,
+        "value_scale": np.float64(VALUE_SCALE),
+    }
+
+
+def _artifact_report(path, X_test, y_test, loader, repeats=500):
+    started = time.perf_counter()
+    model = loader(path)
+    load_seconds = time.perf_counter() - started
+
+    samples = np.empty(repeats)
+    for i in range(repeats):
+        row = X_test[i % len(X_test)][None, :]
+        started = time.perf_counter()
+        model.predict(row)
+        samples[i] = time.perf_counter() - started
+    predictions = model.predict(X_test)
+    return {
+        "size_kb": os.path.getsize(path) / 1024,
+        "load_ms": load_seconds * 1000,
+        "p50_us": np.percentile(samples, 50) * 1e6,
+        "p99_us": np.percentile(samples, 99) * 1e6,
+        "accuracy": float(np.mean(predictions == np.asarray(y_test))),
+    }, predictions
+
+
+def compress_model(model, X_test, y_test, path=COMPACT_PATH, max_depth=8, n_trees=25, tolerance=0.02,
+                   pickle_path=None):
+    """Compress a fitted forest, verify it on the held-out split and write it to ``path``.
+
+    Returns the report; ``report["written"]`` is False when accuracy dropped
+    more than ``tolerance`` (and any older file at ``path`` is then removed).
+    """
+    X_test = np.asarray(X_test, dtype=np.float32)
+    arrays = export_forest(model)
+    compact = compress_forest(arrays, max_depth=max_depth, n_trees=n_trees)
+
+    tmp = path + ".tmp"
+    save_forest(compact, tmp)
+    if pickle_path is None:
+        pickle_path = path + ".full.tmp"
+        joblib.dump(model, pickle_path)
+        cleanup = [pickle_path]
+    else:
+        cleanup = []
+
+    try:
+        before, full_predictions = _artifact_report(
+            pickle_path, X_test, y_test, lambda p: ArrayForest.from_model(joblib.load(p))
+        )
+        after, compact_predictions = _artifact_report(tmp, X_test, y_test, load_forest)
+    finally:
+        for leftover in cleanup:
+            os.remove(leftover)
+
+    report = {
+        "max_depth": max_depth,
+        "n_trees": n_trees,
+        "nodes_before": int(arrays["tree_offsets"][-1]),
+        "nodes_after": int(compact["tree_offsets"][-1]),
+        "before": before,
+        "after": after,
+        "agreement": float(np.mean(full_predictions == compact_predictions)),
+        "written": after["accuracy"] >= before["accuracy"] - tolerance,
+    }
+    if report["written"]:
+        os.replace(tmp, path)
+    else:
+        os.remove(tmp)
+        remove_compact(path)
+    return report
+
+
+def remove_compact(path=COMPACT_PATH):
+    """Delete a compact artifact that no longer matches the full model."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def print_report(report, path=COMPACT_PATH):
+    b, a = report["before"], report["after"]
+    print(f"Compressed to {report['n_trees']} trees, depth <= {report['max_depth']}: "
+          f"{report['nodes_before']} -> {report['nodes_after']} nodes")
+    print(f"{'':<9} {'size KB':>8} {'load ms':>8} {'p50 µs':>7} {'p99 µs':>7} {'accuracy':>8}")
+    for name, r in (("full", b), ("compact", a)):
+        print(f"{name:<9} {r['size_kb']:>8.0f} {r['load_ms']:>8.1f} {r['p50_us']:>7.0f} {r['p99_us']:>7.0f} "
+              f"{r['accuracy']:>8.3f}")
+    print(f"Prediction agreement with the full model: {report['agreement']:.1%}")
+    if report["written"]:
+        print(f"✅ Compact model saved to {path}")
+    else:
+        print("⚠️ Compact model lost too much accuracy, not saved (any older one was removed)")
+
+
+def main():
+    from sklearn.model_selection import train_test_split
+
+    from ml.train_model import MODEL_PATH, load_training_set
+
+    parser = argparse.ArgumentParser(description="Write a compact copy of the trained forest")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--output", default=COMPACT_PATH)
+    parser.add_argument("--max-depth", type=int, default=8)
+    parser.add_argument("--trees", type=int, default=25)
+    parser.add_argument("--tolerance", type=float, default=0.02)
+    args = parser.parse_args()
+
+    # Same held-out split as train_model()
+    X, y = load_training_set()
+    _, X_test, _, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    report = compress_model(joblib.load(args.model), X_test, y_test, path=args.output,
+                            max_depth=args.max_depth, n_trees=args.trees, tolerance=args.tolerance,
+                            pickle_path=args.model)
+    print_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+# ml/feature_cache.py
+"""
+On-disk cache of the trial-level training matrix.
+
+Parsing every metrics CSV on every training run is wasted work when only a
+new subject was added. The cache keeps
+
+    features.f32     raw float32 matrix, one row per trial (memory mapped)
+    manifest.json    feature names, matrix shape, and for every source CSV its
+                     sha256, size, mtime and the rows it produced
+
+Rows are always in sorted file name order, the order load_data() reads the
+CSVs in, so labels given by position (placeholder_labels) don't depend on
+the cache's history. On refresh only new or changed CSVs are parsed. New
+files that sort after every cached one are appended to the matrix in place;
+otherwise (a file added in between, changed or gone) the matrix is
+rewritten, copying the rows of unchanged files from the old one. A manifest
+whose matrix is missing or short is ignored and everything is parsed again.
+
+Usage (from dyslexiaaid/):
+    python -m ml.feature_cache [--rebuild]
+"""
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from ml.features import collapse_trials
+from ml.train_model import BASE_DIR, COLUMNS, DATA_PATH, FEATURES, list_data_files, read_metrics_csv
+
+CACHE_DIR = os.path.join(BASE_DIR, "ml", "cache")
+MATRIX_NAME = "features.f32"
+MANIFEST_NAME = "manifest.json"
+DTYPE = np.float32
+CACHE_VERSION = 1
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_trials(path, features=FEATURES):
+    """Trial-level feature rows of one CSV as a float32 array."""
+    df = pd.DataFrame(read_metrics_csv(path, COLUMNS))
+    trials, _ = collapse_trials(df)
+    return trials[features].to_numpy(dtype=DTYPE)
+
+
+class FeatureCache:
+    def __init__(self, cache_dir=CACHE_DIR, data_path=DATA_PATH, features=FEATURES):
+        self.cache_dir = cache_dir
+        self.data_path = data_path
+        self.features = list(features)
+        self.matrix_path = os.path.join(cache_dir, MATRIX_NAME)
+        self.manifest_path = os.path.join(cache_dir, MANIFEST_NAME)
+
+    # -------------------------------------------------------------------------
+
+    def _empty_manifest(self):
+        return {"version": CACHE_VERSION, "features": self.features, "rows": 0, "files": {}}
+
+    def load_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return self._empty_manifest()
+        if manifest.get("version") != CACHE_VERSION or manifest.get("features") != self.features:
+            return self._empty_manifest()
+        return manifest
+
+    def _write_manifest(self, manifest):
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
+
+    def open_matrix(self, manifest=None):
+        """The cached matrix as a read-only memmap (no copy)."""
+        manifest = manifest or self.load_manifest()
+        if manifest["rows"] == 0:
+            return np.empty((0, len(self.features)), dtype=DTYPE)
+        return np.memmap(self.matrix_path, dtype=DTYPE, mode="r",
+                         shape=(manifest["rows"], len(self.features)))
+
+    # -------------------------------------------------------------------------
+
+    def _scan(self, manifest):
+        """Split the source CSVs into unchanged and to-parse, with fresh file info."""
+        unchanged, to_parse, infos = [], [], {}
+        for path in list_data_files(self.data_path):
+            name = os.path.basename(path)
+            stat = os.stat(path)
+            known = manifest["files"].get(name)
+            info = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            if known and known["size"] == info["size"] and known["mtime_ns"] == info["mtime_ns"]:
+                info["sha256"] = known["sha256"]
+            else:
+                info["sha256"] = file_digest(path)
+            infos[name] = info
+            if known and known["sha256"] == info["sha256"]:
+                unchanged.append(name)
+            else:
+                to_parse.append(name)
+        return unchanged, to_parse, infos
+
+    def _parse(self, names, workers):
+        paths = [os.path.join(self.data_path, name) for name in names]
+        parse = partial(file_trials, features=self.features)
+        workers = workers or os.cpu_count() or 1
+        if workers == 1 or len(paths) < 2:
+            return list(map(parse, paths))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(parse, paths, chunksize=max(len(paths) // (4 * workers), 1)))
+
+    def _matrix_intact(self, manifest, row_bytes):
+        try:
+            return os.path.getsize(self.matrix_path) >= manifest["rows"] * row_bytes
+        except OSError:
+            return manifest["rows"] == 0
+
+    def refresh(self, rebuild=False, workers=None):
+        """Bring the cache up to date with the CSVs; returns a small report."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        row_bytes = len(self.features) * np.dtype(DTYPE).itemsize
+        manifest = self._empty_manifest() if rebuild else self.load_manifest()
+        if not self._matrix_intact(manifest, row_bytes):
+            # The matrix was deleted or cut short: the manifest is worthless
+            manifest = self._empty_manifest()
+        unchanged, to_parse, infos = self._scan(manifest)
+        removed = set(manifest["files"]) - set(infos)
+        changed = [name for name in to_parse if name in manifest["files"]]
+        parsed = dict(zip(to_parse, self._parse(to_parse, workers)))
+
+        # Appending keeps the sorted order only if the new files sort last
+        append_only = not removed and not changed and (
+            not unchanged or not to_parse or max(unchanged) < min(to_parse)
+        )
+        if append_only:
+            # New files go to the end of the existing matrix.
+            start = manifest["rows"]
+            with open(self.matrix_path, "r+b" if start else "wb") as f:
+                # Drop anything a crashed run appended without a manifest.
+                f.truncate(start * row_bytes)
+                f.seek(start * row_bytes)
+                for name in sorted(to_parse):
+                    rows = parsed[name]
+                    f.write(np.ascontiguousarray(rows, dtype=DTYPE).tobytes())
+                    infos[name].update(start=start, rows=len(rows))
+                    start += len(rows)
+            for name in unchanged:
+                infos[name].update(start=manifest["files"][name]["start"], rows=manifest["files"][name]["rows"])
+            total = start
+        else:
+            # Rows in the middle changed: rewrite, copying unchanged files' rows.
+            old = self.open_matrix(manifest)
+            tmp = self.matrix_path + ".tmp"
+            start = 0
+            with open(tmp, "wb") as f:
+                for name in sorted(infos):
+                    if name in parsed:
+                        rows = parsed[name]
+                    else:
+                        known = manifest["files"][name]
+                        rows = old[known["start"]:known["start"] + known["rows"]]
+                    f.write(np.ascontiguousarray(rows, dtype=DTYPE).tobytes())
+                    infos[name].update(start=start, rows=len(rows))
+                    start += len(rows)
+            del old
+            os.replace(tmp, self.matrix_path)
+            total = start
+
+        self._write_manifest({**self._empty_manifest(), "rows": total, "files": infos})
+        return {
+            "files": len(infos),
+            "parsed": len(to_parse),
+            "new": len(to_parse) - len(changed),
+            "changed": len(changed),
+            "removed": len(removed),
+            "rows": total,
+        }
+
+    def load(self, rebuild=False, workers=None):
+        """Refresh, then return (memmapped matrix, report)."""
+        report = self.refresh(rebuild=rebuild, workers=workers)
+        return self.open_matrix(), report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh the cached training matrix")
+    parser.add_argument("--rebuild", action="store_true", help="ignore the cache and parse every CSV")
+    args = parser.parse_args()
+    print(FeatureCache().refresh(rebuild=args.rebuild))
+
+
+if __name__ == "__main__":
+    main()
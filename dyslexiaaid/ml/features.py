@@ -0,0 +1,52 @@
+# ml/features.py
+"""
+Trial-level feature extraction.
+
+The metrics CSVs have one row per AOI (line_001, line_001-part_001, ...) and
+repeat the same trial-level columns (n_fix_trial, mean_fix_dur_trial, ...)
+on each of them, so fitting on the raw rows trains on the same trial over and
+over. collapse_trials() keeps one row per (sid, task, trialid) and can
+summarise the AOI-level columns into per-trial statistics.
+"""
+import time
+
+TRIAL_KEYS = ["sid", "task", "trialid"]
+
+# Per-trial statistics of the AOI-level columns: output column -> (column, how)
+AOI_AGGREGATES = {
+    "n_aoi": ("dwell_time_aoi", "size"),
+    "mean_dwell_time_aoi": ("dwell_time_aoi", "mean"),
+    "max_dwell_time_aoi": ("dwell_time_aoi", "max"),
+    "skip_rate_aoi": ("skipped_aoi", "mean"),
+    "n_skipped_aoi": ("skipped_aoi", "sum"),
+    "mean_revisits_aoi": ("n_revisits_aoi", "mean"),
+    "n_revisits_aoi": ("n_revisits_aoi", "sum"),
+}
+
+
+def collapse_trials(df, aggregate_aoi=False):
+    """Return (one row per trial, report).
+
+    Every column other than the keys and the AOI columns is taken from the
+    trial's first row. With ``aggregate_aoi`` the AOI_AGGREGATES columns are
+    added (the frame must then contain the AOI columns, see
+    load_data(aoi=True)).
+    """
+    started = time.perf_counter()
+    aoi_columns = {column for column, _ in AOI_AGGREGATES.values()}
+    trial_columns = [c for c in df.columns if c not in TRIAL_KEYS and c not in aoi_columns]
+
+    groups = df.groupby(TRIAL_KEYS, sort=False, observed=True)
+    trials = groups[trial_columns].first()
+    if aggregate_aoi:
+        aoi_stats = groups.agg(**AOI_AGGREGATES)
+        trials = trials.join(aoi_stats)
+    trials = trials.reset_index()
+
+    report = {
+        "rows_in": len(df),
+        "rows_out": len(trials),
+        "reduction": len(df) / len(trials) if len(trials) else 0.0,
+        "seconds": time.perf_counter() - started,
+    }
+    return trials, report
@@ -0,0 +1,172 @@
+# ml/forest_arrays.py
+"""
+Flat numpy layout for the trained RandomForestClassifier.
+
+sklearn copies every tree's node arrays into private buffers when it is
+unpickled, so joblib's mmap_mode cannot share a pickled forest between
+gunicorn workers. Here the forest is exported as a few contiguous arrays
+(all trees concatenated) and dumped uncompressed with joblib, so that
+``load_forest(path, mmap_mode="r")`` maps the same read-only pages into every
+worker instead of copying them.
+
+Usage (from dyslexiaaid/):
+    python -m ml.forest_arrays ml/dyslexia_model.pkl ml/dyslexia_model.forest
+"""
+import sys
+
+import joblib
+import numpy as np
+
+FOREST_SUFFIX = ".forest"
+
+# Bumped whenever the array layout changes.
+FORMAT_VERSION = 2
+
+
+def export_forest(model):
+    """Turn a fitted RandomForestClassifier into a dict of flat arrays.
+
+    Every tree is concatenated into one node table. Leaves point to
+    themselves, so walking all trees a fixed number of steps ends on the
+    leaves without checking which nodes are still internal.
+    """
+    trees = [est.tree_ for est in model.estimators_]
+    n_classes = len(model.classes_)
+
+    offsets = np.zeros(len(trees) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([t.node_count for t in trees])
+    n_nodes = int(offsets[-1])
+
+    feature = np.empty(n_nodes, dtype=np.int32)
+    threshold = np.empty(n_nodes, dtype=np.float64)
+    left = np.empty(n_nodes, dtype=np.int32)
+    right = np.empty(n_nodes, dtype=np.int32)
+    value = np.empty((n_nodes, n_classes), dtype=np.float64)
+
+    for t, start, end in zip(trees, offsets[:-1], offsets[1:]):
+        is_leaf = t.children_left == -1
+        own = np.arange(start, end)
+        feature[start:end] = np.where(is_leaf, 0, t.feature)
+        threshold[start:end] = t.threshold
+        # Child ids are global node indices, so no per-tree offset is needed
+        # while walking.
+        left[start:end] = np.where(is_leaf, own, t.children_left + start)
+        right[start:end] = np.where(is_leaf, own, t.children_right + start)
+        leaf_value = t.value[:, 0, :]
+        totals = leaf_value.sum(axis=1, keepdims=True)
+        if np.allclose(totals, 1.0):
+            # sklearn >= 1.4 already stores class fractions and uses them as is.
+            value[start:end] = leaf_value
+        else:
+            totals[totals == 0] = 1.0
+            value[start:end] = leaf_value / totals
+
+    return {
+        "format": np.int64(FORMAT_VERSION),
+        "classes": np.asarray(model.classes_).astype(str),
+        "n_features": np.int64(model.n_features_in_),
+        "max_depth": np.int64(max(t.max_depth for t in trees)),
+        "tree_offsets": offsets,
+        "feature": feature,
+        "threshold": threshold,
+        "left": left,
+        "right": right,
+        "value": value,
+    }
+
+
+def save_forest(arrays, path):
+    # No compression: compressed joblib files cannot be memory mapped.
+    joblib.dump(arrays, path)
+
+
+def load_forest(path, mmap_mode="r"):
+    return ArrayForest(joblib.load(path, mmap_mode=mmap_mode))
+
+
+class ArrayForest:
+    """Predicts from the flat arrays with the same results as the sklearn forest."""
+
+    def __init__(self, arrays):
+        if int(arrays.get("format", 1)) != FORMAT_VERSION:
+            raise ValueError("Flat forest was exported with an older layout, re-export it")
+        self.arrays = arrays
+        self.classes_ = np.asarray(arrays["classes"])
+        self.n_features_in_ = int(arrays["n_features"])
+        self.max_depth = int(arrays["max_depth"])
+        self.tree_offsets = arrays["tree_offsets"]
+        self.roots = np.ascontiguousarray(self.tree_offsets[:-1])
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.value = arrays["value"]
+        # Compact artifacts (ml/compress_model.py) store leaf fractions as
+        # small integers, value / value_scale.
+        self.value_scale = float(arrays.get("value_scale", 1.0))
+
+    @classmethod
+    def from_model(cls, model):
+        return cls(export_forest(model))
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def _check_input(self, X):
+        # sklearn trees compare float32 features against float64 thresholds.
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features_in_:
+            raise ValueError(
+                f"X has {X.shape[1]} features, but the model expects {self.n_features_in_}"
+            )
+        return X
+
+    def _walk(self, node, features_of):
+        # All trees (and rows) advance one level per step; once every walk
+        # sits on a leaf the self-loops keep it there and we can stop early.
+        feature, threshold, left, right = self.feature, self.threshold, self.left, self.right
+        for _ in range(self.max_depth):
+            go_left = features_of(feature.take(node)) <= threshold.take(node)
+            nxt = np.where(go_left, left.take(node), right.take(node))
+            if np.array_equal(nxt, node):
+                break
+            node = nxt
+        return node
+
+    def apply(self, X):
+        """Leaf node index of every row in every tree, shape (n_rows, n_trees)."""
+        X = self._check_input(X)
+        if X.shape[0] == 1:
+            row = X[0]
+            return self._walk(self.roots, row.take)[None, :]
+        # Offsets of each row in the flattened X, so a feature lookup is one take().
+        row_base = (np.arange(X.shape[0]) * X.shape[1])[:, None]
+        flat = X.ravel()
+        node = np.broadcast_to(self.roots, (X.shape[0], self.n_trees))
+        return self._walk(node, lambda f: flat.take(row_base + f))
+
+    def predict_proba(self, X):
+        leaves = self.apply(X)
+        # cumsum adds the trees strictly one after another, in the same order
+        # as sklearn, so the probabilities (and ties) come out bit-identical.
+        totals = np.cumsum(self.value[leaves], axis=1)[:, -1]
+        if self.value_scale != 1.0:
+            return totals / (self.n_trees * self.value_scale)
+        return totals / self.n_trees
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    def predict_one(self, row):
+        """Single feature vector in, single label out."""
+        return self.predict([row])[0]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("usage: python -m ml.forest_arrays <model.pkl> <output.forest>")
+    save_forest(export_forest(joblib.load(sys.argv[1])), sys.argv[2])
+    print(f"✅ Flat forest saved to {sys.argv[2]}")
@@ -0,0 +1,155 @@
+# ml/model_search.py
+"""
+Cross-validated grid over n_estimators / max_depth for the forest.
+
+Every configuration is scored with stratified k-fold CV; configurations run
+in parallel across cores (each fit is single threaded, so cores aren't
+oversubscribed). Then each one is refit on the whole training split and
+measured one at a time, so timings aren't disturbed by the other jobs:
+
+    accuracy       mean/std over the folds, and on the held-out test split
+    fit_seconds    mean fit time per fold
+    size_kb        pickled sklearn model and flat-array (.forest) artifact
+    latency_us     single-row predict p50/p99, sklearn and flat-array engine
+
+The report is written as CSV and JSON, and the fastest configuration whose
+CV accuracy is within --tolerance of the best is recommended.
+
+Run from dyslexiaaid/:
+    python -m ml.model_search --folds 5
+or search and train the recommended model in one go:
+    python -m ml.train_model --search
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import time
+from itertools import product
+
+import joblib
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import StratifiedKFold, train_test_split
+
+from ml.forest_arrays import ArrayForest, export_forest
+
+REPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reports")
+N_ESTIMATORS = [10, 25, 50, 100, 200]
+MAX_DEPTH = [4, 8, 12, 16, None]
+
+
+def _cv_config(params, X, y, folds, random_state):
+    splitter = StratifiedKFold(n_splits=folds, shuffle=True, random_state=random_state)
+    scores, fit_times = [], []
+    for train_idx, test_idx in splitter.split(X, y):
+        model = RandomForestClassifier(random_state=random_state, **params)
+        started = time.perf_counter()
+        model.fit(X[train_idx], y[train_idx])
+        fit_times.append(time.perf_counter() - started)
+        scores.append(model.score(X[test_idx], y[test_idx]))
+    return {
+        **params,
+        "cv_accuracy": float(np.mean(scores)),
+        "cv_accuracy_std": float(np.std(scores)),
+        "fit_seconds": float(np.mean(fit_times)),
+    }
+
+
+def _artifact_kb(obj):
+    buffer = io.BytesIO()
+    joblib.dump(obj, buffer)
+    return buffer.tell() / 1024
+
+
+def _latency_us(predict, rows, repeats):
+    samples = np.empty(repeats)
+    for i in range(repeats):
+        row = rows[i % len(rows)]
+        started = time.perf_counter()
+        predict(row)
+        samples[i] = time.perf_counter() - started
+    return np.percentile(samples, 50) * 1e6, np.percentile(samples, 99) * 1e6
+
+
+def _measure(result, X_train, y_train, X_test, y_test, random_state, repeats):
+    params = {"n_estimators": result["n_estimators"], "max_depth": result["max_depth"]}
+    model = RandomForestClassifier(random_state=random_state, **params).fit(X_train, y_train)
+    compiled = ArrayForest.from_model(model)
+    rows = [X_test[i:i + 1] for i in range(len(X_test))]
+    sk_p50, sk_p99 = _latency_us(model.predict, rows, max(repeats // 10, 20))
+    fa_p50, fa_p99 = _latency_us(compiled.predict, rows, repeats)
+    return {
+        **result,
+        "test_accuracy": float(model.score(X_test, y_test)),
+        "sklearn_size_kb": _artifact_kb(model),
+        "forest_size_kb": _artifact_kb(export_forest(model)),
+        "sklearn_p50_us": sk_p50,
+        "sklearn_p99_us": sk_p99,
+        "forest_p50_us": fa_p50,
+        "forest_p99_us": fa_p99,
+    }
+
+
+def recommend(results, tolerance):
+    """Fastest (flat-array p50) configuration within `tolerance` of the best CV accuracy."""
+    best = max(r["cv_accuracy"] for r in results)
+    eligible = [r for r in results if r["cv_accuracy"] >= best - tolerance]
+    return min(eligible, key=lambda r: (r["forest_p50_us"], r["forest_size_kb"]))
+
+
+def run_search(X, y, folds=5, n_jobs=-1, tolerance=0.01, repeats=500, random_state=42,
+               n_estimators=N_ESTIMATORS, max_depth=MAX_DEPTH, report_dir=REPORT_DIR):
+    X = np.asarray(X, dtype=np.float32)
+    y = np.asarray(y)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=random_state)
+
+    grid = [{"n_estimators": n, "max_depth": d} for n, d in product(n_estimators, max_depth)]
+    started = time.perf_counter()
+    cv_results = Parallel(n_jobs=n_jobs)(
+        delayed(_cv_config)(params, X_train, y_train, folds, random_state) for params in grid
+    )
+    print(f"Cross-validated {len(grid)} configurations x {folds} folds in "
+          f"{time.perf_counter() - started:.1f}s")
+
+    results = [_measure(r, X_train, y_train, X_test, y_test, random_state, repeats) for r in cv_results]
+    choice = recommend(results, tolerance)
+
+    os.makedirs(report_dir, exist_ok=True)
+    with open(os.path.join(report_dir, "model_search.csv"), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0]))
+        writer.writeheader()
+        writer.writerows(results)
+    with open(os.path.join(report_dir, "model_search.json"), "w") as f:
+        json.dump({"folds": folds, "tolerance": tolerance, "recommended": choice, "results": results}, f, indent=1)
+
+    print(f"{'trees':>5} {'depth':>5} {'cv acc':>7} {'test acc':>8} {'fit s':>6} "
+          f"{'pkl KB':>7} {'flat KB':>7} {'sk p50':>7} {'flat p50':>8} {'flat p99':>8}")
+    for r in sorted(results, key=lambda r: -r["cv_accuracy"]):
+        marker = " <-" if r is choice else ""
+        print(f"{r['n_estimators']:>5} {str(r['max_depth']):>5} {r['cv_accuracy']:>7.3f} {r['test_accuracy']:>8.3f} "
+              f"{r['fit_seconds']:>6.3f} {r['sklearn_size_kb']:>7.0f} {r['forest_size_kb']:>7.0f} "
+              f"{r['sklearn_p50_us']:>7.0f} {r['forest_p50_us']:>8.0f} {r['forest_p99_us']:>8.0f}{marker}")
+    print(f"Report written to {report_dir}/model_search.csv and .json")
+    return choice, results
+
+
+def main():
+    from ml.train_model import load_training_set
+
+    parser = argparse.ArgumentParser(description="Grid search over forest size")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--jobs", type=int, default=-1, help="parallel CV jobs (-1: all cores)")
+    parser.add_argument("--tolerance", type=float, default=0.01,
+                        help="accept configurations this far below the best CV accuracy")
+    args = parser.parse_args()
+
+    X, y = load_training_set()
+    choice, _ = run_search(X, y, folds=args.folds, n_jobs=args.jobs, tolerance=args.tolerance)
+    print(f"Recommended: n_estimators={choice['n_estimators']} max_depth={choice['max_depth']}")
+
+
+if __name__ == "__main__":
+    main()
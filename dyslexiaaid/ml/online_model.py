@@ -0,0 +1,101 @@
+# ml/online_model.py
+"""
+Incrementally trained classifier for the evaluation features.
+
+A StandardScaler and an SGD logistic regression are both updated with
+partial_fit, so a new batch of rows costs time proportional to the batch,
+not to everything seen so far. The object carries its feature names,
+the pk watermark of the last row it learnt from and a short history of
+update timings. The web app uses those names to build matching inputs.
+
+The Django side (which rows, which features) lives in
+accounts/online_training.py; publish() is how a new version reaches the
+serving path.
+"""
+import os
+import tempfile
+import time
+
+import joblib
+import numpy as np
+from sklearn.linear_model import SGDClassifier
+from sklearn.preprocessing import StandardScaler
+
+HISTORY_SIZE = 100
+
+
+class OnlineModel:
+    def __init__(self, feature_names, classes, random_state=42):
+        self.feature_names = list(feature_names)
+        self.classes_ = np.asarray(classes, dtype=object)
+        self.scaler = StandardScaler()
+        self.clf = SGDClassifier(loss="log_loss", random_state=random_state)
+        self.watermark = 0
+        self.n_seen = 0
+        self.updates = 0
+        self.full_retrained_at = None
+        self.history = []
+
+    @property
+    def is_fitted(self):
+        return self.n_seen > 0
+
+    def partial_fit(self, X, y, watermark=None):
+        """Learn from one batch; returns the seconds it took."""
+        X = np.asarray(X, dtype=np.float64)
+        started = time.perf_counter()
+        self.scaler.partial_fit(X)
+        self.clf.partial_fit(self.scaler.transform(X), np.asarray(y, dtype=object), classes=self.classes_)
+        elapsed = time.perf_counter() - started
+
+        self.n_seen += len(X)
+        if watermark is not None:
+            self.watermark = watermark
+        self.history.append({"rows": len(X), "seconds": elapsed, "watermark": self.watermark, "at": time.time()})
+        del self.history[:-HISTORY_SIZE]
+        return elapsed
+
+    def predict_proba(self, X):
+        return self.clf.predict_proba(self.scaler.transform(np.asarray(X, dtype=np.float64)))
+
+    def predict(self, X):
+        return self.clf.predict(self.scaler.transform(np.asarray(X, dtype=np.float64)))
+
+    def predict_one(self, row):
+        return self.predict([row])[0]
+
+    def stats(self):
+        seconds = [h["seconds"] for h in self.history]
+        return {
+            "features": self.feature_names,
+            "watermark": self.watermark,
+            "rows_seen": self.n_seen,
+            "updates": self.updates,
+            "full_retrained_at": self.full_retrained_at,
+            "last_batch_seconds": seconds[-1] if seconds else None,
+            "mean_batch_seconds": float(np.mean(seconds)) if seconds else None,
+        }
+
+
+def load(path):
+    try:
+        return joblib.load(path)
+    except FileNotFoundError:
+        return None
+
+
+def publish(model, path):
+    """Write the model next to `path` and rename it into place.
+
+    os.replace is atomic on the same filesystem, so a worker reloading the
+    file sees either the old version or the new one, never half of it.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix=".online-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            joblib.dump(model, f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
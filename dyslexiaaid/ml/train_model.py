@@ -1,48 +1,196 @@
 # ml/train_model.py
+# Run from dyslexiaaid/:  python -m ml.train_model
 import pandas as pd
+import numpy as np
 import glob
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import time
+import argparse
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import classification_report
 import joblib
 import os
 
+from ml.features import collapse_trials
+from ml.forest_arrays import export_forest, save_forest
+
+# Paths are anchored at dyslexiaaid/ (settings.BASE_DIR), not the working
+# directory, so the background training job finds the same files.
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
 # Path to your extracted CSV files
-DATA_PATH = "data_extracted/data"
+DATA_PATH = os.path.join(BASE_DIR, "data_extracted", "data")
+
+# Defaults of settings.ML_MODEL_PATH / ML_MODEL_ARRAYS_PATH
+MODEL_PATH = os.path.join(BASE_DIR, "ml", "dyslexia_model.pkl")
+# Flat-array copy of the same forest, memory mapped by the web workers
+FOREST_PATH = os.path.join(BASE_DIR, "ml", "dyslexia_model.forest")
+
+# ✅ Select features (add more if needed)
+FEATURES = ["n_fix_trial", "mean_fix_dur_trial", "n_sacc_trial", "n_regress_trial"]
+
+# Only these columns are parsed from the ~35 in each CSV, with fixed dtypes
+# (sklearn trees work in float32 anyway, so nothing is lost for training).
+# The key columns identify a trial, see ml/features.py.
+COLUMNS = {
+    "sid": np.int32,
+    "task": object,
+    "trialid": np.int32,
+    "n_fix_trial": np.int32,
+    "mean_fix_dur_trial": np.float32,
+    "n_sacc_trial": np.int32,
+    "n_regress_trial": np.int32,
+}
+
+# Per-AOI columns, only read when they are going to be aggregated per trial
+AOI_COLUMNS = {
+    "dwell_time_aoi": np.float32,
+    "skipped_aoi": np.int32,
+    "n_revisits_aoi": np.int32,
+}
+
+# ⚠️ Fake labels (replace later with real dyslexia types if available)
+LABELS = ["Phonological", "Surface", "Visual", "Rapid Naming"]
+
+
+def placeholder_labels(n):
+    return np.resize(np.array(LABELS, dtype=object), n)
+
+
+def list_data_files(data_path=DATA_PATH):
+    return sorted(glob.glob(os.path.join(data_path, "*_metrics.csv")))
+
+
+def read_metrics_csv(path, columns=COLUMNS):
+    """Parse the needed columns of one CSV into plain numpy arrays."""
+    df = pd.read_csv(path, usecols=list(columns), dtype=columns)
+    return {column: df[column].to_numpy() for column in columns}
 
-def load_data():
-    files = glob.glob(os.path.join(DATA_PATH, "*_metrics.csv"))
-    dfs = [pd.read_csv(f) for f in files]
-    df = pd.concat(dfs, ignore_index=True)
 
-    # ✅ Select features (add more if needed)
-    features = ["n_fix_trial", "mean_fix_dur_trial", "n_sacc_trial", "n_regress_trial"]
+def _max_rows(path):
+    # Upper bound on data rows: one line break per row, the header's covers
+    # a possibly unterminated last line.
+    with open(path, "rb") as f:
+        return f.read().count(b"\n")
 
-    # ⚠️ Fake labels (replace later with real dyslexia types if available)
-    labels = ["Phonological", "Surface", "Visual", "Rapid Naming"] * (len(df) // 4 + 1)
-    df["label"] = labels[:len(df)]  # ✅ ensures same length
 
-    return df, features
+def load_data(data_path=DATA_PATH, workers=None, aoi=False):
+    """Read every metrics CSV into one DataFrame (one row per AOI).
 
-def train_model():
-    df, features = load_data()
-    X = df[features]
-    y = df["label"]
+    Files are parsed in a process pool and copied, in file order, straight
+    into column arrays sized up front, so no list of per-file frames is ever
+    concatenated. ``workers=1`` parses serially in this process. ``aoi=True``
+    also reads the per-AOI columns.
+    """
+    wanted = {**COLUMNS, **AOI_COLUMNS} if aoi else COLUMNS
+    files = list_data_files(data_path)
+    capacity = sum(_max_rows(f) for f in files)
+    columns = {column: np.empty(capacity, dtype=dtype) for column, dtype in wanted.items()}
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        chunks = map(partial(read_metrics_csv, columns=wanted), files)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        chunks = pool.map(partial(read_metrics_csv, columns=wanted), files,
+                          chunksize=max(len(files) // (4 * workers), 1))
+
+    filled = 0
+    try:
+        for chunk in chunks:
+            n = len(chunk[FEATURES[0]])
+            for column, values in chunk.items():
+                columns[column][filled:filled + n] = values
+            filled += n
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    df = pd.DataFrame({column: values[:filled] for column, values in columns.items()}, copy=False)
+    df["label"] = placeholder_labels(len(df))  # ✅ ensures same length
+
+    return df, FEATURES
+
+def load_training_set(use_cache=True, rebuild_cache=False):
+    """(X, y) with one row per trial, from the feature cache or straight from the CSVs."""
+    if use_cache:
+        from ml.feature_cache import FeatureCache
+
+        X, report = FeatureCache(features=FEATURES).load(rebuild=rebuild_cache)
+        print(f"Feature cache: {report['rows']} trials, parsed {report['parsed']} of "
+              f"{report['files']} CSVs ({report['new']} new, {report['changed']} changed, "
+              f"{report['removed']} removed)")
+    else:
+        df, features = load_data()
+        # Trial-level features repeat on every AOI row; train on one row per trial
+        df, report = collapse_trials(df)
+        print(f"Collapsed {report['rows_in']} AOI rows into {report['rows_out']} trials "
+              f"({report['reduction']:.0f}x fewer)")
+        X = df[features].to_numpy(dtype=np.float32)
+    return X, placeholder_labels(len(X))
+
+
+def train_model(use_cache=True, rebuild_cache=False, n_estimators=100, max_depth=None, search=False,
+                compact=True, compact_depth=8, compact_trees=25, model_path=MODEL_PATH, forest_path=FOREST_PATH,
+                compact_path=None):
+    """Train the forest and write its pickle, flat-array and compact artifacts."""
+    from ml.compress_model import COMPACT_PATH, compress_model, print_report, remove_compact
+
+    compact_path = compact_path or COMPACT_PATH
+    X, y = load_training_set(use_cache=use_cache, rebuild_cache=rebuild_cache)
+
+    if search:
+        from ml.model_search import run_search
+
+        choice, _ = run_search(X, y)
+        n_estimators, max_depth = choice["n_estimators"], choice["max_depth"]
+        print(f"Training recommended n_estimators={n_estimators} max_depth={max_depth}")
 
     # Split train/test
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
     # Train model
-    model = RandomForestClassifier(n_estimators=100, random_state=42)
+    model = RandomForestClassifier(n_estimators=n_estimators, max_depth=max_depth, random_state=42)
+    started = time.perf_counter()
     model.fit(X_train, y_train)
+    print(f"Fitted on {len(X_train)} rows in {time.perf_counter() - started:.2f}s")
 
     # Evaluate
     y_pred = model.predict(X_test)
     print("Model Performance:\n", classification_report(y_test, y_pred))
 
     # Save model
-    joblib.dump(model, "ml/dyslexia_model.pkl")
-    print("✅ Model saved to ml/dyslexia_model.pkl")
+    joblib.dump(model, model_path)
+    print(f"✅ Model saved to {model_path}")
+
+    save_forest(export_forest(model), forest_path)
+    print(f"✅ Flat forest saved to {forest_path}")
+
+    if compact:
+        report = compress_model(model, X_test, y_test, path=compact_path, max_depth=compact_depth,
+                                n_trees=compact_trees, pickle_path=model_path)
+        print_report(report, compact_path)
+    elif remove_compact(compact_path):
+        # It was compressed from the previous model and would still be served first
+        print(f"Removed the outdated {compact_path}")
 
 if __name__ == "__main__":
-    train_model()
+    parser = argparse.ArgumentParser(description="Train the dyslexia type model")
+    parser.add_argument("--rebuild-cache", action="store_true",
+                        help="re-parse every CSV instead of only new or changed ones")
+    parser.add_argument("--no-cache", action="store_true", help="read the CSVs directly, bypassing ml/cache")
+    parser.add_argument("--n-estimators", type=int, default=100)
+    parser.add_argument("--max-depth", type=int, default=None)
+    parser.add_argument("--search", action="store_true",
+                        help="cross-validate a grid of forest sizes (ml/model_search.py) and train the recommended one")
+    parser.add_argument("--no-compact", action="store_true", help="skip writing the compact serving artifact")
+    parser.add_argument("--compact-depth", type=int, default=8)
+    parser.add_argument("--compact-trees", type=int, default=25)
+    args = parser.parse_args()
+    train_model(use_cache=not args.no_cache, rebuild_cache=args.rebuild_cache,
+                n_estimators=args.n_estimators, max_depth=args.max_depth, search=args.search,
+                compact=not args.no_compact, compact_depth=args.compact_depth,
+                compact_trees=args.compact_trees)